@@ -1,6 +1,3 @@
-import sys
-import os
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from tools.bc3_pcalc import BC3PrettyCalculator
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
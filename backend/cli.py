@@ -0,0 +1,186 @@
+"""
+Command line maintenance tasks for the BC3 backend.
+
+Run from the project root (data paths are relative to it):
+  python -m backend.cli categorize-all --workers 4
+  python -m backend.cli categorize-all --codes C00001 C00002 --force
+  python -m backend.cli export-training --workers 4
+  python -m backend.cli retrain --time-budget 300
+  python -m backend.cli reindex
+  python -m backend.cli replay data/traces/requests-*.ndjson* --speed 4 --sandbox
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from .logging_config import setup_logging, get_logger
+from .config import (
+    ML_BULK_BATCH_ITEMS, ML_BULK_RECORDS_PER_TASK, ML_TRAIN_MIN_PROBA,
+    ML_RETRAIN_HOLDOUT_PCT, ML_RETRAIN_TIME_BUDGET
+)
+from .exceptions import BC3Exception
+
+logger = get_logger(__name__)
+
+def cmd_categorize_all(args: argparse.Namespace) -> int:
+    """Re-categorize every processed record of the registry."""
+    from .services.bulk_categorizer import BulkCategorizer
+
+    def progress(summary):
+        logger.info(f"Progress: {summary['done']}/{summary['total']} records")
+
+    summary = BulkCategorizer().run(
+        codes=args.codes,
+        workers=args.workers,
+        force=args.force,
+        resume=not args.no_resume,
+        batch_items=args.batch_items,
+        records_per_task=args.records_per_task,
+        progress=progress,
+    )
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    return 0 if summary["failed"] == 0 else 1
+
+def cmd_export_training(args: argparse.Namespace) -> int:
+    """Export labelled PARTIDAs of all categorized files for retraining."""
+    from .services.training_export import TrainingExporter
+
+    manifest = TrainingExporter(min_proba=args.min_proba).export(workers=args.workers, full=args.full)
+    manifest.pop("files")
+    print(json.dumps(manifest, indent=2, ensure_ascii=False))
+    return 0
+
+def cmd_retrain(args: argparse.Namespace) -> int:
+    """Retrain the model from exported labels and promote it if it does not regress."""
+    from .services.model_trainer import ModelTrainer
+
+    result = ModelTrainer().retrain(
+        export=not args.no_export,
+        cold=args.cold,
+        promote=not args.no_promote,
+        holdout_pct=args.holdout_pct,
+        time_budget=args.time_budget,
+    )
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 0
+
+def cmd_reindex(args: argparse.Namespace) -> int:
+    """Rebuild the corpus indexes from all categorized files."""
+    from .services.uncertainty_index import get_uncertainty_index
+    from .services.text_index import get_text_index
+    from .services.quality_metrics import get_quality_metrics
+
+    indexes = {"uncertainty": get_uncertainty_index, "texts": get_text_index, "quality": get_quality_metrics}
+    names = [args.only] if args.only else list(indexes)
+    print(json.dumps({name: indexes[name]().rebuild() for name in names}, indent=2))
+    return 0
+
+def cmd_replay(args: argparse.Namespace) -> int:
+    """Replay captured request traces and report latency percentiles per route."""
+    from contextlib import nullcontext
+    from .services.request_trace import load_trace, replay_trace, sandbox_data_dir
+
+    entries = load_trace(args.traces)
+    if args.limit:
+        entries = entries[:args.limit]
+    if not entries:
+        logger.error("No requests in the trace files")
+        return 1
+    bodies_dir = os.path.abspath(args.bodies or os.path.join(os.path.dirname(args.traces[0]) or ".", "bodies"))
+    output = os.path.abspath(args.output) if args.output else None
+    sandbox = args.sandbox and not args.url
+    logger.info(
+        f"Replaying {len(entries)} requests against {args.url or 'backend.main:app (in-process)'}"
+        + (" on a temporary copy of data/" if sandbox else "")
+    )
+    with sandbox_data_dir() if sandbox else nullcontext():
+        report = asyncio.run(replay_trace(
+            entries, bodies_dir, url=args.url, speed=args.speed, concurrency=args.concurrency,
+            allow_writes=sandbox,
+        ))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="bc3", description="BC3 backend maintenance commands.")
+    parser.add_argument("--log-level", default="INFO", help="Logging level (default: INFO)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    categorize = subparsers.add_parser(
+        "categorize-all", help="Re-categorize all processed records with the current model"
+    )
+    categorize.add_argument("--codes", nargs="+", help="Only these record codes")
+    categorize.add_argument("--workers", type=int, default=1, help="Worker processes (default: 1)")
+    categorize.add_argument("--force", action="store_true", help="Re-predict nodes even if their prediction is current")
+    categorize.add_argument("--no-resume", action="store_true", help="Ignore the checkpoint of an interrupted run")
+    categorize.add_argument("--batch-items", type=int, default=ML_BULK_BATCH_ITEMS,
+                            help=f"Texts pooled per model call (default: {ML_BULK_BATCH_ITEMS})")
+    categorize.add_argument("--records-per-task", type=int, default=ML_BULK_RECORDS_PER_TASK,
+                            help=f"Records per checkpointed task (default: {ML_BULK_RECORDS_PER_TASK})")
+    categorize.set_defaults(func=cmd_categorize_all)
+
+    export = subparsers.add_parser(
+        "export-training", help="Export labelled PARTIDAs of categorized files to data/training"
+    )
+    export.add_argument("--workers", type=int, default=1, help="Worker processes (default: 1)")
+    export.add_argument("--full", action="store_true", help="Re-extract every file, not only changed ones")
+    export.add_argument("--min-proba", type=float, default=ML_TRAIN_MIN_PROBA,
+                        help=f"Minimum probability of unlabelled predictions (default: {ML_TRAIN_MIN_PROBA})")
+    export.set_defaults(func=cmd_export_training)
+
+    retrain = subparsers.add_parser(
+        "retrain", help="Warm-start retrain from exported labels, promote if accuracy does not regress"
+    )
+    retrain.add_argument("--no-export", action="store_true", help="Use the existing training export as is")
+    retrain.add_argument("--cold", action="store_true", help="Refit the whole pipeline instead of warm-starting")
+    retrain.add_argument("--no-promote", action="store_true", help="Only write the versioned artifact")
+    retrain.add_argument("--holdout-pct", type=float, default=ML_RETRAIN_HOLDOUT_PCT,
+                         help=f"Percent of texts held out for validation (default: {ML_RETRAIN_HOLDOUT_PCT})")
+    retrain.add_argument("--time-budget", type=float, default=ML_RETRAIN_TIME_BUDGET,
+                         help=f"Seconds allowed for training (default: {ML_RETRAIN_TIME_BUDGET})")
+    retrain.set_defaults(func=cmd_retrain)
+
+    index = subparsers.add_parser(
+        "reindex", help="Rebuild the uncertainty and text indexes and quality counters from data/categorized"
+    )
+    index.add_argument("--only", choices=["uncertainty", "texts", "quality"], help="Rebuild a single index")
+    index.set_defaults(func=cmd_reindex)
+
+    replay = subparsers.add_parser(
+        "replay", help="Replay captured request traces (TRACE_CAPTURE=1) and report latency per route"
+    )
+    replay.add_argument("traces", nargs="+", help="Trace files, rotated ones included")
+    replay.add_argument("--url", help="Target server (default: backend.main:app in-process, offline)")
+    replay.add_argument("--sandbox", action="store_true",
+                        help="In-process: replay on a temporary copy of data/ (required for writing requests)")
+    replay.add_argument("--speed", type=float, default=1.0,
+                        help="Pacing factor: 1 original, 4 four times faster, 0 as fast as possible (default: 1)")
+    replay.add_argument("--concurrency", type=int, default=64, help="Maximum requests in flight (default: 64)")
+    replay.add_argument("--bodies", help="Stored request bodies (default: bodies/ next to the first trace)")
+    replay.add_argument("--limit", type=int, help="Replay only the first N requests")
+    replay.add_argument("--output", help="Also write the JSON report to this file")
+    replay.set_defaults(func=cmd_replay)
+
+    return parser
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    setup_logging(args.log_level)
+    try:
+        return args.func(args)
+    except BC3Exception as e:
+        logger.error(str(e))
+        return 1
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; run the command again to resume")
+        return 130
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,7 @@ from typing import Set
 UPLOAD_DIR = "data/uploads"
 PROCESSED_DIR = "data/processed"
 CATEGORIZED_DIR = "data/categorized"
+TRAINING_DIR = "data/training"
 FRONTEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../frontend'))
 
 # File paths
@@ -17,6 +18,122 @@ ML_MODEL_PATH = os.environ.get(
 )
 METRICS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../data/models/metrics.json"))
 
+# Serve the model through the flat-array LinearScorer when it reproduces the
+# pipeline within ML_SCORER_TOLERANCE (set ML_COMPILED_SCORER=0 to use sklearn)
+ML_COMPILED_SCORER = os.environ.get("ML_COMPILED_SCORER", "1") != "0"
+ML_SCORER_TOLERANCE = float(os.environ.get("ML_SCORER_TOLERANCE", "1e-6"))
+# Write the compiled scorer next to the model on first load so other workers can map it
+ML_SCORER_AUTO_EXPORT = os.environ.get("ML_SCORER_AUTO_EXPORT", "1") != "0"
+# Memory-map model arrays read-only so worker processes share pages (empty disables)
+ML_MMAP_MODE = os.environ.get("ML_MMAP_MODE", "r") or None
+
+# Seconds between checks of the model file for hot reload (0 disables watching)
+ML_MODEL_WATCH_INTERVAL = float(os.environ.get("ML_MODEL_WATCH_INTERVAL", "5"))
+
+# Number of texts sent to the model in a single predict_proba call
+ML_BATCH_SIZE = int(os.environ.get("ML_BATCH_SIZE", "512"))
+
+# Micro-batching of concurrent /predict requests
+ML_MICROBATCH_MAX_ITEMS = int(os.environ.get("ML_MICROBATCH_MAX_ITEMS", "64"))
+ML_MICROBATCH_WAIT_MS = float(os.environ.get("ML_MICROBATCH_WAIT_MS", "5"))
+
+# Maximum items accepted by POST /predict/batch (JSON response / NDJSON stream)
+ML_BATCH_MAX_ITEMS = int(os.environ.get("ML_BATCH_MAX_ITEMS", "5000"))
+ML_BATCH_STREAM_MAX_ITEMS = int(os.environ.get("ML_BATCH_STREAM_MAX_ITEMS", "100000"))
+
+# Prediction cache (set ML_CACHE_PATH to an empty string for memory-only caching)
+PREDICTION_CACHE_PATH = os.environ.get("ML_CACHE_PATH", "data/cache/predictions.sqlite")
+PREDICTION_CACHE_SIZE = int(os.environ.get("ML_CACHE_SIZE", "20000"))
+
+# Index of PARTIDA predictions ordered by confidence, for GET /ml/uncertain
+UNCERTAINTY_INDEX_PATH = os.environ.get("ML_UNCERTAINTY_INDEX_PATH", "data/cache/uncertainty.sqlite")
+
+# Inverted index of normalized PARTIDA texts, with MinHash LSH for near duplicates
+TEXT_INDEX_PATH = os.environ.get("ML_TEXT_INDEX_PATH", "data/cache/text_index.sqlite")
+LSH_NUM_PERM = int(os.environ.get("ML_LSH_NUM_PERM", "64"))
+LSH_BANDS = int(os.environ.get("ML_LSH_BANDS", "16"))
+
+# Incrementally maintained confusion matrix of predicted vs. user labels (GET /ml/metrics)
+QUALITY_METRICS_PATH = os.environ.get("ML_QUALITY_METRICS_PATH", "data/cache/quality.sqlite")
+
+# Bulk re-categorization of every record (CLI and admin endpoint)
+ML_BULK_BATCH_ITEMS = int(os.environ.get("ML_BULK_BATCH_ITEMS", "4096"))
+ML_BULK_RECORDS_PER_TASK = int(os.environ.get("ML_BULK_RECORDS_PER_TASK", "16"))
+BULK_STATE_PATH = os.environ.get("ML_BULK_STATE_PATH", "data/cache/bulk_categorize.json")
+
+# Training-data export: unlabelled nodes are exported with their prediction above this probability
+ML_TRAIN_MIN_PROBA = float(os.environ.get("ML_TRAIN_MIN_PROBA", "0.9"))
+
+# Retraining: versioned artifacts, holdout share (percent of text hashes), time budget (seconds)
+MODEL_VERSIONS_DIR = os.environ.get(
+    "ML_MODEL_VERSIONS_DIR", os.path.join(os.path.dirname(ML_MODEL_PATH), "versions")
+)
+ML_RETRAIN_HOLDOUT_PCT = float(os.environ.get("ML_RETRAIN_HOLDOUT_PCT", "10"))
+ML_RETRAIN_TIME_BUDGET = float(os.environ.get("ML_RETRAIN_TIME_BUDGET", "600"))
+ML_RETRAIN_MIN_ROWS = int(os.environ.get("ML_RETRAIN_MIN_ROWS", "50"))
+# Minimum user-labelled holdout rows needed to promote a retrained model
+ML_RETRAIN_MIN_HOLDOUT_ROWS = int(os.environ.get("ML_RETRAIN_MIN_HOLDOUT_ROWS", "20"))
+
+# Token required in the X-Admin-Token header of /admin routes (empty disables them)
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+# On-demand request profiling (admin only): output directory, profiles kept,
+# minimum seconds between profiled requests, functions in the text summary and
+# the sampling profiler's interval in seconds
+PROFILES_DIR = os.environ.get("PROFILES_DIR", "data/profiles")
+PROFILE_MAX_KEPT = int(os.environ.get("PROFILE_MAX_KEPT", "50"))
+PROFILE_MIN_INTERVAL = float(os.environ.get("PROFILE_MIN_INTERVAL", "10"))
+PROFILE_TOP_N = int(os.environ.get("PROFILE_TOP_N", "40"))
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+# tracemalloc frames per allocation and snapshots kept for /admin/memory
+MEMORY_TRACE_FRAMES = int(os.environ.get("MEMORY_TRACE_FRAMES", "10"))
+MEMORY_MAX_SNAPSHOTS = int(os.environ.get("MEMORY_MAX_SNAPSHOTS", "10"))
+# Log one line per request with its duration and RSS (set REQUEST_MEMORY_LOG=0 to disable)
+REQUEST_MEMORY_LOG = os.environ.get("REQUEST_MEMORY_LOG", "1") != "0"
+
+# Request trace capture for replay (off unless TRACE_CAPTURE=1): one rotating
+# NDJSON file per process, request bodies up to TRACE_BODY_MAX_BYTES stored by
+# digest next to it (only for paths starting with a TRACE_BODY_PATHS prefix; uploads
+# carry client e-mails and are left out), and path prefixes that are never traced
+TRACE_CAPTURE = os.environ.get("TRACE_CAPTURE", "0") == "1"
+TRACE_PATH = os.environ.get("TRACE_PATH", "data/traces/requests-{pid}.ndjson")
+TRACE_MAX_BYTES = int(os.environ.get("TRACE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.environ.get("TRACE_BACKUPS", "5"))
+TRACE_BODY_MAX_BYTES = int(os.environ.get("TRACE_BODY_MAX_BYTES", str(20 * 1024 * 1024)))
+TRACE_BODIES_MAX_BYTES = int(os.environ.get("TRACE_BODIES_MAX_BYTES", str(1024 * 1024 * 1024)))
+TRACE_EXCLUDE = [p for p in os.environ.get("TRACE_EXCLUDE", "/metrics,/static,/admin").split(",") if p]
+TRACE_BODY_PATHS = [p for p in os.environ.get("TRACE_BODY_PATHS", "/predict,/records/,/ml/").split(",") if p]
+
+# Production pre-fork server (python -m backend.server): the parent preloads the
+# app and model, then forks SERVER_WORKERS workers; each worker is recycled after
+# SERVER_MAX_REQUESTS requests (plus up to SERVER_MAX_REQUESTS_JITTER, 0 = never)
+SERVER_HOST = os.environ.get("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.environ.get("SERVER_PORT", "8005"))
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", str(min(4, os.cpu_count() or 1))))
+SERVER_MAX_REQUESTS = int(os.environ.get("SERVER_MAX_REQUESTS", "10000"))
+SERVER_MAX_REQUESTS_JITTER = int(os.environ.get("SERVER_MAX_REQUESTS_JITTER", "1000"))
+SERVER_GRACEFUL_TIMEOUT = int(os.environ.get("SERVER_GRACEFUL_TIMEOUT", "30"))
+SERVER_BACKLOG = int(os.environ.get("SERVER_BACKLOG", "2048"))
+# Log every worker's RSS/PSS this often in seconds (0 = only after boot and on SIGUSR1)
+SERVER_MEMORY_REPORT_INTERVAL = float(os.environ.get("SERVER_MEMORY_REPORT_INTERVAL", "300"))
+# Set to "1" by the pre-fork master for its workers, which then neither load nor
+# watch the model themselves: the master preloads it and restarts them on change
+PREFORK_WORKER_ENV = "BC3_PREFORK_WORKER"
+# Prediction cache entries read from disk into memory before forking
+SERVER_PRELOAD_PREDICTIONS = int(os.environ.get("SERVER_PRELOAD_PREDICTIONS", "20000"))
+# Workers write their metrics to this directory every METRICS_FLUSH_INTERVAL seconds
+# and /metrics sums them (empty = a temporary directory removed on shutdown)
+METRICS_MULTIPROC_DIR = os.environ.get("METRICS_MULTIPROC_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))
+
+# Frontend assets are served from memory: gzip variants for text files of at least
+# STATIC_GZIP_MIN_BYTES, ETags, and hashed /static/ URLs cached for STATIC_MAX_AGE
+# seconds. STATIC_ASSETS_RELOAD=1 rebuilds the table when a file changes (development)
+STATIC_MAX_AGE = int(os.environ.get("STATIC_MAX_AGE", str(365 * 24 * 3600)))
+STATIC_GZIP_MIN_BYTES = int(os.environ.get("STATIC_GZIP_MIN_BYTES", "512"))
+STATIC_ASSETS_RELOAD = os.environ.get("STATIC_ASSETS_RELOAD", "0") == "1"
+
 # BC3 converter path
 BC3_CONVERTER_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../tools/bc3_converter.py'))
 
@@ -1,22 +1,49 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
-from .config import FRONTEND_DIR, CORS_ORIGINS, UPLOAD_DIR, PROCESSED_DIR, CATEGORIZED_DIR
+from .config import (
+    CORS_ORIGINS, UPLOAD_DIR, PROCESSED_DIR, CATEGORIZED_DIR, REQUEST_MEMORY_LOG, TRACE_CAPTURE, PREFORK_WORKER_ENV
+)
 from .logging_config import setup_logging, get_logger
-from .routers import upload, files, ml, records, calc, frontend
-from . import calc_api
+from .routers import upload, files, ml, records, calc, frontend, admin, monitoring
+from .services.model_registry import model_registry
+from .services.inference_executor import inference_executor
+from .services.static_assets import get_static_assets
+from .exceptions import MLModelError
+from .middleware import ProfilingMiddleware, RequestMemoryMiddleware, TraceCaptureMiddleware
 
 # Setup logging
 setup_logging()
 logger = get_logger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load and warm up the shared ML model before serving, watch it for changes.
+
+    Pre-fork workers skip both: the master already loaded the model they
+    share, and it replaces them when the model file changes.
+    """
+    get_static_assets()
+    if os.environ.get(PREFORK_WORKER_ENV) != "1":
+        try:
+            model_registry.load()
+        except MLModelError as e:
+            logger.warning(f"ML model not loaded at startup: {e}")
+        model_registry.start_watching()
+    await inference_executor.start()
+    yield
+    await inference_executor.stop()
+    model_registry.stop_watching()
+
 # Create FastAPI app
 app = FastAPI(
     title="BC3 File Processing API",
     description="API for BC3 file upload, conversion, and ML classification",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -28,14 +55,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Admin-only on-demand profiling of single requests
+app.add_middleware(ProfilingMiddleware)
+
+# Per-request duration and RSS log line
+if REQUEST_MEMORY_LOG:
+    app.add_middleware(RequestMemoryMiddleware)
+
+# Optional request trace capture for replay
+if TRACE_CAPTURE:
+    app.add_middleware(TraceCaptureMiddleware)
+
 # Ensure required directories exist
 os.makedirs("data", exist_ok=True)
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(PROCESSED_DIR, exist_ok=True)
 os.makedirs(CATEGORIZED_DIR, exist_ok=True)
 
-# Mount static files
-app.mount("/static", StaticFiles(directory=FRONTEND_DIR), name="static")
+# Mount data files; frontend assets under /static are served from memory by the frontend router
 app.mount("/processed", StaticFiles(directory=PROCESSED_DIR), name="processed")
 app.mount("/categorized", StaticFiles(directory=CATEGORIZED_DIR), name="categorized")
 
@@ -45,7 +82,8 @@ app.include_router(files.router)
 app.include_router(ml.router)
 app.include_router(records.router)
 app.include_router(calc.router)
-app.include_router(calc_api.router)
+app.include_router(admin.router)
+app.include_router(monitoring.router)
 app.include_router(frontend.router)
 
 def main():
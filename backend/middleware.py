@@ -0,0 +1,199 @@
+import hashlib
+import time
+from typing import List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import TRACE_EXCLUDE, TRACE_BODY_PATHS
+from .security import is_admin_token
+from .services.memory_profiler import peak_rss_bytes, rss_bytes
+from .services.request_profiler import RequestProfiler, current_session, request_profiler
+from .services.request_trace import TraceRecorder, get_trace_recorder
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Flag values accepted in the X-Profile header or the ``profile`` query parameter
+_PROFILE_FLAGS = {"1": "cprofile", "true": "cprofile", "cprofile": "cprofile", "sample": "sample"}
+
+def _with_headers(send: Send, headers: dict) -> Send:
+    async def wrapped(message: Message) -> None:
+        if message["type"] == "http.response.start":
+            message.setdefault("headers", [])
+            message["headers"] = list(message["headers"]) + [
+                (name.encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()
+            ]
+        await send(message)
+    return wrapped
+
+class ProfilingMiddleware:
+    """Profile one request on demand: ``X-Profile: 1`` or ``?profile=1`` (``sample`` for the sampler).
+
+    Only honoured together with a valid X-Admin-Token; otherwise the flag
+    is ignored. The response carries ``X-Profile-Id`` when the request was
+    profiled and ``X-Profile-Status: rate-limited`` when another profile
+    is running or the last one was too recent. Results are read through
+    ``GET /admin/profiles/{id}``.
+    """
+
+    def __init__(self, app: ASGIApp, profiler: Optional[RequestProfiler] = None):
+        self.app = app
+        self.profiler = profiler or request_profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        flag = headers.get("x-profile")
+        if flag is None and b"profile=" in scope.get("query_string", b""):
+            flag = QueryParams(scope["query_string"]).get("profile")
+        if flag is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not is_admin_token(headers.get("x-admin-token")):
+            logger.warning(f"Ignoring profile request without admin token for {scope['path']}")
+            await self.app(scope, receive, send)
+            return
+        mode = _PROFILE_FLAGS.get(flag.strip().lower())
+        if mode is None:
+            await self.app(scope, receive, _with_headers(send, {"x-profile-status": "invalid-mode"}))
+            return
+        session = self.profiler.start(mode)
+        if session is None:
+            await self.app(scope, receive, _with_headers(send, {"x-profile-status": "rate-limited"}))
+            return
+
+        status = {}
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        token = current_session.set(session)
+        session.enable()
+        try:
+            await self.app(scope, receive, _with_headers(send_wrapper, {"x-profile-id": session.profile_id}))
+        finally:
+            session.disable()
+            current_session.reset(token)
+            try:
+                await run_in_threadpool(self.profiler.finish, session, {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status.get("code"),
+                })
+            except Exception as e:
+                logger.error(f"Failed to save profile {session.profile_id}: {e}")
+
+def _mb(value: Optional[int]) -> str:
+    return f"{value / 1048576:.1f}" if value is not None else "n/a"
+
+class RequestMemoryMiddleware:
+    """Log each request's duration, RSS and growth of the process peak RSS.
+
+    ``peak_rss_delta_mb`` is how much the request raised the process
+    high-water mark. It is non-zero only for requests that pushed memory
+    above anything seen before, which points at the files that blow up
+    memory. Concurrent requests share the process, so treat it as a hint.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = {}
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        peak_before = peak_rss_bytes()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            peak_after = peak_rss_bytes()
+            delta = peak_after - peak_before if peak_after is not None and peak_before is not None else None
+            logger.info(
+                f"{scope['method']} {scope['path']} status={status.get('code', 500)} "
+                f"duration_ms={(time.perf_counter() - start) * 1000:.1f} rss_mb={_mb(rss_bytes())} "
+                f"peak_rss_mb={_mb(peak_after)} peak_rss_delta_mb={_mb(delta)}"
+            )
+
+class TraceCaptureMiddleware:
+    """Record method, path, query, body digest, status and timing of each request.
+
+    Entries go to the rotating trace file of a TraceRecorder and can be
+    replayed with ``python -m backend.cli replay``. Headers are not
+    recorded apart from the content type, so admin tokens never end up in a
+    trace; paths starting with one of ``exclude`` are skipped. Bodies are
+    only stored for paths starting with one of ``body_paths``: the digest
+    and size of other bodies are recorded, their content is not.
+    """
+
+    def __init__(self, app: ASGIApp, recorder: Optional[TraceRecorder] = None,
+                 exclude: Optional[List[str]] = None, body_paths: Optional[List[str]] = None):
+        self.app = app
+        self.recorder = recorder
+        self.exclude = tuple(TRACE_EXCLUDE if exclude is None else exclude)
+        self.body_paths = tuple(TRACE_BODY_PATHS if body_paths is None else body_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or (self.exclude and scope["path"].startswith(self.exclude)):
+            await self.app(scope, receive, send)
+            return
+        recorder = self.recorder or get_trace_recorder()
+        keep_body = bool(self.body_paths) and scope["path"].startswith(self.body_paths)
+        digest = hashlib.sha256()
+        chunks: List[bytes] = []
+        body_size = 0
+        status = {}
+
+        async def receive_wrapper() -> Message:
+            nonlocal body_size
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                digest.update(chunk)
+                body_size += len(chunk)
+                if keep_body and body_size <= recorder.body_max_bytes:
+                    chunks.append(chunk)
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        ts = time.time()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            entry = {
+                "ts": round(ts, 6),
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "content_type": Headers(scope=scope).get("content-type"),
+                "body_bytes": body_size,
+                "body_sha256": digest.hexdigest(),
+                "status": status.get("code", 500),
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+            }
+            try:
+                await run_in_threadpool(
+                    recorder.record, entry,
+                    b"".join(chunks) if keep_body and body_size <= recorder.body_max_bytes else None,
+                )
+            except Exception as e:
+                logger.error(f"Failed to record request trace: {e}")
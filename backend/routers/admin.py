@@ -0,0 +1,147 @@
+import os
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+
+from ..services.bulk_categorizer import bulk_categorizer
+from ..services.model_trainer import ModelTrainer
+from ..services.request_profiler import request_profiler
+from ..services.memory_profiler import memory_profiler, build_operation
+from ..schemas import (
+    BulkCategorizeRequest, BulkCategorizeStatus, RetrainRequest, RetrainResponse, ProfileInfo,
+    MemoryTraceRequest, MemorySnapshotRequest, MemoryMeasureRequest, MemoryStatus, AllocationReport
+)
+from ..config import ML_RETRAIN_TIME_BUDGET
+from ..exceptions import MLModelError, FileNotFoundError, ValidationError
+from ..security import admin_enabled, is_admin_token
+from ..logging_config import get_logger
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+logger = get_logger(__name__)
+
+# Service instance
+model_trainer = ModelTrainer()
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Allow the request only with the configured X-Admin-Token header."""
+    if not admin_enabled():
+        raise HTTPException(status_code=403, detail={"error": "Admin endpoints are disabled (ADMIN_TOKEN not set)"})
+    if not is_admin_token(x_admin_token):
+        logger.warning("Rejected admin request with missing or invalid token")
+        raise HTTPException(status_code=401, detail={"error": "Invalid admin token"})
+
+@router.post("/ml/categorize-all", response_model=BulkCategorizeStatus, status_code=202,
+             dependencies=[Depends(require_admin)])
+async def categorize_all(req: BulkCategorizeRequest):
+    """Start re-categorizing every processed record in the background."""
+    started = bulk_categorizer.start(codes=req.codes, workers=req.workers, force=req.force, resume=req.resume)
+    if not started:
+        raise HTTPException(status_code=409, detail={"error": "Bulk categorization already running"})
+    
+    logger.info(f"Bulk categorization started with {req.workers} worker(s)")
+    return BulkCategorizeStatus(**bulk_categorizer.status())
+
+@router.get("/ml/categorize-all", response_model=BulkCategorizeStatus,
+            dependencies=[Depends(require_admin)])
+async def categorize_all_status():
+    """Progress of the current or last bulk categorization."""
+    return BulkCategorizeStatus(**bulk_categorizer.status())
+
+@router.post("/ml/retrain", response_model=RetrainResponse, dependencies=[Depends(require_admin)])
+async def retrain_model(req: RetrainRequest):
+    """Retrain from exported labels and promote the model if it does not regress."""
+    try:
+        result = await run_in_threadpool(
+            model_trainer.retrain,
+            export=req.export,
+            cold=req.cold,
+            promote=req.promote,
+            time_budget=req.time_budget or ML_RETRAIN_TIME_BUDGET,
+        )
+        return RetrainResponse(**result)
+        
+    except MLModelError as e:
+        logger.error(f"Retraining failed: {e}")
+        raise HTTPException(status_code=400, detail={"error": str(e)})
+    
+    except Exception as e:
+        logger.error(f"Unexpected error during retraining: {e}")
+        raise HTTPException(status_code=500, detail={"error": "Internal server error"})
+
+@router.get("/profiles", response_model=List[ProfileInfo], dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """Stored request profiles, newest first."""
+    return [ProfileInfo(**meta) for meta in request_profiler.list_profiles()]
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str, raw: bool = False):
+    """Top-N text summary of a profile, or its raw data (pstats dump or folded stacks) with ``raw=true``."""
+    try:
+        path, media_type = request_profiler.get_path(profile_id, "raw" if raw else "summary")
+        return FileResponse(path, media_type=media_type, filename=os.path.basename(path) if raw else None)
+        
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail={"error": str(e)})
+
+@router.get("/memory", response_model=MemoryStatus, dependencies=[Depends(require_admin)])
+async def memory_status():
+    """tracemalloc state, process RSS and stored snapshots."""
+    return MemoryStatus(**memory_profiler.status())
+
+@router.post("/memory/tracemalloc/start", response_model=MemoryStatus, dependencies=[Depends(require_admin)])
+async def start_tracemalloc(req: MemoryTraceRequest):
+    """Start tracing allocations with ``nframes`` frames per traceback."""
+    return MemoryStatus(**memory_profiler.start(req.nframes))
+
+@router.post("/memory/tracemalloc/stop", response_model=MemoryStatus, dependencies=[Depends(require_admin)])
+async def stop_tracemalloc():
+    """Stop tracing and drop the stored snapshots."""
+    return MemoryStatus(**memory_profiler.stop())
+
+@router.post("/memory/snapshots", response_model=AllocationReport, dependencies=[Depends(require_admin)])
+async def take_memory_snapshot(req: MemorySnapshotRequest):
+    """Take a snapshot and return its top allocation sites."""
+    try:
+        snapshot_id = await run_in_threadpool(memory_profiler.take_snapshot, req.label)
+        report = await run_in_threadpool(memory_profiler.top, snapshot_id, None, req.limit, req.group_by)
+        return AllocationReport(**report)
+        
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail={"error": str(e)})
+
+@router.get("/memory/snapshots/{snapshot_id}", response_model=AllocationReport,
+            dependencies=[Depends(require_admin)])
+async def get_memory_snapshot(snapshot_id: str, compare_to: Optional[str] = None,
+                              limit: int = Query(25, ge=1, le=500), group_by: str = "lineno"):
+    """Top allocation sites of a snapshot, or its growth since ``compare_to``."""
+    try:
+        report = await run_in_threadpool(memory_profiler.top, snapshot_id, compare_to, limit, group_by)
+        return AllocationReport(**report)
+        
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail={"error": str(e)})
+    
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail={"error": str(e)})
+
+@router.post("/memory/measure", response_model=AllocationReport, dependencies=[Depends(require_admin)])
+async def measure_memory(req: MemoryMeasureRequest):
+    """Run one operation on a record between two snapshots and return what it allocated."""
+    try:
+        operation = build_operation(req.operation, req.code, chapter=req.chapter, level=req.level, source=req.source)
+        report = await run_in_threadpool(
+            memory_profiler.measure, operation, f"{req.operation}:{req.code}", req.limit, req.group_by
+        )
+        return AllocationReport(**report)
+        
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail={"error": str(e)})
+    
+    except (ValidationError, MLModelError, ValueError) as e:
+        raise HTTPException(status_code=400, detail={"error": str(e)})
+    
+    except Exception as e:
+        logger.error(f"Memory measurement failed: {e}")
+        raise HTTPException(status_code=500, detail={"error": "Internal server error"})
@@ -2,6 +2,7 @@ from typing import Optional
 from fastapi import APIRouter, HTTPException, Query
 
 from ..services.bc3_service import BC3Service
+from ..services.request_profiler import run_in_threadpool
 from ..exceptions import FileNotFoundError
 from ..logging_config import get_logger
 
@@ -21,7 +22,9 @@ async def calc_tree(
 ):
     """Calculate and return BC3 budget tree with prices as JSON."""
     try:
-        result = bc3_service.calculate_tree(
+        # Off the event loop: identical concurrent requests wait on one computation
+        result = await run_in_threadpool(
+            bc3_service.calculate_tree,
             filename=filename,
             chapter=chapter,
             level=level,
@@ -1,35 +1,79 @@
-import os
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
 
-from ..config import FRONTEND_DIR, FRONTEND_ROUTE_MAP
+from ..config import FRONTEND_ROUTE_MAP, STATIC_MAX_AGE
+from ..services.static_assets import StaticAsset, get_static_assets
 from ..logging_config import get_logger
 
 router = APIRouter(tags=["frontend"])
 logger = get_logger(__name__)
 
-def _serve_frontend_file(filename: str):
-    """Return FileResponse for frontend file if it exists."""
-    file_path = os.path.join(FRONTEND_DIR, filename)
-    if not os.path.exists(file_path):
+def _accepts_gzip(accept_encoding: str) -> bool:
+    for token in accept_encoding.split(","):
+        coding, _, params = token.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            q = params.strip()
+            if not q.startswith("q="):
+                return True
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+    return False
+
+def _etag_matches(if_none_match: str, asset: StaticAsset) -> bool:
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or asset.etag in tags or asset.gzip_etag in tags
+
+def _asset_response(request: Request, asset: StaticAsset, immutable: bool) -> Response:
+    """Serve an asset from memory: gzip when accepted, 304 when the ETag matches.
+
+    Hashed URLs are cached for STATIC_MAX_AGE; pages and plain URLs are
+    revalidated on every use, which costs a 304 when nothing changed.
+    """
+    use_gzip = asset.gzip_body is not None and _accepts_gzip(request.headers.get("accept-encoding", ""))
+    headers = {
+        "ETag": asset.gzip_etag if use_gzip else asset.etag,
+        "Cache-Control": f"public, max-age={STATIC_MAX_AGE}, immutable" if immutable else "no-cache",
+    }
+    if asset.gzip_body is not None:
+        headers["Vary"] = "Accept-Encoding"
+    if _etag_matches(request.headers.get("if-none-match", ""), asset):
+        return Response(status_code=304, headers=headers)
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+    return Response(asset.gzip_body if use_gzip else asset.body, media_type=asset.content_type, headers=headers)
+
+def _serve_frontend_file(request: Request, filename: str) -> Response:
+    """Return the in-memory frontend file if it exists."""
+    asset, _ = get_static_assets().lookup(filename)
+    if asset is None:
         logger.warning(f"Frontend file not found: {filename}")
         raise HTTPException(
-            status_code=404, 
+            status_code=404,
             detail={"error": "Frontend file not found", "file": filename}
         )
-    
+
     logger.debug(f"Serving frontend file: {filename}")
-    return FileResponse(file_path)
+    return _asset_response(request, asset, immutable=False)
+
+@router.api_route("/static/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def serve_static(request: Request, path: str):
+    """Frontend assets; hashed names (``tree-utils.<hash>.js``) are cached long-term."""
+    asset, immutable = get_static_assets().lookup(path)
+    if asset is None:
+        raise HTTPException(status_code=404, detail={"error": "Static file not found", "file": path})
+    return _asset_response(request, asset, immutable)
 
 def _make_handler(filename: str):
     """Create handler function for serving specific frontend file."""
-    async def handler():
-        return _serve_frontend_file(filename)
-    
+    async def handler(request: Request):
+        return _serve_frontend_file(request, filename)
+
     # Give each handler a unique name for OpenAPI docs
     handler.__name__ = f"serve_{filename.replace('-', '_').replace('.', '_')}"
     return handler
 
 # Register all frontend routes dynamically
 for route, filename in FRONTEND_ROUTE_MAP.items():
-    router.get(route)(_make_handler(filename))
\ No newline at end of file
+    router.get(route)(_make_handler(filename))
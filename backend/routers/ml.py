@@ -1,10 +1,19 @@
-from fastapi import APIRouter, HTTPException
+import json
+from typing import AsyncIterator, List, Optional, Union
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
 from ..services.ml_service import MLService
+from ..services.inference_executor import inference_executor
+from ..services.request_profiler import run_in_threadpool
+from ..services.uncertainty_index import get_uncertainty_index
 from ..schemas import (
     PredictRequest, PredictionResult, MLStatusResponse, 
-    ClassesResponse
+    ClassesResponse, BatchPredictRequest, BatchPredictResponse, UncertainResponse,
+    SimilarResponse, PropagateLabelRequest, PropagateLabelResponse, QualityMetricsResponse
 )
+from ..config import ML_BATCH_SIZE, ML_BATCH_MAX_ITEMS, ML_BATCH_STREAM_MAX_ITEMS
 from ..exceptions import MLModelError, MLModelNotFoundError, FileNotFoundError
 from ..logging_config import get_logger
 
@@ -18,7 +27,7 @@ ml_service = MLService()
 async def predict(req: PredictRequest):
     """Make ML prediction for text classification."""
     try:
-        result = ml_service.predict_topk(
+        result = await inference_executor.predict(
             text=req.text, 
             topk=req.topk, 
             descriptive=req.descriptive
@@ -35,11 +44,81 @@ async def predict(req: PredictRequest):
         logger.error(f"Unexpected error during prediction: {e}")
         raise HTTPException(status_code=500, detail={"error": "Internal server error"})
 
+def _predict_items(items: List[PredictRequest], isolate_errors: bool = False) -> List[Union[dict, Exception]]:
+    """Run one vectorized prediction for a list of predict requests.
+    
+    With ``isolate_errors`` a failing input gets its error in its slot
+    instead of failing the whole list.
+    """
+    predict = ml_service.predict_topk_each if isolate_errors else ml_service.predict_topk_batch
+    return predict(
+        [ml_service.build_input_text(item.text, item.descriptive) for item in items],
+        topk=[item.topk for item in items],
+    )
+
+async def _stream_predictions(items: List[PredictRequest]) -> AsyncIterator[str]:
+    """Yield NDJSON lines with predictions, one model call per chunk.
+    
+    Chunks run on the inference thread like every other model call, so a
+    long stream interleaves with micro-batches instead of running beside them.
+    """
+    for start in range(0, len(items), ML_BATCH_SIZE):
+        chunk = items[start:start + ML_BATCH_SIZE]
+        try:
+            results = await inference_executor.run(_predict_items, chunk, True)
+        except Exception as e:
+            logger.error(f"Batch prediction chunk at {start} failed: {e}")
+            for offset in range(len(chunk)):
+                yield json.dumps({"index": start + offset, "error": str(e)}, ensure_ascii=False) + "\n"
+            continue
+        
+        for offset, result in enumerate(results):
+            if isinstance(result, Exception):
+                yield json.dumps({"index": start + offset, "error": str(result)}, ensure_ascii=False) + "\n"
+            else:
+                yield json.dumps({"index": start + offset, **result}, ensure_ascii=False) + "\n"
+
+@router.post("/predict/batch", response_model=BatchPredictResponse)
+async def predict_batch(req: BatchPredictRequest):
+    """Make ML predictions for many texts; results keep the request order.
+    
+    With ``stream: true`` the results are returned as NDJSON, one line per
+    item with its ``index``, predicted in chunks of ML_BATCH_SIZE.
+    """
+    limit = ML_BATCH_STREAM_MAX_ITEMS if req.stream else ML_BATCH_MAX_ITEMS
+    if len(req.items) > limit:
+        raise HTTPException(
+            status_code=413,
+            detail={"error": f"Too many items: {len(req.items)} (max {limit})"}
+        )
+    
+    if req.stream:
+        logger.info(f"Streaming batch prediction for {len(req.items)} items")
+        return StreamingResponse(_stream_predictions(req.items), media_type="application/x-ndjson")
+    
+    try:
+        results = await inference_executor.run(_predict_items, req.items)
+        
+        logger.info(f"Batch prediction completed for {len(results)} items")
+        return BatchPredictResponse(
+            results=[PredictionResult(**result) for result in results],
+            count=len(results)
+        )
+        
+    except (MLModelError, MLModelNotFoundError) as e:
+        logger.error(f"ML batch prediction error: {e}")
+        raise HTTPException(status_code=500, detail={"error": str(e)})
+    
+    except Exception as e:
+        logger.error(f"Unexpected error during batch prediction: {e}")
+        raise HTTPException(status_code=500, detail={"error": "Internal server error"})
+
 @router.get("/ml/status", response_model=MLStatusResponse)
 async def get_ml_status():
     """Get ML model availability and status."""
     try:
-        status = ml_service.get_model_status()
+        status = await inference_executor.run(ml_service.get_model_status)
+        status["executor"] = inference_executor.stats()
         return MLStatusResponse(**status)
         
     except Exception as e:
@@ -50,6 +129,86 @@ async def get_ml_status():
             error=str(e)
         )
 
+@router.get("/ml/metrics", response_model=QualityMetricsResponse)
+async def get_quality_metrics():
+    """Live accuracy, per-class precision/recall and confusion matrix of labelled nodes."""
+    try:
+        return QualityMetricsResponse(**ml_service.get_quality_metrics())
+        
+    except Exception as e:
+        logger.error(f"Failed to read quality metrics: {e}")
+        raise HTTPException(status_code=500, detail={"error": "Failed to read quality metrics"})
+
+@router.get("/ml/uncertain", response_model=UncertainResponse)
+async def get_uncertain_nodes(
+    limit: int = Query(50, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    sort: str = Query("margin"),
+    include_labelled: bool = Query(False),
+    label: Optional[str] = Query(None),
+    code: Optional[str] = Query(None),
+    with_total: Optional[bool] = Query(None),
+):
+    """Least confident PARTIDA predictions across all records, for labelling.
+    
+    ``sort=margin`` orders by smallest top-1/top-2 gap, ``sort=entropy`` by
+    highest entropy. Labelled nodes are skipped unless ``include_labelled``.
+    ``total`` is counted for the first page, or any page with ``with_total=true``.
+    """
+    try:
+        # Off the event loop: SQLite queries on the shared index
+        page = await run_in_threadpool(
+            get_uncertainty_index().query,
+            limit=limit, offset=offset, sort=sort,
+            include_labelled=include_labelled, label=label, code=code,
+            with_total=offset == 0 if with_total is None else with_total,
+        )
+        return UncertainResponse(**page)
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"error": str(e)})
+    
+    except Exception as e:
+        logger.error(f"Failed to query uncertainty index: {e}")
+        raise HTTPException(status_code=500, detail={"error": "Failed to query uncertainty index"})
+
+@router.get("/ml/similar", response_model=SimilarResponse)
+async def get_similar_nodes(
+    text: str = Query(..., min_length=1),
+    mode: str = Query("near"),
+    threshold: float = Query(0.8, gt=0, le=1),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """PARTIDAs across all records with the same or a near-identical summary.
+    
+    ``mode=exact`` returns normalized-text matches; ``mode=near`` proposes
+    MinHash LSH candidates whose shingle similarity reaches ``threshold``.
+    """
+    if mode not in ("exact", "near"):
+        raise HTTPException(status_code=400, detail={"error": "Invalid mode. Allowed: ['exact', 'near']"})
+    try:
+        # Imported on first use: the text index pulls in numpy
+        from ..services.text_index import get_text_index
+        index = get_text_index()
+        items = index.exact_matches(text)[:limit] if mode == "exact" else index.similar(text, threshold, limit)
+        return SimilarResponse(text=text, mode=mode, items=items, count=len(items))
+        
+    except Exception as e:
+        logger.error(f"Failed to query text index: {e}")
+        raise HTTPException(status_code=500, detail={"error": "Failed to query text index"})
+
+@router.post("/ml/propagate-label", response_model=PropagateLabelResponse)
+async def propagate_label(req: PropagateLabelRequest):
+    """Apply a user label to every PARTIDA whose normalized summary equals ``text``."""
+    try:
+        # Off the event loop: per-record file I/O behind the record locks
+        result = await run_in_threadpool(ml_service.propagate_label, req.text, req.user_label, overwrite=req.overwrite)
+        return PropagateLabelResponse(text=req.text, user_label=req.user_label, **result)
+        
+    except Exception as e:
+        logger.error(f"Failed to propagate label: {e}")
+        raise HTTPException(status_code=500, detail={"error": "Failed to propagate label"})
+
 @router.get("/api/classes", response_model=ClassesResponse)
 async def get_all_classes():
     """Get all available classification classes from metrics file."""
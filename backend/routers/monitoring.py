@@ -0,0 +1,44 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from ..services.metrics import metrics_registry
+from ..services.model_registry import model_registry
+from ..services.inference_executor import inference_executor
+from ..services.request_profiler import run_in_threadpool
+from ..logging_config import get_logger
+
+router = APIRouter(tags=["monitoring"])
+logger = get_logger(__name__)
+
+def _cache_sizes():
+    stats = model_registry.cache.stats()
+    return {
+        ("memory",): stats["memory_entries"],
+        ("disk",): stats["disk_entries"],
+    }
+
+def _cache_hit_rate():
+    return {(): model_registry.cache.hit_rate()}
+
+# Gauges are read at scrape time; only _cache_sizes queries SQLite
+metrics_registry.gauge(
+    "ml_prediction_cache_entries", "Entries in the prediction cache, by tier.", ["tier"], callback=_cache_sizes
+)
+metrics_registry.gauge(
+    "ml_prediction_cache_hit_rate", "Prediction cache hit rate since start.", callback=_cache_hit_rate
+)
+metrics_registry.gauge(
+    "ml_inference_queue_depth", "Predictions waiting for a micro-batch.",
+    callback=lambda: {(): inference_executor.queue_depth()}
+)
+metrics_registry.gauge(
+    "ml_model_loaded", "1 when an ML model is loaded.",
+    callback=lambda: {(): 1 if model_registry.is_loaded() else 0}
+)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of stage latencies, counters and gauges."""
+    # Off the event loop: gauge callbacks count the prediction cache's SQLite rows
+    body = await run_in_threadpool(metrics_registry.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,18 +1,16 @@
-import json
-import os
 from typing import List, Dict, Optional
 from fastapi import APIRouter, HTTPException, Query
 
 from ..services.registry_service import RegistryService
 from ..services.ml_service import MLService
+from ..services.request_profiler import run_in_threadpool
 from ..schemas import (
     RecordFilter, SetLabelRequest, MLProcessResponse, 
-    LabelUpdateResponse
+    LabelUpdateResponse, SetLabelsRequest, LabelsUpdateResponse
 )
-from ..config import PROCESSED_DIR
 from ..exceptions import (
     InvalidLocalizationError, InvalidYearError, FileNotFoundError,
-    MLModelError, RegistryError
+    MLModelError, RegistryError, NodeNotFoundError
 )
 from ..logging_config import get_logger
 
@@ -50,21 +48,21 @@ async def get_records(
         raise HTTPException(status_code=500, detail={"error": "Failed to retrieve records"})
 
 @router.post("/records/{code}/ml", response_model=MLProcessResponse)
-async def run_ml_on_record(code: str):
-    """Process a record with ML categorization."""
+async def run_ml_on_record(
+    code: str,
+    chapter: Optional[str] = Query(None),
+    force: bool = Query(False),
+):
+    """Process a record with ML categorization.
+    
+    Only PARTIDAs whose text or model version changed are predicted; user
+    labels are kept. ``chapter`` limits the run to one subtree and ``force``
+    re-predicts every node.
+    """
     try:
-        # Load processed JSON file
-        input_path = os.path.join(PROCESSED_DIR, f"{code}.json")
-        if not os.path.exists(input_path):
-            logger.warning(f"Processed JSON not found: {input_path}")
-            raise HTTPException(status_code=404, detail={"error": "Processed JSON not found"})
-        
-        with open(input_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        
-        # Process with ML
+        # Process with ML off the event loop; identical concurrent runs share one computation
         try:
-            output_path = ml_service.process_record_ml(code, data)
+            result = await run_in_threadpool(ml_service.run_record_ml, code, chapter=chapter, force=force)
             
             # Update registry with success
             registry_service.update_ml_status(code, success=True)
@@ -73,9 +71,18 @@ async def run_ml_on_record(code: str):
             return MLProcessResponse(
                 message="ML categorization completed",
                 code=code,
-                categorized_path=output_path
+                chapter=chapter,
+                **result
             )
             
+        except NodeNotFoundError as e:
+            logger.warning(f"Chapter not found for ML processing of {code}: {e}")
+            raise HTTPException(status_code=404, detail={"error": str(e)})
+        
+        except FileNotFoundError as e:
+            logger.warning(f"Processed JSON not found for {code}")
+            raise HTTPException(status_code=404, detail={"error": str(e)})
+            
         except MLModelError as e:
             # Update registry with failure
             registry_service.update_ml_status(code, success=False, error=str(e))
@@ -93,7 +100,9 @@ async def run_ml_on_record(code: str):
 async def set_user_label(code: str, req: SetLabelRequest):
     """Set or update user label for a PARTIDA node in categorized JSON."""
     try:
-        ml_service.update_user_label(
+        # Off the event loop: it waits for the record lock while an ML run writes the record
+        await run_in_threadpool(
+            ml_service.update_user_label,
             code=code,
             node_code=req.node_code,
             user_label=req.user_label,
@@ -118,4 +127,45 @@ async def set_user_label(code: str, req: SetLabelRequest):
     
     except Exception as e:
         logger.error(f"Unexpected error during label update: {e}")
-        raise HTTPException(status_code=500, detail={"error": "Internal server error"})
\ No newline at end of file
+        raise HTTPException(status_code=500, detail={"error": "Internal server error"})
+
+@router.post("/records/{code}/labels", response_model=LabelsUpdateResponse)
+async def set_user_labels(code: str, req: SetLabelsRequest):
+    """Apply many node labels with a single load/save of the categorized JSON.
+    
+    Every node sharing a code is updated. Unknown node codes are reported in
+    ``not_found``; the request fails with 404 only if none was found.
+    """
+    try:
+        result = await run_in_threadpool(
+            ml_service.update_user_labels,
+            code,
+            [(item.node_code, item.user_label, item.apply_to_subtree) for item in req.labels]
+        )
+        
+        if len(result["not_found"]) == len(req.labels):
+            raise HTTPException(status_code=404, detail={"error": "Node code not found"})
+        
+        logger.info(f"{len(result['changed'])} labels updated in {code}")
+        return LabelsUpdateResponse(
+            message="Labels updated",
+            code=code,
+            changed=result["changed"],
+            count=len(result["changed"]),
+            not_found=result["not_found"]
+        )
+        
+    except HTTPException:
+        raise
+    
+    except FileNotFoundError as e:
+        logger.warning(f"File not found for label update: {e}")
+        raise HTTPException(status_code=404, detail={"error": str(e)})
+    
+    except MLModelError as e:
+        logger.error(f"Failed to update labels: {e}")
+        raise HTTPException(status_code=500, detail={"error": str(e)})
+    
+    except Exception as e:
+        logger.error(f"Unexpected error during labels update: {e}")
+        raise HTTPException(status_code=500, detail={"error": "Internal server error"})
@@ -61,8 +61,8 @@ async def upload_file(
             processed_filename=f"{code}.json"
         )
         
-        entries.append(record)
-        registry_service.save_registry(entries)
+        with registry_service.transaction() as current_entries:
+            current_entries.append(record)
         
         logger.info(f"Successfully processed upload for code {code}")
         
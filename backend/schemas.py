@@ -13,11 +13,189 @@ class PredictionResult(BaseModel):
     topk_labels: List[str]
     topk_probas: List[float]
 
+class BatchPredictRequest(BaseModel):
+    items: List[PredictRequest] = Field(..., min_length=1)
+    stream: bool = False
+
+class BatchPredictResponse(BaseModel):
+    results: List[PredictionResult]
+    count: int
+
+class BulkCategorizeRequest(BaseModel):
+    codes: Optional[List[str]] = None
+    workers: int = Field(default=1, ge=1, le=64)
+    force: bool = False
+    resume: bool = True
+
+class BulkCategorizeStatus(BaseModel):
+    running: bool
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    model_version: Optional[str] = None
+    total: int = 0
+    resumed: int = 0
+    done: int = 0
+    workers: int = 1
+    succeeded: Optional[int] = None
+    failed: Optional[int] = None
+    predicted: Optional[int] = None
+    reused: Optional[int] = None
+    errors: Dict[str, Optional[str]] = {}
+    error: Optional[str] = None
+
+class RetrainRequest(BaseModel):
+    export: bool = True
+    cold: bool = False
+    promote: bool = True
+    time_budget: Optional[float] = Field(default=None, gt=0)
+
+class RetrainResponse(BaseModel):
+    version: str
+    artifact_path: str
+    mode: str
+    base_model_digest: str
+    model_digest: str
+    train_rows: int
+    holdout_rows: int
+    skipped_unknown_labels: int
+    train_seconds: float
+    current: Dict[str, Any]
+    candidate: Dict[str, Any]
+    classes: List[str]
+    promoted: bool
+    model_version: Optional[str] = None
+    reason: Optional[str] = None
+
+class UncertainNode(BaseModel):
+    code: str
+    position: int
+    node_code: Optional[str]
+    summary: Optional[str]
+    predicted_label: Optional[str]
+    predicted_proba: Optional[float]
+    topk_labels: List[str]
+    topk_probas: List[float]
+    margin: float
+    entropy: float
+    user_label: Optional[str] = None
+    model_version: Optional[str] = None
+
+class UncertainResponse(BaseModel):
+    items: List[UncertainNode]
+    total: Optional[int] = None
+    limit: int
+    offset: int
+    sort: str
+
+class SimilarNode(BaseModel):
+    code: str
+    position: int
+    node_code: Optional[str]
+    summary: Optional[str]
+    predicted_label: Optional[str] = None
+    user_label: Optional[str] = None
+    similarity: float
+
+class SimilarResponse(BaseModel):
+    text: str
+    mode: str
+    items: List[SimilarNode]
+    count: int
+
+class PropagateLabelRequest(BaseModel):
+    text: str = Field(..., min_length=1)
+    user_label: str = Field(..., min_length=1)
+    overwrite: bool = False
+
+class PropagateLabelResponse(BaseModel):
+    text: str
+    user_label: str
+    matched: int
+    changed: int
+    skipped: int
+    records: Dict[str, int]
+
+class QualityMetricsResponse(BaseModel):
+    predictions: int
+    labelled: int
+    correct: int
+    accuracy: Optional[float]
+    per_class: Dict[str, Dict[str, Any]]
+    confusion: Dict[str, Dict[str, int]]
+    predicted_counts: Dict[str, int]
+    classes: Optional[List[str]] = None
+    offline: Optional[Dict[str, Any]] = None
+
+class ProfileInfo(BaseModel):
+    id: str
+    mode: str
+    method: Optional[str] = None
+    path: Optional[str] = None
+    status: Optional[int] = None
+    duration_seconds: float
+    created: str
+    threadpool_calls: Optional[int] = None
+
+class MemoryTraceRequest(BaseModel):
+    nframes: int = Field(default=10, ge=1, le=100)
+
+class MemorySnapshotRequest(BaseModel):
+    label: Optional[str] = None
+    limit: int = Field(default=25, ge=1, le=500)
+    group_by: str = "lineno"
+
+class MemoryMeasureRequest(BaseModel):
+    operation: str
+    code: str
+    chapter: Optional[str] = None
+    level: Optional[int] = None
+    source: str = "processed"
+    limit: int = Field(default=25, ge=1, le=500)
+    group_by: str = "lineno"
+
+class MemorySnapshotInfo(BaseModel):
+    id: str
+    label: Optional[str] = None
+    created: str
+    traced_bytes: int
+
+class MemoryStatus(BaseModel):
+    tracing: bool
+    traceback_limit: int
+    traced_current_bytes: int
+    traced_peak_bytes: int
+    rss_bytes: Optional[int] = None
+    peak_rss_bytes: Optional[int] = None
+    snapshots: List[MemorySnapshotInfo] = []
+
+class AllocationSite(BaseModel):
+    location: str
+    size_bytes: int
+    count: int
+    size_diff_bytes: Optional[int] = None
+    count_diff: Optional[int] = None
+    traceback: Optional[List[str]] = None
+
+class AllocationReport(BaseModel):
+    snapshot: str
+    compare_to: Optional[str] = None
+    group_by: str
+    total_bytes: int
+    sites: List[AllocationSite]
+    operation: Optional[str] = None
+    seconds: Optional[float] = None
+    traced_peak_bytes: Optional[int] = None
+    rss_bytes: Optional[int] = None
+    peak_rss_bytes: Optional[int] = None
+
 class SetLabelRequest(BaseModel):
     node_code: str
     user_label: Optional[str] = None
     apply_to_subtree: bool = False
 
+class SetLabelsRequest(BaseModel):
+    labels: List[SetLabelRequest] = Field(..., min_length=1)
+
 class UploadResponse(BaseModel):
     message: str
     code: str
@@ -37,6 +215,20 @@ class MLStatusResponse(BaseModel):
     model_path: str
     loaded: bool
     error: Optional[str] = None
+    model_version: Optional[str] = None
+    engine: Optional[str] = None
+    model_digest: Optional[str] = None
+    loaded_at: Optional[str] = None
+    load_seconds: Optional[float] = None
+    warmup_seconds: Optional[float] = None
+    memory_bytes: Optional[int] = None
+    rss_delta_bytes: Optional[int] = None
+    file_size: Optional[int] = None
+    reloads: int = 0
+    watching: bool = False
+    mmap_mode: Optional[str] = None
+    cache: Optional[Dict[str, Any]] = None
+    executor: Optional[Dict[str, Any]] = None
 
 class ClassesResponse(BaseModel):
     classes: List[str]
@@ -47,6 +239,12 @@ class MLProcessResponse(BaseModel):
     message: str
     code: str
     categorized_path: str
+    chapter: Optional[str] = None
+    partidas: int = 0
+    predicted: int = 0
+    reused: int = 0
+    labels_carried: int = 0
+    failed: int = 0
 
 class LabelUpdateResponse(BaseModel):
     message: str
@@ -54,6 +252,19 @@ class LabelUpdateResponse(BaseModel):
     node_code: str
     user_label: Optional[str]
 
+class ChangedLabel(BaseModel):
+    node_code: Optional[str]
+    summary: Optional[str] = None
+    user_label: Optional[str] = None
+    predicted_label: Optional[str] = None
+
+class LabelsUpdateResponse(BaseModel):
+    message: str
+    code: str
+    changed: List[ChangedLabel]
+    count: int
+    not_found: List[str] = []
+
 class RecordModel(BaseModel):
     code: str
     project_name: str
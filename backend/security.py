@@ -0,0 +1,21 @@
+import hmac
+from typing import Optional
+
+from .config import ADMIN_TOKEN
+
+def admin_enabled() -> bool:
+    """Admin features are disabled while ADMIN_TOKEN is unset."""
+    return bool(ADMIN_TOKEN)
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """Constant-time check of a token against ADMIN_TOKEN.
+
+    Bytes are compared, since ``hmac.compare_digest`` rejects non-ASCII
+    strings; a missing header or one that cannot be encoded is not admin.
+    """
+    if not ADMIN_TOKEN or not token:
+        return False
+    try:
+        return hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+    except UnicodeError:
+        return False
@@ -0,0 +1,422 @@
+"""Production pre-fork server for ``backend.main:app``.
+
+The master process imports the app, loads and warms up the ML model and the
+prediction cache, then forks the workers. Everything loaded before the fork
+is shared copy-on-write, so N workers do not pay for N copies of the model.
+Each worker runs uvicorn on the shared listening socket.
+
+Signals handled by the master:
+
+- ``SIGHUP``: graceful restart. The model is reloaded in the master when its
+  file changed, replacement workers are forked, and the old ones finish their
+  in-flight requests before exiting. The master also does this by itself when
+  it sees the model file change; workers do not watch it.
+- ``SIGTERM`` / ``SIGINT``: graceful shutdown (a second one kills the workers).
+- ``SIGUSR1``: log the RSS/PSS of the master and of every worker.
+
+Workers that exit, because they reached their request limit or crashed, are
+replaced. Metrics are shared through a directory (``METRICS_MULTIPROC_DIR``)
+so that ``/metrics`` reports the totals of all workers, including recycled
+ones, whichever worker serves the scrape. Run it with ``python -m backend.server`` or ``poetry run serve``.
+"""
+import argparse
+import gc
+import os
+import random
+import select
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from .config import (
+    SERVER_HOST, SERVER_PORT, SERVER_WORKERS, SERVER_MAX_REQUESTS, SERVER_MAX_REQUESTS_JITTER,
+    SERVER_GRACEFUL_TIMEOUT, SERVER_BACKLOG, SERVER_MEMORY_REPORT_INTERVAL, SERVER_PRELOAD_PREDICTIONS,
+    METRICS_MULTIPROC_DIR, METRICS_FLUSH_INTERVAL, ML_MODEL_WATCH_INTERVAL, PREFORK_WORKER_ENV,
+)
+from .exceptions import MLModelError
+from .logging_config import get_logger
+from .services.memory_profiler import process_memory
+from .services.metrics import metrics_registry
+
+logger = get_logger(__name__)
+
+# A worker dying sooner than this after boot is restarted with a growing delay
+_MIN_WORKER_LIFETIME = 5.0
+_MAX_RESPAWN_DELAY = 30.0
+
+def _mb(value: Optional[int]) -> str:
+    return f"{value / 1048576:.1f}" if value is not None else "n/a"
+
+@dataclass
+class WorkerProcess:
+    pid: int
+    slot: int
+    started: float
+    max_requests: Optional[int]
+    retiring: bool = False
+    kill_at: Optional[float] = None
+
+class PreforkServer:
+    """Master process: preload, bind, fork and supervise uvicorn workers."""
+
+    def __init__(self, host: str = SERVER_HOST, port: int = SERVER_PORT, workers: int = SERVER_WORKERS,
+                 max_requests: int = SERVER_MAX_REQUESTS, max_requests_jitter: int = SERVER_MAX_REQUESTS_JITTER,
+                 graceful_timeout: int = SERVER_GRACEFUL_TIMEOUT, backlog: int = SERVER_BACKLOG,
+                 memory_report_interval: float = SERVER_MEMORY_REPORT_INTERVAL):
+        self.host = host
+        self.port = port
+        self.num_workers = max(1, workers)
+        self.max_requests = max(0, max_requests)
+        self.max_requests_jitter = max(0, max_requests_jitter)
+        self.graceful_timeout = max(1, graceful_timeout)
+        self.backlog = backlog
+        self.memory_report_interval = memory_report_interval
+        self.app: Any = None
+        self.sock: Optional[socket.socket] = None
+        self.workers: Dict[int, WorkerProcess] = {}
+        self._signals: List[int] = []
+        self._wakeup: Optional[tuple] = None
+        self._stopping = False
+        self._respawn_delay: Dict[int, float] = {}
+        self._respawn_at: Dict[int, float] = {}
+
+    # -- master ---------------------------------------------------------------
+
+    def preload(self) -> None:
+        """Import the app and warm the model, caches and frontend assets the workers will share."""
+        start = time.perf_counter()
+        from .main import app
+        from .services.static_assets import get_static_assets
+        self.app = app
+        get_static_assets()
+        self._load_model()
+        logger.info(
+            f"Preloaded app in {time.perf_counter() - start:.2f}s, "
+            f"master rss_mb={_mb((process_memory() or {}).get('rss_bytes'))}"
+        )
+
+    def _load_model(self) -> None:
+        from .services.model_registry import model_registry
+
+        try:
+            model = model_registry.load()
+            cached = model_registry.cache.preload(SERVER_PRELOAD_PREDICTIONS)
+            logger.info(f"ML model {model.version} ({model.engine}) preloaded with {cached} cached predictions")
+        except MLModelError as e:
+            logger.warning(f"ML model not preloaded, workers will load it on demand: {e}")
+        # Keep the collector away from everything loaded so far: a collection
+        # in a worker would otherwise write to (and un-share) those pages
+        gc.collect()
+        gc.freeze()
+
+    def _setup_metrics(self) -> Optional[str]:
+        """Point the metrics registry at a fresh shared directory; returns it if it is temporary."""
+        directory = METRICS_MULTIPROC_DIR
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            for name in os.listdir(directory):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(directory, name))
+            temporary = None
+        else:
+            directory = temporary = tempfile.mkdtemp(prefix="bc3-metrics-")
+        metrics_registry.enable_multiprocess(directory)
+        return temporary
+
+    def bind(self) -> None:
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(self.backlog)
+        sock.set_inheritable(True)
+        self.sock = sock
+
+    def _install_signals(self) -> None:
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(read_fd, False)
+        os.set_blocking(write_fd, False)
+        self._wakeup = (read_fd, write_fd)
+        signal.set_wakeup_fd(write_fd)
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGUSR1, signal.SIGCHLD):
+            signal.signal(sig, self._on_signal)
+
+    def _on_signal(self, signum: int, frame: Any) -> None:
+        self._signals.append(signum)
+
+    def _sleep(self, timeout: float) -> None:
+        try:
+            ready, _, _ = select.select([self._wakeup[0]], [], [], timeout)
+        except InterruptedError:
+            return
+        if ready:
+            try:
+                while os.read(self._wakeup[0], 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def run(self) -> int:
+        if not hasattr(os, "fork"):
+            logger.error("The pre-fork server needs os.fork; use `poetry run backend` on this platform")
+            return 1
+        boot_start = time.perf_counter()
+        # Inherited by the workers, whose lifespan then leaves the model to the master
+        os.environ[PREFORK_WORKER_ENV] = "1"
+        metrics_dir = self._setup_metrics()
+        self.preload()
+        self.bind()
+        self._install_signals()
+        for slot in range(self.num_workers):
+            self.spawn(slot)
+        logger.info(
+            f"Master {os.getpid()} listening on http://{self.host}:{self.port} with {self.num_workers} "
+            f"worker(s), startup {time.perf_counter() - boot_start:.2f}s"
+        )
+
+        # First memory report once the workers had time to run their lifespan
+        next_report = time.monotonic() + 10
+        next_model_check = time.monotonic() + ML_MODEL_WATCH_INTERVAL
+        while True:
+            self._sleep(1.0)
+            self._reap()
+            while self._signals:
+                self._handle_signal(self._signals.pop(0))
+            if self._stopping and not self.workers:
+                break
+            self._kill_overdue()
+            if not self._stopping:
+                if ML_MODEL_WATCH_INTERVAL > 0 and time.monotonic() >= next_model_check:
+                    next_model_check = time.monotonic() + ML_MODEL_WATCH_INTERVAL
+                    if self._model_reloaded():
+                        logger.info("Model file changed")
+                        self.restart()
+                self._maintain()
+                if next_report is not None and time.monotonic() >= next_report:
+                    self.log_memory()
+                    interval = self.memory_report_interval
+                    next_report = time.monotonic() + interval if interval > 0 else None
+
+        self.sock.close()
+        if metrics_dir is not None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+        logger.info("Master stopped")
+        return 0
+
+    def _handle_signal(self, signum: int) -> None:
+        if signum == signal.SIGCHLD:
+            return
+        if signum == signal.SIGUSR1:
+            self.log_memory()
+        elif signum == signal.SIGHUP:
+            if not self._stopping:
+                self.restart()
+        elif self._stopping:
+            logger.warning("Second stop signal, killing workers")
+            for worker in self.workers.values():
+                self._kill(worker.pid, signal.SIGKILL)
+        else:
+            logger.info(f"Received {signal.Signals(signum).name}, stopping workers gracefully")
+            self._stopping = True
+            self._retire(list(self.workers.values()))
+
+    @staticmethod
+    def _model_reloaded() -> bool:
+        """Load a changed model file; only a successful load is worth restarting workers for."""
+        from .services.model_registry import model_registry
+
+        return model_registry.reload_if_changed()
+
+    def restart(self) -> None:
+        """Replace every worker with one forked from a refreshed master."""
+        from .services.static_assets import get_static_assets
+
+        logger.info("Graceful restart: reloading the model and replacing workers")
+        old = [worker for worker in self.workers.values() if not worker.retiring]
+        get_static_assets().build()
+        self._load_model()
+        # Replacements accept connections while the old workers drain theirs
+        for worker in old:
+            worker.retiring = True
+            self.spawn(worker.slot)
+        self._retire(old)
+
+    def _retire(self, workers: List[WorkerProcess]) -> None:
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        for worker in workers:
+            worker.retiring = True
+            worker.kill_at = deadline
+            self._kill(worker.pid, signal.SIGTERM)
+
+    def _kill(self, pid: int, sig: int) -> None:
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _kill_overdue(self) -> None:
+        now = time.monotonic()
+        for worker in list(self.workers.values()):
+            if worker.kill_at is not None and now >= worker.kill_at:
+                logger.warning(f"Worker {worker.pid} did not stop within {self.graceful_timeout}s, killing it")
+                self._kill(worker.pid, signal.SIGKILL)
+                worker.kill_at = None
+
+    def _reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            try:
+                metrics_registry.archive_process(pid)
+            except OSError as e:
+                logger.warning(f"Could not archive the metrics of worker {pid}: {e}")
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            lived = time.monotonic() - worker.started
+            if worker.retiring or self._stopping:
+                logger.info(f"Worker {pid} stopped")
+            elif code == 0:
+                logger.info(f"Worker {pid} exited after {lived:.0f}s (request limit reached), replacing it")
+                self._respawn_delay.pop(worker.slot, None)
+            else:
+                logger.error(f"Worker {pid} exited with code {code} after {lived:.1f}s, replacing it")
+                if lived < _MIN_WORKER_LIFETIME:
+                    delay = min(_MAX_RESPAWN_DELAY, self._respawn_delay.get(worker.slot, 0.5) * 2)
+                    self._respawn_delay[worker.slot] = delay
+                    self._respawn_at[worker.slot] = time.monotonic() + delay
+                    logger.warning(f"Delaying worker restart for slot {worker.slot} by {delay:.0f}s")
+                else:
+                    self._respawn_delay.pop(worker.slot, None)
+
+    def _maintain(self) -> None:
+        active = {worker.slot for worker in self.workers.values() if not worker.retiring}
+        now = time.monotonic()
+        for slot in range(self.num_workers):
+            if slot not in active and now >= self._respawn_at.get(slot, 0):
+                self._respawn_at.pop(slot, None)
+                self.spawn(slot)
+
+    def memory_report(self) -> Dict[str, Any]:
+        """RSS/PSS of the master and every live worker, in bytes."""
+        workers = {pid: process_memory(pid) for pid in sorted(self.workers)}
+        usages = [usage for usage in workers.values() if usage]
+        master = process_memory()
+        return {
+            "master": master,
+            "workers": workers,
+            "total_pss_bytes": sum(u["pss_bytes"] for u in usages) + (master or {}).get("pss_bytes", 0),
+            "total_rss_bytes": sum(u["rss_bytes"] for u in usages) + (master or {}).get("rss_bytes", 0),
+        }
+
+    def log_memory(self) -> None:
+        report = self.memory_report()
+        if report["master"] is None:
+            logger.info("Per-worker memory is only reported on Linux")
+            return
+        for pid, usage in report["workers"].items():
+            if usage:
+                logger.info(
+                    f"Worker {pid} rss_mb={_mb(usage['rss_bytes'])} pss_mb={_mb(usage['pss_bytes'])} "
+                    f"shared_mb={_mb(usage['shared_bytes'])} private_mb={_mb(usage['private_bytes'])}"
+                )
+        logger.info(
+            f"Master {os.getpid()} rss_mb={_mb(report['master']['rss_bytes'])}; "
+            f"{len(report['workers'])} worker(s), total pss_mb={_mb(report['total_pss_bytes'])} "
+            f"(rss sum {_mb(report['total_rss_bytes'])})"
+        )
+
+    # -- worker ---------------------------------------------------------------
+
+    def spawn(self, slot: int) -> None:
+        max_requests = None
+        if self.max_requests:
+            # Jitter keeps the workers from all recycling at the same moment
+            max_requests = self.max_requests + random.randint(0, self.max_requests_jitter)
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = WorkerProcess(pid=pid, slot=slot, started=time.monotonic(),
+                                              max_requests=max_requests)
+            logger.info(f"Booted worker {pid} in slot {slot}"
+                        + (f", recycled after {max_requests} requests" if max_requests else ""))
+            return
+
+        exit_code = 0
+        try:
+            self._run_worker(max_requests)
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            logger.exception("Worker crashed")
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def _run_worker(self, max_requests: Optional[int]) -> None:
+        import uvicorn
+
+        signal.set_wakeup_fd(-1)
+        for fd in self._wakeup:
+            os.close(fd)
+        # uvicorn replaces the TERM/INT handlers while serving and re-raises the
+        # signal after its graceful shutdown; exit cleanly when it does
+        signal.signal(signal.SIGTERM, self._exit_worker)
+        signal.signal(signal.SIGINT, self._exit_worker)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        random.seed()
+        # Values recorded by the master before the fork are not this worker's
+        metrics_registry.reset()
+        metrics_registry.start_flushing(METRICS_FLUSH_INTERVAL)
+
+        config = uvicorn.Config(
+            self.app,
+            lifespan="on",
+            limit_max_requests=max_requests,
+            timeout_graceful_shutdown=self.graceful_timeout,
+            backlog=self.backlog,
+        )
+        uvicorn.Server(config).run(sockets=[self.sock])
+        metrics_registry.flush()
+
+    @staticmethod
+    def _exit_worker(signum: int, frame: Any) -> None:
+        try:
+            metrics_registry.flush()
+        finally:
+            os._exit(0)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Production pre-fork server for the BC3 backend.")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument("--max-requests", type=int, default=SERVER_MAX_REQUESTS,
+                        help="Recycle a worker after this many requests (0 = never)")
+    parser.add_argument("--max-requests-jitter", type=int, default=SERVER_MAX_REQUESTS_JITTER)
+    parser.add_argument("--graceful-timeout", type=int, default=SERVER_GRACEFUL_TIMEOUT)
+    args = parser.parse_args(argv)
+
+    server = PreforkServer(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        max_requests=args.max_requests,
+        max_requests_jitter=args.max_requests_jitter,
+        graceful_timeout=args.graceful_timeout,
+    )
+    return server.run()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,43 @@
 import json
 import os
-from typing import Dict, Optional, Any
-import sys
+from typing import TYPE_CHECKING, Dict, Optional, Any
 
 from ..config import PROCESSED_DIR, CATEGORIZED_DIR
 from ..exceptions import FileNotFoundError
 from ..logging_config import get_logger
+from .metrics import STAGE_SECONDS
+from .single_flight import SingleFlight, file_version
 
-# Add tools directory to path to import BC3 calculator
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../tools')))
-from bc3_pcalc import BC3PrettyCalculator
+if TYPE_CHECKING:
+    from tools.bc3_pcalc import BC3PrettyCalculator
 
 logger = get_logger(__name__)
 
+# Shared by every BC3Service instance so identical concurrent requests coalesce
+_calc_tree_flights = SingleFlight("calc_tree")
+
 class BC3Service:
     """Service for BC3 file operations and calculations."""
     
     def calculate_tree(self, filename: str, chapter: Optional[str] = None, 
                       level: Optional[int] = None, source: str = "processed", 
                       label: Optional[str] = None) -> Dict[str, Any]:
-        """Calculate and return BC3 budget tree with prices."""
+        """Calculate and return BC3 budget tree with prices.
+
+        Concurrent calls with the same arguments on the same file version
+        share one computation and its result.
+        """
+        base_dir = PROCESSED_DIR if source.lower() != "categorized" else CATEGORIZED_DIR
+        key = (filename, chapter, level, base_dir, label, file_version(os.path.join(base_dir, filename)))
+        return _calc_tree_flights.do(key, self._timed_calculate_tree, filename, chapter, level, source, label)
+
+    def _timed_calculate_tree(self, filename: str, chapter: Optional[str], level: Optional[int],
+                              source: str, label: Optional[str]) -> Dict[str, Any]:
+        with STAGE_SECONDS.time(stage="calculate_tree"):
+            return self._calculate_tree(filename, chapter, level, source, label)
+    
+    def _calculate_tree(self, filename: str, chapter: Optional[str], level: Optional[int],
+                        source: str, label: Optional[str]) -> Dict[str, Any]:
         
         # Determine source directory
         base_dir = PROCESSED_DIR if source.lower() != "categorized" else CATEGORIZED_DIR
@@ -38,7 +56,8 @@ class BC3Service:
             if not budget:
                 raise ValueError("No budget data in file")
             
-            # Initialize calculator
+            # Initialize calculator (imported on first use to keep startup light)
+            from tools.bc3_pcalc import BC3PrettyCalculator
             calc = BC3PrettyCalculator()
             calc.index_concepts(budget)
             
@@ -64,7 +83,7 @@ class BC3Service:
             logger.error(f"Failed to calculate tree for {filename}: {e}")
             raise
     
-    def _build_tree(self, node: Dict[str, Any], calc: BC3PrettyCalculator, 
+    def _build_tree(self, node: Dict[str, Any], calc: "BC3PrettyCalculator", 
                    max_level: Optional[int] = None, current_level: int = 0, 
                    filter_label: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """Build tree structure with calculations."""
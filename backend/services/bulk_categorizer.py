@@ -0,0 +1,253 @@
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from ..config import (
+    PROCESSED_DIR, BULK_STATE_PATH, ML_BULK_BATCH_ITEMS, ML_BULK_RECORDS_PER_TASK
+)
+from ..exceptions import MLModelError
+from ..logging_config import get_logger
+from .ml_service import MLService
+from .registry_service import RegistryService
+
+logger = get_logger(__name__)
+
+# One MLService per worker process, so each worker loads the model once
+_worker_service: Optional[MLService] = None
+
+def _categorize_task(codes: List[str], batch_items: int, force: bool) -> Dict[str, Dict[str, Any]]:
+    """Process-pool entry point: categorize a group of records."""
+    global _worker_service
+    if _worker_service is None:
+        _worker_service = MLService()
+    return categorize_records(_worker_service, codes, batch_items, force)
+
+def categorize_records(ml_service: MLService, codes: Iterable[str], batch_items: int = ML_BULK_BATCH_ITEMS,
+                       force: bool = False) -> Dict[str, Dict[str, Any]]:
+    """Categorize records, pooling their PARTIDA texts into large model calls.
+
+    Records are read one by one and their pending nodes accumulated until
+    ``batch_items`` texts are waiting; the pooled texts are then predicted in
+    a single call and every record of the group is written out. Returns a
+    per-code result with ``success``, ``error`` and node counts.
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    group: List[tuple] = []
+    pending_total = 0
+
+    def flush() -> None:
+        nonlocal group, pending_total
+        if not group:
+            return
+        pending = [item for _, _, items, _ in group for item in items]
+        try:
+            model_version = ml_service.registry.get().version
+            preds = ml_service.predict_topk_each([item[1] for item in pending], batch_size=batch_items)
+        except Exception as e:
+            logger.error(f"Bulk prediction of {len(pending)} texts failed: {e}")
+            for code, _, _, _ in group:
+                results[code] = {"success": False, "error": f"ML processing failed: {e}"}
+            group, pending_total = [], 0
+            return
+
+        ml_service.apply_predictions(pending, preds, model_version)
+        for code, data, items, stats in group:
+            stats["failed"] += sum(1 for node, _, _, _ in items if "_prediction_error" in node)
+            try:
+                # The previous file was read when the record was planned: keep
+                # labels set since then and exclude concurrent writers
+                with ml_service.record_lock(code):
+                    ml_service.merge_current_labels(code, data)
+                    ml_service.save_categorized(code, data)
+                stats["predicted"] = len(items) - stats["failed"]
+                results[code] = {"success": True, "error": None, **stats}
+            except OSError as e:
+                results[code] = {"success": False, "error": f"Failed to write categorized JSON: {e}"}
+        group, pending_total = [], 0
+
+    for code in codes:
+        input_path = os.path.join(PROCESSED_DIR, f"{code}.json")
+        try:
+            with open(input_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            model_version = ml_service.registry.get().version
+            previous = ml_service.load_categorized(code)
+            items, stats = ml_service.plan_categorization(data, previous, model_version, force=force)
+        except MLModelError as e:
+            results[code] = {"success": False, "error": str(e)}
+            continue
+        except (OSError, ValueError) as e:
+            results[code] = {"success": False, "error": f"Processed JSON not readable: {e}"}
+            continue
+
+        group.append((code, data, items, stats))
+        pending_total += len(items)
+        if pending_total >= batch_items:
+            flush()
+    flush()
+    return results
+
+class BulkCategorizer:
+    """Re-categorizes every processed record of the registry.
+
+    Records are split into tasks of ``records_per_task`` codes that run in
+    this process or on a process pool. Finished codes are checkpointed to a
+    state file after every task, so an interrupted run resumes where it
+    stopped; the registry is updated once, at the end.
+    """
+
+    def __init__(self, ml_service: Optional[MLService] = None,
+                 registry_service: Optional[RegistryService] = None,
+                 state_path: str = BULK_STATE_PATH):
+        self._ml_service = ml_service
+        self.registry_service = registry_service or RegistryService()
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._status: Dict[str, Any] = {"running": False}
+
+    @property
+    def ml_service(self) -> MLService:
+        if self._ml_service is None:
+            self._ml_service = MLService()
+        return self._ml_service
+
+    def _load_state(self, model_version: str) -> Dict[str, Any]:
+        """Return records completed by an unfinished run with the same model."""
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if state.get("model_version") != model_version:
+            logger.info("Ignoring bulk categorization checkpoint from another model version")
+            return {}
+        # Failed records are retried
+        return {code: result for code, result in state.get("results", {}).items() if result.get("success")}
+
+    def _save_state(self, model_version: str, results: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model_version": model_version, "results": results}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    def select_codes(self, codes: Optional[List[str]] = None) -> List[str]:
+        """Registry codes (optionally restricted) that have a processed JSON."""
+        wanted = set(codes) if codes else None
+        selected = []
+        for entry in self.registry_service.load_registry():
+            code = entry.get("code")
+            if not code or (wanted is not None and code not in wanted):
+                continue
+            if os.path.exists(os.path.join(PROCESSED_DIR, f"{code}.json")):
+                selected.append(code)
+        return selected
+
+    def run(self, codes: Optional[List[str]] = None, workers: int = 1, force: bool = False,
+            resume: bool = True, batch_items: int = ML_BULK_BATCH_ITEMS,
+            records_per_task: int = ML_BULK_RECORDS_PER_TASK,
+            progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Categorize the selected records and update the registry once.
+
+        Returns a summary with success/failure counts and node counts.
+        """
+        model_version = self.ml_service.registry.get().version
+        selected = self.select_codes(codes)
+        results = self._load_state(model_version) if resume else {}
+        todo = [code for code in selected if code not in results]
+        if results:
+            logger.info(f"Resuming bulk categorization: {len(results)} records already done")
+
+        size = max(1, records_per_task)
+        tasks = [todo[i:i + size] for i in range(0, len(todo), size)]
+        summary = {
+            "model_version": model_version,
+            "total": len(selected),
+            "resumed": len(selected) - len(todo),
+            "done": len(selected) - len(todo),
+            "workers": max(1, workers),
+        }
+        logger.info(f"Bulk categorizing {len(todo)} of {len(selected)} records with {summary['workers']} worker(s)")
+
+        def record(task_results: Dict[str, Dict[str, Any]]) -> None:
+            results.update(task_results)
+            self._save_state(model_version, results)
+            summary["done"] += len(task_results)
+            if progress is not None:
+                progress(dict(summary))
+
+        if workers <= 1:
+            for task in tasks:
+                record(categorize_records(self.ml_service, task, batch_items, force))
+        else:
+            # spawn: forking a process that holds threads and sqlite handles is unsafe
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = {pool.submit(_categorize_task, task, batch_items, force): task for task in tasks}
+                for future in as_completed(futures):
+                    try:
+                        record(future.result())
+                    except Exception as e:
+                        logger.error(f"Bulk categorization worker failed: {e}")
+                        record({code: {"success": False, "error": str(e)} for code in futures[future]})
+
+        selected_set = set(selected)
+        final = {code: result for code, result in results.items() if code in selected_set}
+        self.registry_service.update_ml_statuses(
+            {code: (result["success"], result.get("error")) for code, result in final.items()}
+        )
+        try:
+            os.remove(self.state_path)
+        except OSError:
+            pass
+
+        succeeded = [r for r in final.values() if r["success"]]
+        summary.update({
+            "succeeded": len(succeeded),
+            "failed": len(final) - len(succeeded),
+            "predicted": sum(r.get("predicted", 0) for r in succeeded),
+            "reused": sum(r.get("reused", 0) for r in succeeded),
+            "errors": {code: r["error"] for code, r in final.items() if not r["success"]},
+        })
+        logger.info(
+            f"Bulk categorization finished: {summary['succeeded']} succeeded, {summary['failed']} failed, "
+            f"{summary['predicted']} nodes predicted, {summary['reused']} reused"
+        )
+        return summary
+
+    def start(self, **kwargs: Any) -> bool:
+        """Run in a background thread; returns False if a run is in progress."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._status = {"running": True, "started_at": datetime.utcnow().isoformat() + "Z"}
+
+            def progress(summary: Dict[str, Any]) -> None:
+                self._status.update(summary)
+
+            def target() -> None:
+                try:
+                    summary = self.run(progress=progress, **kwargs)
+                    self._status.update(summary)
+                except Exception as e:
+                    logger.error(f"Bulk categorization failed: {e}")
+                    self._status["error"] = str(e)
+                finally:
+                    self._status["running"] = False
+                    self._status["finished_at"] = datetime.utcnow().isoformat() + "Z"
+
+            self._thread = threading.Thread(target=target, name="bulk-categorize", daemon=True)
+            self._thread.start()
+            return True
+
+    def status(self) -> Dict[str, Any]:
+        """Progress of the current or last background run."""
+        return dict(self._status)
+
+# Shared by the admin router
+bulk_categorizer = BulkCategorizer()
@@ -1,3 +1,4 @@
+import json
 import os
 import subprocess
 from typing import Tuple
@@ -6,6 +7,7 @@ from fastapi import UploadFile
 from ..config import UPLOAD_DIR, PROCESSED_DIR, BC3_CONVERTER_PATH
 from ..exceptions import BC3ConversionError, ValidationError, FileProcessingError
 from ..logging_config import get_logger
+from .metrics import STAGE_SECONDS, record_conversion_stats
 
 logger = get_logger(__name__)
 
@@ -36,9 +38,10 @@ class FileService:
             upload_filename = f"{code}.bc3"
             source_path = os.path.join(UPLOAD_DIR, upload_filename)
             
-            content = await file.read()
-            with open(source_path, "wb") as buffer:
-                buffer.write(content)
+            with STAGE_SECONDS.time(stage="save_uploaded_file"):
+                content = await file.read()
+                with open(source_path, "wb") as buffer:
+                    buffer.write(content)
             
             logger.info(f"File saved: {source_path}")
             return source_path
@@ -52,13 +55,16 @@ class FileService:
         try:
             processed_filename = f"{code}.json"
             processed_path = os.path.join(PROCESSED_DIR, processed_filename)
+            stats_path = f"{processed_path}.stats.json"
             
-            result = subprocess.run(
-                ["python3", BC3_CONVERTER_PATH, source_path, "-o", processed_path],
-                capture_output=True,
-                text=True,
-                check=True,
-            )
+            with STAGE_SECONDS.time(stage="convert"):
+                result = subprocess.run(
+                    ["python3", BC3_CONVERTER_PATH, source_path, "-o", processed_path, "--stats-json", stats_path],
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                )
+            self._record_conversion_stats(stats_path)
             
             logger.info(f"BC3 conversion successful: {processed_path}")
             logger.debug(f"Conversion output: {result.stdout}")
@@ -75,6 +81,19 @@ class FileService:
             self._cleanup_file(source_path)
             raise BC3ConversionError(f"Unexpected error during BC3 conversion: {e}")
     
+    def _record_conversion_stats(self, stats_path: str) -> None:
+        """Feed the converter's stage timings and record counts into the metrics."""
+        try:
+            with open(stats_path, "r", encoding="utf-8") as f:
+                record_conversion_stats(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Conversion stats unavailable: {e}")
+        finally:
+            try:
+                os.remove(stats_path)
+            except OSError:
+                pass
+    
     def _cleanup_file(self, file_path: str) -> None:
         """Clean up a file safely."""
         try:
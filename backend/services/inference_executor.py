@@ -0,0 +1,153 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..config import ML_MICROBATCH_MAX_ITEMS, ML_MICROBATCH_WAIT_MS
+from ..logging_config import get_logger
+from .ml_service import MLService
+
+logger = get_logger(__name__)
+
+class InferenceExecutor:
+    """Coalesces concurrent predictions into micro-batches on a dedicated thread.
+
+    Callers await :meth:`predict`; requests are queued and the worker takes
+    up to ``max_batch`` of them, waiting at most ``max_wait_ms`` after the
+    first one, then runs a single vectorized prediction off the event loop.
+    """
+
+    def __init__(self, ml_service: Optional[MLService] = None,
+                 max_batch: int = ML_MICROBATCH_MAX_ITEMS,
+                 max_wait_ms: float = ML_MICROBATCH_WAIT_MS):
+        self._ml_service = ml_service or MLService()
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[ThreadPoolExecutor] = None
+        self._last_batch_size = 0
+        self._stats = {"requests": 0, "batches": 0, "batched_items": 0, "max_batch_seen": 0}
+
+    async def start(self) -> None:
+        """Start the batching worker on the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._worker is not None and not self._worker.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        if self._thread is None:
+            self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self._worker = loop.create_task(self._run())
+        logger.info(f"Inference executor started (max batch {self.max_batch}, max wait {self.max_wait * 1000:.1f} ms)")
+
+    async def stop(self) -> None:
+        """Stop the worker and fail any requests still queued."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, _, future = self._queue.get_nowait()
+                if not future.done():
+                    future.set_exception(RuntimeError("Inference executor stopped"))
+        if self._thread is not None:
+            self._thread.shutdown(wait=True)
+            self._thread = None
+
+    async def _ensure_started(self) -> None:
+        if self._worker is None or self._worker.done() or self._loop is not asyncio.get_running_loop():
+            await self.start()
+
+    async def predict(self, text: str, topk: int = 3, descriptive: Optional[str] = None) -> Dict:
+        """Queue one prediction and wait for its micro-batch to complete."""
+        await self._ensure_started()
+        future = self._loop.create_future()
+        self._stats["requests"] += 1
+        await self._queue.put((self._ml_service.build_input_text(text, descriptive), topk, future))
+        return await future
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run model code on the inference thread, serialized with micro-batches."""
+        await self._ensure_started()
+        return await self._loop.run_in_executor(self._thread, func, *args)
+
+    async def _collect_batch(self) -> List[Tuple[str, int, asyncio.Future]]:
+        """Wait for a first request, then gather more until full or timed out.
+
+        An idle executor (previous batch of one, nothing else queued) runs a
+        lone request immediately instead of paying the wait.
+        """
+        batch = [await self._queue.get()]
+        if self._last_batch_size <= 1 and self._queue.empty():
+            return batch
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect_batch()
+            batch = [item for item in batch if not item[2].cancelled()]
+            if not batch:
+                continue
+
+            self._last_batch_size = len(batch)
+            self._stats["batches"] += 1
+            self._stats["batched_items"] += len(batch)
+            self._stats["max_batch_seen"] = max(self._stats["max_batch_seen"], len(batch))
+            try:
+                results = await self._loop.run_in_executor(
+                    self._thread,
+                    self._ml_service.predict_topk_each,
+                    [input_text for input_text, _, _ in batch],
+                    [topk for _, topk, _ in batch],
+                )
+            except Exception as e:
+                logger.error(f"Micro-batch of {len(batch)} predictions failed: {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            # Only the requests whose input made the model fail get the error
+            for (_, _, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def queue_depth(self) -> int:
+        """Number of predictions waiting for a batch."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        batches = self._stats["batches"]
+        return {
+            **self._stats,
+            "queue_depth": self.queue_depth(),
+            "avg_batch_size": round(self._stats["batched_items"] / batches, 2) if batches else 0.0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+# Shared executor used by the ML routes
+inference_executor = InferenceExecutor()
@@ -0,0 +1,408 @@
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..exceptions import MLModelError
+from ..logging_config import get_logger
+
+logger = get_logger(__name__)
+
+SCORER_FORMAT_VERSION = 1
+META_FILENAME = "meta.json"
+ARRAY_NAMES = ("term_hashes", "term_columns", "idf", "coef", "intercept", "classes")
+
+_WHITE_SPACES = re.compile(r"\s\s+")
+
+def term_hash(term: str) -> int:
+    """Stable 64-bit hash of a vocabulary term (same value in every process)."""
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+def scorer_path_for(model_path: str) -> str:
+    """Directory holding the compiled scorer exported from a joblib model."""
+    return os.path.splitext(model_path)[0] + ".scorer"
+
+def _strip_accents_ascii(s: str) -> str:
+    nkfd_form = unicodedata.normalize("NFKD", s)
+    return nkfd_form.encode("ASCII", "ignore").decode("ASCII")
+
+def _strip_accents_unicode(s: str) -> str:
+    try:
+        s.encode("ASCII", errors="strict")
+        return s
+    except UnicodeEncodeError:
+        normalized = unicodedata.normalize("NFKD", s)
+        return "".join(c for c in normalized if not unicodedata.combining(c))
+
+class LinearScorer:
+    """TF-IDF + linear classifier evaluated from flat NumPy arrays.
+
+    Reproduces ``Pipeline([TfidfVectorizer, linear classifier]).predict_proba``
+    for word/char analyzers without sklearn: the vocabulary is a sorted table
+    of 64-bit term hashes mapped to feature columns, and scoring is a sparse
+    dot product against a float32 (n_features, n_classes) coefficient matrix.
+    """
+
+    def __init__(self, meta: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+        self.meta = meta
+        self._term_hashes = arrays["term_hashes"]
+        self._term_columns = arrays["term_columns"]
+        self._idf = arrays["idf"] if meta.get("use_idf") else None
+        self._coef = arrays["coef"]
+        self._intercept = np.asarray(arrays["intercept"], dtype=np.float64)
+        self.classes_ = np.asarray(arrays["classes"])
+        self._analyze = self._build_analyzer()
+
+    # Attributes read like those of a TfidfVectorizer (used for cache keys)
+    @property
+    def analyzer(self) -> str:
+        return self.meta["analyzer"]
+
+    @property
+    def lowercase(self) -> bool:
+        return bool(self.meta["lowercase"])
+
+    @property
+    def source_digest(self) -> Optional[str]:
+        return self.meta.get("source_digest")
+
+    @property
+    def n_features(self) -> int:
+        return int(self._coef.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self._term_hashes, self._term_columns, self._idf, self._coef, self._intercept)
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    # ------------------------------------------------------------------ export
+
+    @classmethod
+    def from_pipeline(cls, pipe: Any, source_digest: Optional[str] = None) -> "LinearScorer":
+        """Extract flat arrays from a fitted TF-IDF + linear classifier pipeline.
+
+        Raises MLModelError for pipelines this scorer cannot reproduce.
+        """
+        steps = getattr(pipe, "steps", None)
+        if not steps or len(steps) != 2:
+            raise MLModelError("Compiled scorer needs a two-step vectorizer + classifier pipeline")
+        vectorizer, clf = steps[0][1], steps[1][1]
+
+        meta = cls._vectorizer_meta(vectorizer)
+        coef, intercept, calibration, normalize = cls._classifier_arrays(clf)
+
+        vocabulary = vectorizer.vocabulary_
+        terms = list(vocabulary)
+        hashes = np.fromiter((term_hash(t) for t in terms), dtype=np.uint64, count=len(terms))
+        columns = np.fromiter((vocabulary[t] for t in terms), dtype=np.int32, count=len(terms))
+        order = np.argsort(hashes, kind="stable")
+        hashes, columns = hashes[order], columns[order]
+        if len(hashes) > 1 and np.any(hashes[1:] == hashes[:-1]):
+            raise MLModelError("Vocabulary term hash collision; compiled scorer unavailable")
+
+        if coef.shape[0] != len(terms):
+            raise MLModelError("Classifier coefficients do not match vectorizer vocabulary")
+
+        idf = getattr(vectorizer, "idf_", None) if meta["use_idf"] else None
+        meta.update({
+            "format_version": SCORER_FORMAT_VERSION,
+            "source_digest": source_digest,
+            "calibration": calibration,
+            "normalize_proba": normalize,
+        })
+        arrays = {
+            "term_hashes": hashes,
+            "term_columns": columns,
+            "idf": np.asarray(idf if idf is not None else np.ones(0), dtype=np.float64),
+            "coef": np.ascontiguousarray(coef, dtype=np.float32),
+            "intercept": np.asarray(intercept, dtype=np.float64),
+            "classes": np.asarray(clf.classes_),
+        }
+        if arrays["classes"].dtype == object:
+            arrays["classes"] = arrays["classes"].astype(str)
+        return cls(meta, arrays)
+
+    @staticmethod
+    def _vectorizer_meta(vectorizer: Any) -> Dict[str, Any]:
+        if not hasattr(vectorizer, "vocabulary_"):
+            raise MLModelError("Vectorizer is not fitted")
+        analyzer = getattr(vectorizer, "analyzer", None)
+        if analyzer not in ("word", "char", "char_wb"):
+            raise MLModelError(f"Unsupported analyzer for compiled scorer: {analyzer!r}")
+        for attr in ("preprocessor", "tokenizer"):
+            if getattr(vectorizer, attr, None) is not None:
+                raise MLModelError(f"Custom {attr} is not supported by the compiled scorer")
+        if getattr(vectorizer, "input", "content") != "content":
+            raise MLModelError("Only input='content' vectorizers are supported")
+        strip_accents = getattr(vectorizer, "strip_accents", None)
+        if strip_accents not in (None, "ascii", "unicode"):
+            raise MLModelError("Custom strip_accents is not supported by the compiled scorer")
+
+        stop_words = vectorizer.get_stop_words() if analyzer == "word" else None
+        transformer = getattr(vectorizer, "_tfidf", vectorizer)
+        use_idf = bool(getattr(transformer, "use_idf", getattr(vectorizer, "use_idf", False)))
+        return {
+            "analyzer": analyzer,
+            "lowercase": bool(vectorizer.lowercase),
+            "strip_accents": strip_accents,
+            "token_pattern": vectorizer.token_pattern,
+            "ngram_range": list(vectorizer.ngram_range),
+            "stop_words": sorted(stop_words) if stop_words else None,
+            "binary": bool(getattr(vectorizer, "binary", False)),
+            "sublinear_tf": bool(getattr(vectorizer, "sublinear_tf", False)),
+            "use_idf": use_idf and hasattr(vectorizer, "idf_"),
+            "norm": getattr(vectorizer, "norm", None),
+        }
+
+    @staticmethod
+    def _classifier_arrays(clf: Any) -> Tuple[np.ndarray, np.ndarray, str, bool]:
+        """Return (coef as (n_features, n_columns), intercept, calibration, normalize)."""
+        estimators = getattr(clf, "estimators_", None)
+        if estimators is not None and hasattr(clf, "label_binarizer_"):
+            # OneVsRestClassifier: one binary probabilistic linear model per class
+            coefs, intercepts = [], []
+            for est in estimators:
+                if not hasattr(est, "coef_") or not LinearScorer._is_logistic(est):
+                    raise MLModelError(
+                        f"Unsupported one-vs-rest estimator {type(est).__name__}; need logistic linear models"
+                    )
+                coefs.append(np.asarray(est.coef_, dtype=np.float64).ravel())
+                intercepts.append(float(np.ravel(est.intercept_)[0]) if np.size(est.intercept_) else 0.0)
+            return np.vstack(coefs).T, np.asarray(intercepts), "ovr", not getattr(clf, "multilabel_", False)
+
+        if hasattr(clf, "coef_") and LinearScorer._is_logistic(clf):
+            coef = np.asarray(clf.coef_, dtype=np.float64)
+            intercept = np.ravel(np.asarray(clf.intercept_, dtype=np.float64))
+            if intercept.size == 1 and coef.shape[0] > 1:
+                intercept = np.repeat(intercept, coef.shape[0])
+            if type(clf).__name__ == "SGDClassifier":
+                # Log-loss SGD is trained one-vs-rest: per-class sigmoids, normalized
+                return coef.T, intercept, "ovr", True
+
+            # LogisticRegression; ``multi_class`` only exists before scikit-learn 1.8
+            multi_class = getattr(clf, "multi_class", "auto")
+            if multi_class == "ovr" or (multi_class != "multinomial" and getattr(clf, "solver", None) == "liblinear"):
+                return coef.T, intercept, "ovr", True
+            if coef.shape[0] == 1:
+                if multi_class == "multinomial":
+                    # Binary multinomial: softmax over the decision values (-d, d)
+                    return np.hstack((-coef.T, coef.T)), np.concatenate((-intercept, intercept)), "softmax", True
+                return coef.T, intercept, "ovr", True
+            return coef.T, intercept, "softmax", True
+
+        raise MLModelError(f"Unsupported classifier for compiled scorer: {type(clf).__name__}")
+
+    @staticmethod
+    def _is_logistic(est: Any) -> bool:
+        name = type(est).__name__
+        if name == "LogisticRegression":
+            return True
+        return name == "SGDClassifier" and getattr(est, "loss", None) in ("log_loss", "log")
+
+    # --------------------------------------------------------------- storage
+
+    def save(self, directory: str) -> None:
+        """Write meta.json plus one .npy file per array (memory-mappable)."""
+        os.makedirs(directory, exist_ok=True)
+        arrays = {
+            "term_hashes": self._term_hashes,
+            "term_columns": self._term_columns,
+            "idf": self._idf if self._idf is not None else np.ones(0),
+            "coef": self._coef,
+            "intercept": self._intercept,
+            "classes": self.classes_,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), np.asarray(array), allow_pickle=False)
+        with open(os.path.join(directory, META_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=2)
+        logger.info(f"Compiled scorer saved to {directory} ({self.nbytes // 1024} KiB arrays)")
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = None) -> "LinearScorer":
+        """Load a scorer saved with :meth:`save`."""
+        meta_path = os.path.join(directory, META_FILENAME)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError) as e:
+            raise MLModelError(f"Cannot read compiled scorer metadata {meta_path}: {e}")
+        if meta.get("format_version") != SCORER_FORMAT_VERSION:
+            raise MLModelError(f"Unsupported compiled scorer format {meta.get('format_version')!r}")
+        try:
+            arrays = {
+                name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+                for name in ARRAY_NAMES
+            }
+        except (OSError, ValueError) as e:
+            raise MLModelError(f"Cannot read compiled scorer arrays in {directory}: {e}")
+        return cls(meta, arrays)
+
+    @staticmethod
+    def read_source_digest(directory: str) -> Optional[str]:
+        """Return the digest of the joblib model a saved scorer was built from."""
+        try:
+            with open(os.path.join(directory, META_FILENAME), "r", encoding="utf-8") as f:
+                return json.load(f).get("source_digest")
+        except (OSError, ValueError):
+            return None
+
+    # ------------------------------------------------------------- inference
+
+    def _build_analyzer(self) -> Callable[[str], List[str]]:
+        meta = self.meta
+        lowercase = meta["lowercase"]
+        strip = {"ascii": _strip_accents_ascii, "unicode": _strip_accents_unicode}.get(meta["strip_accents"])
+        min_n, max_n = meta["ngram_range"]
+
+        def preprocess(doc: str) -> str:
+            if lowercase:
+                doc = doc.lower()
+            if strip is not None:
+                doc = strip(doc)
+            return doc
+
+        if meta["analyzer"] == "word":
+            token_pattern = re.compile(meta["token_pattern"])
+            if token_pattern.groups > 1:
+                raise MLModelError("token_pattern with more than one capturing group is not supported")
+            stop_words = frozenset(meta["stop_words"]) if meta["stop_words"] else None
+
+            def analyze(doc: str) -> List[str]:
+                tokens = token_pattern.findall(preprocess(doc))
+                if stop_words is not None:
+                    tokens = [w for w in tokens if w not in stop_words]
+                if max_n == 1:
+                    return tokens
+                original = tokens
+                lo = min_n
+                if lo == 1:
+                    tokens = list(original)
+                    lo += 1
+                else:
+                    tokens = []
+                n_original = len(original)
+                for n in range(lo, min(max_n + 1, n_original + 1)):
+                    for i in range(n_original - n + 1):
+                        tokens.append(" ".join(original[i:i + n]))
+                return tokens
+
+            return analyze
+
+        if meta["analyzer"] == "char_wb":
+            def analyze(doc: str) -> List[str]:
+                text = _WHITE_SPACES.sub(" ", preprocess(doc))
+                ngrams = []
+                for w in text.split():
+                    w = " " + w + " "
+                    w_len = len(w)
+                    for n in range(min_n, max_n + 1):
+                        offset = 0
+                        ngrams.append(w[offset:offset + n])
+                        while offset + n < w_len:
+                            offset += 1
+                            ngrams.append(w[offset:offset + n])
+                        if offset == 0:
+                            break
+                return ngrams
+
+            return analyze
+
+        def analyze(doc: str) -> List[str]:
+            text = _WHITE_SPACES.sub(" ", preprocess(doc))
+            text_len = len(text)
+            lo = min_n
+            if lo == 1:
+                ngrams = list(text)
+                lo += 1
+            else:
+                ngrams = []
+            for n in range(lo, min(max_n + 1, text_len + 1)):
+                for i in range(text_len - n + 1):
+                    ngrams.append(text[i:i + n])
+            return ngrams
+
+        return analyze
+
+    def _lookup(self, terms: Sequence[str]) -> np.ndarray:
+        """Map terms to feature columns; unknown terms are dropped."""
+        if not terms:
+            return np.empty(0, dtype=np.int64)
+        hashes = np.fromiter((term_hash(t) for t in terms), dtype=np.uint64, count=len(terms))
+        pos = np.searchsorted(self._term_hashes, hashes)
+        pos[pos >= len(self._term_hashes)] = 0
+        found = self._term_hashes[pos] == hashes if len(self._term_hashes) else np.zeros(len(terms), bool)
+        return self._term_columns[pos[found]].astype(np.int64)
+
+    def _tfidf(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (columns, tf-idf weights) of one document."""
+        columns, counts = np.unique(self._lookup(self._analyze(text)), return_counts=True)
+        values = counts.astype(np.float64)
+        if self.meta["binary"]:
+            values[:] = 1.0
+        if self.meta["sublinear_tf"]:
+            values = np.log(values) + 1.0
+        if self._idf is not None:
+            values *= self._idf[columns]
+        norm = self.meta["norm"]
+        if norm == "l2":
+            total = np.sqrt(np.dot(values, values))
+        elif norm == "l1":
+            total = np.abs(values).sum()
+        else:
+            total = 0.0
+        if total > 0:
+            values /= total
+        return columns, values
+
+    def decision_function(self, texts: Sequence[str]) -> np.ndarray:
+        """Linear scores, shape (n_texts, n_columns)."""
+        scores = np.empty((len(texts), self._coef.shape[1]), dtype=np.float64)
+        for row, text in enumerate(texts):
+            columns, values = self._tfidf(text)
+            scores[row] = values @ self._coef[columns] if len(columns) else 0.0
+        scores += self._intercept
+        return scores
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """Class probabilities with the same calibration as the source model."""
+        scores = self.decision_function(texts)
+        if self.meta["calibration"] == "softmax":
+            scores -= scores.max(axis=1, keepdims=True)
+            proba = np.exp(scores)
+            proba /= proba.sum(axis=1, keepdims=True)
+            return proba
+
+        proba = 1.0 / (1.0 + np.exp(-scores))
+        if proba.shape[1] == 1:
+            proba = np.hstack((1.0 - proba, proba))
+        if self.meta["normalize_proba"]:
+            row_sums = proba.sum(axis=1, keepdims=True)
+            np.divide(proba, row_sums, out=proba, where=row_sums != 0)
+        return proba
+
+    # ---------------------------------------------------------------- parity
+
+    @staticmethod
+    def probe_texts(pipe: Any, count: int = 64, seed: int = 0) -> List[str]:
+        """Deterministic sample texts built from the pipeline vocabulary, for parity checks."""
+        terms = sorted(pipe.steps[0][1].vocabulary_)
+        rng = np.random.default_rng(seed)
+        texts = ["", "Hormigón HA-25/B/20/IIa en zapatas [SEP] m3 hormigón"]
+        if not terms:
+            return texts
+        return texts + [
+            " ".join(terms[int(i)] for i in rng.integers(0, len(terms), size=8)) for _ in range(count)
+        ]
+    
+    def max_abs_diff(self, pipe: Any, texts: Sequence[str]) -> float:
+        """Largest absolute probability difference against the sklearn pipeline."""
+        expected = np.asarray(pipe.predict_proba(list(texts)), dtype=np.float64)
+        actual = self.predict_proba(texts)
+        if expected.shape != actual.shape:
+            raise MLModelError(f"Compiled scorer shape {actual.shape} != model shape {expected.shape}")
+        return float(np.max(np.abs(expected - actual))) if expected.size else 0.0
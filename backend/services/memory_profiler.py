@@ -0,0 +1,253 @@
+import gc
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from ..config import UPLOAD_DIR, PROCESSED_DIR, MEMORY_MAX_SNAPSHOTS, MEMORY_TRACE_FRAMES
+from ..exceptions import FileNotFoundError, ValidationError
+from ..logging_config import get_logger
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = get_logger(__name__)
+
+GROUP_BY = ("lineno", "filename", "traceback")
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size of this process (Linux only)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def peak_rss_bytes() -> Optional[int]:
+    """Highest resident set size reached by this process so far."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def process_memory(pid: Any = "self") -> Optional[Dict[str, int]]:
+    """RSS, PSS, shared and private memory in bytes from /proc/<pid>/smaps_rollup (Linux only).
+
+    RSS counts pages shared with forked workers in full for each of them;
+    PSS splits them between the processes mapping them.
+    """
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    values[parts[0][:-1]] = int(parts[1]) * 1024
+    except OSError:
+        return None
+    return {
+        "rss_bytes": values.get("Rss", 0),
+        "pss_bytes": values.get("Pss", 0),
+        "shared_bytes": values.get("Shared_Clean", 0) + values.get("Shared_Dirty", 0),
+        "private_bytes": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+def _filtered(snapshot: tracemalloc.Snapshot) -> tracemalloc.Snapshot:
+    return snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+
+def _site(stat: Any) -> Dict[str, Any]:
+    frames = [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+    site = {
+        "location": frames[0] if frames else "<unknown>",
+        "size_bytes": stat.size,
+        "count": stat.count,
+    }
+    if hasattr(stat, "size_diff"):
+        site["size_diff_bytes"] = stat.size_diff
+        site["count_diff"] = stat.count_diff
+    if len(frames) > 1:
+        site["traceback"] = frames
+    return site
+
+class MemoryProfiler:
+    """tracemalloc control, named snapshots and measured operations.
+
+    Snapshots live in memory, bounded to ``max_snapshots``; tracing slows
+    allocations down noticeably, so it is started and stopped on demand.
+    """
+
+    def __init__(self, max_snapshots: int = MEMORY_MAX_SNAPSHOTS):
+        self.max_snapshots = max_snapshots
+        self._snapshots: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._measure_lock = threading.Lock()
+        self._counter = 0
+
+    def status(self) -> Dict[str, Any]:
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        with self._lock:
+            snapshots = [
+                {"id": sid, "label": s["label"], "created": s["created"], "traced_bytes": s["traced_bytes"]}
+                for sid, s in self._snapshots.items()
+            ]
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "traceback_limit": tracemalloc.get_traceback_limit(),
+            "traced_current_bytes": current,
+            "traced_peak_bytes": peak,
+            "rss_bytes": rss_bytes(),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "snapshots": snapshots,
+        }
+
+    def start(self, nframes: int = MEMORY_TRACE_FRAMES) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(nframes)
+            logger.info(f"tracemalloc started with {nframes} frame(s)")
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("tracemalloc stopped")
+        with self._lock:
+            self._snapshots.clear()
+        return self.status()
+
+    def take_snapshot(self, label: Optional[str] = None) -> str:
+        """Store a snapshot of the traced allocations and return its id."""
+        if not tracemalloc.is_tracing():
+            raise ValidationError("tracemalloc is not running")
+        snapshot = _filtered(tracemalloc.take_snapshot())
+        with self._lock:
+            self._counter += 1
+            snapshot_id = f"s{self._counter}"
+            self._snapshots[snapshot_id] = {
+                "snapshot": snapshot,
+                "label": label,
+                "created": datetime.utcnow().isoformat() + "Z",
+                "traced_bytes": sum(stat.size for stat in snapshot.statistics("filename")),
+            }
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return snapshot_id
+
+    def _get(self, snapshot_id: str) -> tracemalloc.Snapshot:
+        with self._lock:
+            if snapshot_id not in self._snapshots:
+                raise FileNotFoundError(f"Snapshot not found: {snapshot_id}")
+            return self._snapshots[snapshot_id]["snapshot"]
+
+    def top(self, snapshot_id: str, compare_to: Optional[str] = None, limit: int = 25,
+            group_by: str = "lineno") -> Dict[str, Any]:
+        """Top allocation sites of a snapshot, or of its growth since ``compare_to``."""
+        if group_by not in GROUP_BY:
+            raise ValidationError(f"Invalid group_by '{group_by}'. Allowed: {list(GROUP_BY)}")
+        snapshot = self._get(snapshot_id)
+        if compare_to:
+            stats = snapshot.compare_to(self._get(compare_to), group_by)
+            total = sum(stat.size_diff for stat in stats)
+        else:
+            stats = snapshot.statistics(group_by)
+            total = sum(stat.size for stat in stats)
+        return {
+            "snapshot": snapshot_id,
+            "compare_to": compare_to,
+            "group_by": group_by,
+            "total_bytes": total,
+            "sites": [_site(stat) for stat in stats[:limit]],
+        }
+
+    def measure(self, operation: Callable[[], Any], label: str, limit: int = 25,
+                group_by: str = "lineno") -> Dict[str, Any]:
+        """Run ``operation`` between two snapshots and report what it allocated.
+
+        Tracing is started for the measurement if it is not running. The
+        operation's result is kept alive until the second snapshot so its
+        retained memory shows up; ``traced_peak_bytes`` covers temporaries.
+        Other requests running at the same time are traced too.
+        """
+        if group_by not in GROUP_BY:
+            raise ValidationError(f"Invalid group_by '{group_by}'. Allowed: {list(GROUP_BY)}")
+        with self._measure_lock:
+            started_here = not tracemalloc.is_tracing()
+            if started_here:
+                tracemalloc.start(MEMORY_TRACE_FRAMES)
+            try:
+                gc.collect()
+                before = self.take_snapshot(f"{label}:before")
+                tracemalloc.reset_peak()
+                base_traced, _ = tracemalloc.get_traced_memory()
+                start = time.perf_counter()
+                result = operation()
+                seconds = time.perf_counter() - start
+                _, peak = tracemalloc.get_traced_memory()
+                after = self.take_snapshot(f"{label}:after")
+                del result
+                report = self.top(after, compare_to=before, limit=limit, group_by=group_by)
+            finally:
+                if started_here:
+                    tracemalloc.stop()
+        report.update({
+            "operation": label,
+            "seconds": round(seconds, 6),
+            "traced_peak_bytes": max(0, peak - base_traced),
+            "rss_bytes": rss_bytes(),
+            "peak_rss_bytes": peak_rss_bytes(),
+        })
+        return report
+
+MEMORY_OPERATIONS = ("convert", "calc_tree", "ml")
+
+def _load_json(path: str) -> Any:
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"File not found: {os.path.basename(path)}")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def build_operation(name: str, code: str, chapter: Optional[str] = None, level: Optional[int] = None,
+                    source: str = "processed") -> Callable[[], Any]:
+    """The memory-heavy paths that can be measured for one record."""
+    if name == "convert":
+        from tools.bc3_converter import BC3Parser, BC3Composer
+
+        bc3_path = os.path.join(UPLOAD_DIR, f"{code}.bc3")
+        if not os.path.exists(bc3_path):
+            raise FileNotFoundError(f"File not found: {code}.bc3")
+
+        def convert():
+            records = BC3Parser().parse(bc3_path)
+            return BC3Composer().compose_tree(records)
+        return convert
+
+    if name == "calc_tree":
+        from .bc3_service import BC3Service
+        return lambda: BC3Service().calculate_tree(f"{code}.json", chapter=chapter, level=level, source=source)
+
+    if name == "ml":
+        from .ml_service import MLService
+
+        def categorize():
+            ml_service = MLService()
+            data = _load_json(os.path.join(PROCESSED_DIR, f"{code}.json"))
+            ml_service.categorize_incremental(data, previous=ml_service.load_categorized(code), chapter=chapter)
+            return data
+        return categorize
+
+    raise ValidationError(f"Invalid operation '{name}'. Allowed: {list(MEMORY_OPERATIONS)}")
+
+# Process-wide memory profiler
+memory_profiler = MemoryProfiler()
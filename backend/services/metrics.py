@@ -0,0 +1,368 @@
+import glob
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Multiprocess mode needs the pre-fork server, which is POSIX-only
+    fcntl = None
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render(self, values: Optional[Dict[LabelValues, float]] = None) -> List[str]:
+        items = sorted((self.collect() if values is None else values).items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items
+        ]
+
+class Gauge(_Metric):
+    """Gauge whose value is set directly or read from a callback at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], Dict[LabelValues, float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def collect(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            values = dict(self._values)
+        if self._callback is not None:
+            try:
+                values.update(self._callback())
+            except Exception:
+                pass
+        return {key: value for key, value in values.items() if value is not None}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render(self, values: Optional[Dict[LabelValues, float]] = None,
+               labelnames: Optional[Sequence[str]] = None) -> List[str]:
+        labelnames = self.labelnames if labelnames is None else labelnames
+        return self.header() + [
+            f"{self.name}{_format_labels(labelnames, key)} {_format_value(value)}"
+            for key, value in sorted((self.collect() if values is None else values).items())
+        ]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of the with-block, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self) -> Dict[LabelValues, Tuple[List[int], float]]:
+        with self._lock:
+            return {key: (list(counts), self._sums[key]) for key, counts in self._counts.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self._sums.clear()
+
+    def render(self, values: Optional[Dict[LabelValues, Tuple[List[int], float]]] = None) -> List[str]:
+        values = self.collect() if values is None else values
+        items = sorted((key, counts, total) for key, (counts, total) in values.items())
+        lines = self.header()
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _format_value(bound) if not math.isinf(bound) else "+Inf"
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', le))} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+def _merge_values(kind: str, total: Dict[LabelValues, Any], values: Dict[LabelValues, Any]) -> None:
+    """Add one process's counter or histogram values to ``total``."""
+    for key, value in values.items():
+        if kind == "histogram":
+            counts, value_sum = value
+            if key in total:
+                old_counts, old_sum = total[key]
+                counts = [a + b for a, b in zip(old_counts, counts)]
+                value_sum += old_sum
+            total[key] = (list(counts), value_sum)
+        else:
+            total[key] = total.get(key, 0.0) + value
+
+def _dump_values(values: Dict[LabelValues, Any]) -> List[list]:
+    return [[list(key), value] for key, value in values.items()]
+
+def _load_values(rows: List[list]) -> Dict[LabelValues, Any]:
+    return {tuple(key): tuple(value) if isinstance(value, list) else value for key, value in rows}
+
+class MetricsRegistry:
+    """Dependency-free collection of metrics rendered in Prometheus text format.
+
+    Metrics live in process memory. Under the pre-fork server each worker
+    would only report its own share, so :meth:`enable_multiprocess` makes
+    every process write its values to ``<directory>/worker-<pid>.json``
+    (every few seconds and on exit) and :meth:`render` sum the files of all
+    processes. Counters and histograms are added up; the values of workers
+    that exited are folded into ``archive.json`` by the master
+    (:meth:`archive_process`), so totals do not drop when a worker is
+    recycled. Gauges describe a single process and get a ``pid`` label.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self.multiprocess_dir: Optional[str] = None
+        self._flusher: Optional[threading.Thread] = None
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.setdefault(metric.name, metric)
+            return self._metrics[metric.name]
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              callback: Optional[Callable[[], Dict[LabelValues, float]]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def _all(self) -> List[_Metric]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render(self) -> str:
+        if self.multiprocess_dir is not None:
+            return self._render_multiprocess()
+        lines: List[str] = []
+        for metric in self._all():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    # -- multiprocess mode ----------------------------------------------------
+
+    def enable_multiprocess(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.multiprocess_dir = directory
+
+    def reset(self) -> None:
+        """Forget this process's values, e.g. those inherited from the master after a fork."""
+        for metric in self._all():
+            metric.reset()
+
+    @contextmanager
+    def _dir_lock(self) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.multiprocess_dir, ".lock"), "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _write(self, path: str, snapshot: Dict[str, Any]) -> None:
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read(path: str) -> Dict[str, Any]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def flush(self) -> None:
+        """Write this process's current values to its file in the multiprocess directory."""
+        if self.multiprocess_dir is None:
+            return
+        snapshot = {metric.name: _dump_values(metric.collect()) for metric in self._all()}
+        self._write(os.path.join(self.multiprocess_dir, f"worker-{os.getpid()}.json"), snapshot)
+
+    def start_flushing(self, interval: float) -> None:
+        """Flush from a daemon thread every ``interval`` seconds (start it in each worker)."""
+        if self.multiprocess_dir is None or self._flusher is not None:
+            return
+
+        def loop() -> None:
+            while True:
+                time.sleep(interval)
+                try:
+                    self.flush()
+                except OSError:
+                    pass
+
+        self._flusher = threading.Thread(target=loop, name="metrics-flush", daemon=True)
+        self._flusher.start()
+
+    def archive_process(self, pid: int) -> None:
+        """Fold the counters and histograms of an exited process into ``archive.json``."""
+        path = os.path.join(self.multiprocess_dir, f"worker-{pid}.json")
+        if not os.path.exists(path):
+            return
+        kinds = {metric.name: metric.kind for metric in self._all()}
+        archive_path = os.path.join(self.multiprocess_dir, "archive.json")
+        with self._dir_lock():
+            archive = self._read(archive_path)
+            for name, rows in self._read(path).items():
+                kind = kinds.get(name)
+                if kind in ("counter", "histogram"):
+                    total = _load_values(archive.get(name, []))
+                    _merge_values(kind, total, _load_values(rows))
+                    archive[name] = _dump_values(total)
+            self._write(archive_path, archive)
+            os.remove(path)
+
+    def _render_multiprocess(self) -> str:
+        self.flush()
+        with self._dir_lock():
+            files = {
+                os.path.basename(path): self._read(path)
+                for path in glob.glob(os.path.join(self.multiprocess_dir, "*.json"))
+            }
+        lines: List[str] = []
+        for metric in self._all():
+            if isinstance(metric, Gauge):
+                values = {}
+                for filename, snapshot in files.items():
+                    if filename.startswith("worker-"):
+                        pid = filename[len("worker-"):-len(".json")]
+                        for key, value in _load_values(snapshot.get(metric.name, [])).items():
+                            values[key + (pid,)] = value
+                lines.extend(metric.render(values, metric.labelnames + ("pid",)))
+            else:
+                total: Dict[LabelValues, Any] = {}
+                for snapshot in files.values():
+                    _merge_values(metric.kind, total, _load_values(snapshot.get(metric.name, [])))
+                lines.extend(metric.render(total))
+        return "\n".join(lines) + "\n"
+
+# Process-wide registry and the application's metrics
+metrics_registry = MetricsRegistry()
+
+STAGE_SECONDS = metrics_registry.histogram(
+    "bc3_stage_duration_seconds", "Duration of processing pipeline stages in seconds.", ["stage"]
+)
+RECORDS_PARSED = metrics_registry.counter(
+    "bc3_records_parsed_total", "BC3 records parsed, by record type.", ["type"]
+)
+DECOMPOSITIONS = metrics_registry.counter(
+    "bc3_decompositions_total", "~D decomposition records, by linking result.", ["status"]
+)
+MEASUREMENTS = metrics_registry.counter(
+    "bc3_measurements_total", "~M measurement records, by linking result.", ["status"]
+)
+PREDICTIONS = metrics_registry.counter(
+    "ml_predictions_total", "Texts predicted by the model (cache misses).", []
+)
+COALESCED = metrics_registry.counter(
+    "bc3_coalesced_requests_total", "Calls served by joining an identical in-flight computation.", ["operation"]
+)
+
+def record_conversion_stats(stats: Dict) -> None:
+    """Feed the timings and counts reported by ``bc3_converter.py --stats-json``."""
+    for stage, seconds in (stats.get("timings") or {}).items():
+        STAGE_SECONDS.observe(float(seconds), stage=stage)
+    for record_type, count in (stats.get("records") or {}).items():
+        RECORDS_PARSED.inc(count, type=record_type)
+    compose = stats.get("compose") or {}
+    for kind, counter in (("decompositions", DECOMPOSITIONS), ("measurements", MEASUREMENTS)):
+        total = compose.get(kind, 0)
+        linked = compose.get(f"linked_{kind}", 0)
+        if total:
+            counter.inc(linked, status="linked")
+            counter.inc(total - linked, status="unlinked")
@@ -1,135 +1,484 @@
+import hashlib
 import json
 import os
-from typing import Dict, Optional, Any
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple, Union, Any
 
-from ..config import ML_MODEL_PATH, METRICS_PATH, CATEGORIZED_DIR
-from ..exceptions import MLModelError, MLModelNotFoundError, FileNotFoundError
+from ..config import ML_MODEL_PATH, METRICS_PATH, CATEGORIZED_DIR, PROCESSED_DIR, ML_BATCH_SIZE
+from ..exceptions import MLModelError, MLModelNotFoundError, FileNotFoundError, NodeNotFoundError
 from ..logging_config import get_logger
+from .model_registry import ModelRegistry, model_registry
+from .prediction_cache import PredictionCache
+from .uncertainty_index import get_uncertainty_index
+from .quality_metrics import get_quality_metrics
+from .metrics import STAGE_SECONDS, PREDICTIONS
+from .single_flight import KeyedLock, SingleFlight, file_version
 
 logger = get_logger(__name__)
 
+# Identical concurrent ML runs share one computation; every write of a record's
+# categorized file (ML runs, label edits, bulk runs in other processes) holds the
+# record's lock so none overwrites the other
+_record_ml_flights = SingleFlight("record_ml")
+_record_locks = KeyedLock(lock_dir=os.path.join(CATEGORIZED_DIR, ".locks"))
+
+def iter_partida_nodes(data: Any) -> Iterator[Dict[str, Any]]:
+    """Yield every PARTIDA node of a JSON tree in document order."""
+    stack = [data]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, dict):
+            if str(obj.get("concept_type", "")) == "PARTIDA":
+                yield obj
+            stack.extend(reversed(list(obj.values())))
+        elif isinstance(obj, list):
+            stack.extend(reversed(obj))
+
 class MLService:
     """Service for ML model operations."""
     
-    def __init__(self):
-        self._ml_pipe = None
+    def __init__(self, registry: Optional[ModelRegistry] = None):
+        self._registry = registry if registry is not None else model_registry
+    
+    @property
+    def registry(self) -> ModelRegistry:
+        return self._registry
     
     def load_model(self):
-        """Load ML model lazily."""
-        if self._ml_pipe is None:
-            try:
-                import joblib
-                logger.info(f"Loading ML model from {ML_MODEL_PATH}")
-                self._ml_pipe = joblib.load(ML_MODEL_PATH)
-                logger.info("ML model loaded successfully")
-            except ImportError:
-                raise MLModelError("joblib library not available")
-            except Exception as e:
-                raise MLModelNotFoundError(f"Failed to load ML model from {ML_MODEL_PATH}: {e}")
-        return self._ml_pipe
+        """Return the shared ML model, loading it on first use."""
+        return self._registry.get().pipe
+    
+    @staticmethod
+    def build_input_text(text: str, descriptive: Optional[str] = None) -> str:
+        """Build the model input from summary and optional descriptive text."""
+        if descriptive:
+            return f"{descriptive} [SEP] {text}"
+        return text
     
     def predict_topk(self, text: str, topk: int = 3, descriptive: Optional[str] = None) -> Dict:
         """Make ML prediction with top-k results."""
+        result = self.predict_topk_batch([self.build_input_text(text, descriptive)], topk=topk)[0]
+        logger.info(f"Prediction completed for text: {text[:50]}...")
+        return result
+    
+    def predict_topk_batch(self, input_texts: List[str], topk: Union[int, List[int]] = 3,
+                           batch_size: Optional[int] = None) -> List[Dict]:
+        """Make ML predictions for many prepared input texts, preserving order.
+        
+        ``topk`` may be a single value or one value per text. Results are
+        served from the prediction cache when possible; only distinct cache
+        misses are sent to the model.
+        """
         try:
-            pipe = self.load_model()
-            
-            # Prepare input text
-            input_text = text
-            if descriptive:
-                input_text = f"{descriptive} [SEP] {text}"
+            return self._predict_topk_batch(input_texts, topk, batch_size)
+        except MLModelError as e:
+            logger.error(str(e))
+            raise
+    
+    def _predict_topk_batch(self, input_texts: List[str], topk: Union[int, List[int]],
+                            batch_size: Optional[int]) -> List[Dict]:
+        """:meth:`predict_topk_batch` without logging failures."""
+        try:
+            # One snapshot per call: a concurrent hot swap cannot mix models
+            model = self._registry.get()
+            pipe = model.pipe
+            cache = self._registry.cache
             
             # Import numpy here to avoid import issues
             import numpy as np
             
-            # Make prediction
-            proba = pipe.predict_proba([input_text])[0]
-            classes = list(getattr(pipe, "classes_", []))
-            idx = np.argsort(proba)[::-1][:topk]
+            topks = list(topk) if isinstance(topk, (list, tuple)) else [topk] * len(input_texts)
+            if len(topks) != len(input_texts):
+                raise ValueError("topk list must have one entry per input text")
             
-            labels = [str(classes[i]) if i < len(classes) else str(i) for i in idx]
-            probs = [float(proba[i]) for i in idx]
+            keys = [
+                PredictionCache.make_key(model.cache_namespace, text, k, model.lowercase)
+                for text, k in zip(input_texts, topks)
+            ]
+            cached = cache.get_many(keys, model.cache_namespace)
             
-            result = {
-                "predicted_label": labels[0] if labels else None,
-                "predicted_proba": probs[0] if probs else None,
-                "topk_labels": labels,
-                "topk_probas": probs,
-            }
+            # Predict each missing key once, even if the text repeats
+            misses: Dict[str, Tuple[str, int]] = {}
+            for key, text, k in zip(keys, input_texts, topks):
+                if key not in cached and key not in misses:
+                    misses[key] = (text, k)
             
-            logger.info(f"Prediction completed for text: {text[:50]}...")
-            return result
+            if misses:
+                classes = list(getattr(pipe, "classes_", []))
+                size = max(1, batch_size or ML_BATCH_SIZE)
+                miss_keys = list(misses)
+                computed: Dict[str, Dict] = {}
+                
+                for start in range(0, len(miss_keys), size):
+                    chunk = miss_keys[start:start + size]
+                    with STAGE_SECONDS.time(stage="predict_topk"):
+                        proba = np.asarray(pipe.predict_proba([misses[key][0] for key in chunk]))
+                    PREDICTIONS.inc(len(chunk))
+                    max_k = max(misses[key][1] for key in chunk)
+                    for key, pred in zip(chunk, self._topk_from_proba(proba, classes, max_k)):
+                        computed[key] = self._truncate_topk(pred, misses[key][1])
+                
+                cache.put_many(computed, model.cache_namespace)
+                cached.update(computed)
+            
+            # Hand out copies so callers can annotate results (e.g. user_label)
+            return [self._truncate_topk(cached[key], len(cached[key]["topk_labels"])) for key in keys]
             
         except ImportError:
             raise MLModelError("numpy library not available")
         except Exception as e:
-            logger.error(f"Prediction failed: {e}")
             raise MLModelError(f"Prediction failed: {e}")
     
+    def predict_topk_each(self, input_texts: List[str], topk: Union[int, List[int]] = 3,
+                          batch_size: Optional[int] = None) -> List[Union[Dict, MLModelError]]:
+        """Like :meth:`predict_topk_batch`, but a failure only affects the inputs causing it.
+        
+        A failing call is split in halves and retried until the failing
+        inputs are isolated; their slots hold the error instead of a
+        prediction. When both halves of the first split fail too, the
+        failure is taken to hit every input (model state, memory) and the
+        original error is raised without further retries, as it is when
+        the model is unavailable. Failures are logged once per call.
+        """
+        self._registry.get()
+        topks = list(topk) if isinstance(topk, (list, tuple)) else [topk] * len(input_texts)
+        try:
+            return self._predict_topk_batch(input_texts, topks, batch_size)
+        except MLModelError as e:
+            error = e
+        
+        if len(input_texts) <= 1:
+            logger.error(str(error))
+            return [error] * len(input_texts)
+        
+        mid = len(input_texts) // 2
+        halves = []
+        for lo, hi in ((0, mid), (mid, len(input_texts))):
+            try:
+                halves.append((lo, hi, self._predict_topk_batch(input_texts[lo:hi], topks[lo:hi], batch_size)))
+            except MLModelError as e:
+                halves.append((lo, hi, e))
+        if all(isinstance(result, MLModelError) for _, _, result in halves):
+            logger.error(f"{error} (both halves of {len(input_texts)} inputs failed too, failing them all)")
+            raise error
+        
+        results: List[Union[Dict, MLModelError]] = []
+        for lo, hi, result in halves:
+            if isinstance(result, MLModelError):
+                results.extend(self._isolate_failures(input_texts[lo:hi], topks[lo:hi], batch_size, result))
+            else:
+                results.extend(result)
+        failed = sum(1 for result in results if isinstance(result, MLModelError))
+        logger.error(f"{error} ({failed} of {len(input_texts)} inputs affected)")
+        return results
+    
+    def _isolate_failures(self, input_texts: List[str], topks: List[int], batch_size: Optional[int],
+                          error: MLModelError) -> List[Union[Dict, MLModelError]]:
+        """Bisect inputs that failed together with ``error`` down to the failing ones."""
+        if len(input_texts) == 1:
+            return [error]
+        mid = len(input_texts) // 2
+        results: List[Union[Dict, MLModelError]] = []
+        for lo, hi in ((0, mid), (mid, len(input_texts))):
+            try:
+                results.extend(self._predict_topk_batch(input_texts[lo:hi], topks[lo:hi], batch_size))
+            except MLModelError as e:
+                results.extend(self._isolate_failures(input_texts[lo:hi], topks[lo:hi], batch_size, e))
+        return results
+    
+    @staticmethod
+    def _truncate_topk(pred: Dict, k: int) -> Dict:
+        """Return a copy of a prediction keeping only its first k entries."""
+        return dict(pred, topk_labels=pred["topk_labels"][:k], topk_probas=pred["topk_probas"][:k])
+    
+    @staticmethod
+    def _topk_from_proba(proba, classes: List[Any], topk: int) -> List[Dict]:
+        """Turn a (n_samples, n_classes) probability matrix into top-k result dicts."""
+        import numpy as np
+        
+        n_classes = proba.shape[1]
+        k = max(0, min(topk, n_classes))
+        if k == 0:
+            return [
+                {"predicted_label": None, "predicted_proba": None, "topk_labels": [], "topk_probas": []}
+                for _ in range(proba.shape[0])
+            ]
+        
+        # Select the k best columns per row without sorting every class, then
+        # order them by descending probability (ties: higher class index first,
+        # as the previous argsort()[::-1] did)
+        if k < n_classes:
+            part = np.argpartition(-proba, k - 1, axis=1)[:, :k]
+        else:
+            part = np.broadcast_to(np.arange(n_classes), proba.shape)
+        part_proba = np.take_along_axis(proba, part, axis=1)
+        order = np.lexsort((-part, -part_proba), axis=1)
+        top_idx = np.take_along_axis(part, order, axis=1)
+        top_proba = np.take_along_axis(part_proba, order, axis=1)
+        
+        results = []
+        for idx_row, proba_row in zip(top_idx.tolist(), top_proba.tolist()):
+            labels = [str(classes[i]) if i < len(classes) else str(i) for i in idx_row]
+            results.append({
+                "predicted_label": labels[0] if labels else None,
+                "predicted_proba": proba_row[0] if proba_row else None,
+                "topk_labels": labels,
+                "topk_probas": proba_row,
+            })
+        return results
+    
     def get_model_status(self) -> Dict:
         """Get ML model status."""
         try:
-            pipe = self.load_model()
-            return {
-                "model_path": ML_MODEL_PATH,
-                "loaded": pipe is not None
-            }
+            self._registry.get()
         except Exception as e:
-            return {
-                "model_path": ML_MODEL_PATH,
-                "loaded": False,
-                "error": str(e)
-            }
+            logger.warning(f"ML model not available: {e}")
+        
+        status = self._registry.status()
+        status["cache"] = self._registry.cache.stats()
+        return status
+    
+    def categorize_json_tree(self, data: Any, batch_size: Optional[int] = None) -> Any:
+        """Attach ML predictions to PARTIDA nodes, predicting in batches."""
+        self.categorize_incremental(data, batch_size=batch_size)
+        return data
     
-    def categorize_json_tree(self, data: Any) -> Any:
-        """Traverse JSON tree and attach ML predictions to PARTIDA nodes."""
-        def process_node(node: Dict[str, Any]):
-            concept_type = str(node.get("concept_type", ""))
-            if concept_type != "PARTIDA":
-                return
+    def categorize_incremental(self, data: Any, previous: Any = None, chapter: Optional[str] = None,
+                               force: bool = False, batch_size: Optional[int] = None) -> Dict[str, int]:
+        """Categorize PARTIDA nodes, predicting only new or changed ones.
+        
+        ``previous`` is the earlier categorized version of the same record. A
+        node whose text fingerprint and model version match its previous
+        prediction reuses it; other nodes are predicted. ``user_label`` is
+        carried over whenever the text is unchanged. With ``chapter`` only the
+        PARTIDAs under that code are (re)categorized; the rest keep their
+        previous predictions.
+        """
+        model_version = self._registry.get().version
+        pending, stats = self.plan_categorization(data, previous, model_version, chapter, force)
+        
+        size = max(1, batch_size or ML_BATCH_SIZE)
+        for start in range(0, len(pending), size):
+            chunk = pending[start:start + size]
+            try:
+                preds = self.predict_topk_each([item[1] for item in chunk], batch_size=size)
+            except Exception as e:
+                for item in chunk:
+                    item[0]["_prediction_error"] = str(e)
+                stats["failed"] += len(chunk)
+                logger.warning(f"Failed to predict batch of {len(chunk)} nodes: {e}")
+                continue
             
+            failed = self.apply_predictions(chunk, preds, model_version)
+            if failed:
+                stats["failed"] += failed
+                logger.warning(f"Failed to predict {failed} of {len(chunk)} nodes")
+        
+        stats["predicted"] = len(pending) - stats["failed"]
+        logger.info(
+            f"Categorized PARTIDA nodes: {stats['predicted']} predicted, {stats['reused']} reused, "
+            f"{stats['labels_carried']} user labels carried"
+        )
+        return stats
+    
+    @staticmethod
+    def text_fingerprint(node: Dict[str, Any]) -> str:
+        """Fingerprint of the texts a prediction depends on."""
+        raw = f"{node.get('summary', '')}\x1f{node.get('descriptive_text') or ''}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+    
+    def plan_categorization(self, data: Any, previous: Any, model_version: str,
+                            chapter: Optional[str] = None, force: bool = False
+                            ) -> Tuple[List[Tuple[Dict[str, Any], str, str, Optional[str]]], Dict[str, int]]:
+        """Reuse what is still valid and list the nodes that need a prediction.
+        
+        Returns ``(pending, stats)`` where each pending entry is
+        ``(node, input_text, fingerprint, carried_user_label)``.
+        """
+        stats = {"partidas": 0, "predicted": 0, "reused": 0, "labels_carried": 0, "failed": 0}
+        
+        # Previous predictions by (code, fingerprint), falling back to fingerprint only
+        by_code: Dict[Tuple[str, str], Dict] = {}
+        by_text: Dict[str, Dict] = {}
+        if previous is not None:
+            for node in iter_partida_nodes(previous):
+                pred = node.get("_prediction")
+                if not isinstance(pred, dict):
+                    continue
+                fp = self.text_fingerprint(node)
+                by_code.setdefault((str(node.get("code", "")), fp), pred)
+                if fp not in by_text or (pred.get("user_label") and not by_text[fp].get("user_label")):
+                    by_text[fp] = pred
+        
+        in_scope = None
+        if chapter is not None:
+            roots = [n for n in self._iter_dicts(data) if str(n.get("code", "")) == chapter]
+            if not roots:
+                raise NodeNotFoundError(f"Chapter '{chapter}' not found")
+            in_scope = {id(n) for root in roots for n in iter_partida_nodes(root)}
+        
+        pending = []
+        for node in iter_partida_nodes(data):
             text = str(node.get("summary", ""))
-            descriptive = node.get("descriptive_text")
+            if not text:
+                continue
+            stats["partidas"] += 1
+            fp = self.text_fingerprint(node)
+            prev = by_code.get((str(node.get("code", "")), fp)) or by_text.get(fp)
             
-            if text:
-                try:
-                    pred = self.predict_topk(
-                        text, 
-                        descriptive=str(descriptive) if descriptive else None
-                    )
-                    node["_prediction"] = pred
-                    logger.debug(f"Added prediction for node {node.get('code', '')}")
-                except Exception as e:
-                    node["_prediction_error"] = str(e)
-                    logger.warning(f"Failed to predict for node {node.get('code', '')}: {e}")
+            if in_scope is not None and id(node) not in in_scope:
+                # Outside the requested chapter: keep whatever was there
+                if prev is not None:
+                    node["_prediction"] = dict(prev)
+                    stats["reused"] += 1
+                continue
+            
+            user_label = prev.get("user_label") if prev else None
+            if (not force and prev is not None and prev.get("model_version") == model_version
+                    and prev.get("predicted_label") is not None):
+                node["_prediction"] = dict(prev)
+                stats["reused"] += 1
+                if user_label:
+                    stats["labels_carried"] += 1
+                continue
+            
+            descriptive = node.get("descriptive_text")
+            input_text = self.build_input_text(text, str(descriptive) if descriptive else None)
+            pending.append((node, input_text, fp, user_label))
+            if user_label:
+                stats["labels_carried"] += 1
         
-        def traverse(obj: Any):
+        return pending, stats
+    
+    @staticmethod
+    def apply_predictions(pending: List[Tuple[Dict[str, Any], str, str, Optional[str]]],
+                          preds: List[Union[Dict, Exception]], model_version: str) -> int:
+        """Store predictions on planned nodes with fingerprint, version and carried label.
+        
+        Errors from :meth:`predict_topk_each` are stored as ``_prediction_error``
+        instead; returns how many nodes failed.
+        """
+        failed = 0
+        for (node, _, fp, user_label), pred in zip(pending, preds):
+            if isinstance(pred, Exception):
+                node["_prediction_error"] = str(pred)
+                failed += 1
+                continue
+            pred["text_fingerprint"] = fp
+            pred["model_version"] = model_version
+            if user_label:
+                pred["user_label"] = user_label
+            node["_prediction"] = pred
+            node.pop("_prediction_error", None)
+        return failed
+    
+    @staticmethod
+    def _iter_dicts(data: Any) -> Iterator[Dict[str, Any]]:
+        """Yield every dict node of a JSON tree."""
+        stack = [data]
+        while stack:
+            obj = stack.pop()
             if isinstance(obj, dict):
-                process_node(obj)
-                for v in list(obj.values()):
-                    traverse(v)
+                yield obj
+                stack.extend(reversed(list(obj.values())))
             elif isinstance(obj, list):
-                for item in obj:
-                    traverse(item)
+                stack.extend(reversed(obj))
+    
+    def load_categorized(self, code: str) -> Optional[Any]:
+        """Load the categorized JSON of a record, or None if it does not exist."""
+        path = os.path.join(CATEGORIZED_DIR, f"{code}.json")
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable categorized file {path}: {e}")
+            return None
+    
+    @staticmethod
+    def record_lock(code: str):
+        """Context manager serializing read-modify-write cycles of a record's categorized file."""
+        return _record_locks.hold(code)
+    
+    def merge_current_labels(self, code: str, data: Any) -> int:
+        """Copy user labels from the categorized file on disk onto ``data``.
         
-        traverse(data)
-        return data
+        For writers that read the previous categorized file long before
+        saving: labels set or cleared since then win over the stale copy.
+        Call it while holding :meth:`record_lock`. Returns the nodes changed.
+        """
+        current = self.load_categorized(code)
+        if current is None:
+            return 0
+        labels: Dict[Tuple[str, str], Optional[str]] = {}
+        for node in iter_partida_nodes(current):
+            pred = node.get("_prediction")
+            if isinstance(pred, dict):
+                labels[(str(node.get("code", "")), self.text_fingerprint(node))] = pred.get("user_label")
+        changed = 0
+        for node in iter_partida_nodes(data):
+            key = (str(node.get("code", "")), self.text_fingerprint(node))
+            if key in labels and self._set_user_label(node, labels[key]):
+                changed += 1
+        return changed
+    
+    def save_categorized(self, code: str, data: Any) -> str:
+        """Write the categorized JSON of a record and return its path."""
+        output_path = os.path.join(CATEGORIZED_DIR, f"{code}.json")
+        os.makedirs(CATEGORIZED_DIR, exist_ok=True)
+        tmp_path = f"{output_path}.tmp{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, output_path)
+        self._index_record(code, data)
+        return output_path
+    
+    @staticmethod
+    def _index_record(code: str, data: Any) -> None:
+        """Refresh the record's rows in the corpus indexes; never fails the caller."""
+        # Imported lazily: the text index pulls in numpy
+        from .text_index import get_text_index
+
+        indexes = (("uncertainty", get_uncertainty_index), ("text", get_text_index), ("quality", get_quality_metrics))
+        for name, index in indexes:
+            try:
+                index().update_record(code, data)
+            except Exception as e:
+                logger.warning(f"Failed to update {name} index for {code}: {e}")
     
-    def process_record_ml(self, code: str, processed_data: Dict) -> str:
-        """Process a record with ML categorization."""
+    def run_record_ml(self, code: str, chapter: Optional[str] = None, force: bool = False) -> Dict[str, Any]:
+        """Load a record's processed JSON and categorize it with :meth:`process_record_ml`.
+        
+        Concurrent calls with the same arguments, while the processed and
+        categorized files are unchanged, share one run and its result.
+        """
+        input_path = os.path.join(PROCESSED_DIR, f"{code}.json")
+        key = (code, chapter, force, file_version(input_path),
+               file_version(os.path.join(CATEGORIZED_DIR, f"{code}.json")))
+        return _record_ml_flights.do(key, self._run_record_ml, code, input_path, chapter, force)
+    
+    def _run_record_ml(self, code: str, input_path: str, chapter: Optional[str], force: bool) -> Dict[str, Any]:
+        if not os.path.exists(input_path):
+            raise FileNotFoundError("Processed JSON not found")
+        with open(input_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return self.process_record_ml(code, data, chapter=chapter, force=force)
+    
+    def process_record_ml(self, code: str, processed_data: Dict, chapter: Optional[str] = None,
+                          force: bool = False) -> Dict[str, Any]:
+        """Process a record with ML categorization, reusing still-valid predictions."""
         try:
-            # Apply ML categorization
-            categorized_data = self.categorize_json_tree(processed_data)
-            
-            # Save categorized output
-            output_path = os.path.join(CATEGORIZED_DIR, f"{code}.json")
-            os.makedirs(CATEGORIZED_DIR, exist_ok=True)
-            
-            with open(output_path, "w", encoding="utf-8") as f:
-                json.dump(categorized_data, f, ensure_ascii=False, indent=2)
+            with _record_locks.hold(code):
+                previous = self.load_categorized(code)
+                stats = self.categorize_incremental(processed_data, previous=previous, chapter=chapter, force=force)
+                output_path = self.save_categorized(code, processed_data)
             
             logger.info(f"ML processing completed for {code}, saved to {output_path}")
-            return output_path
+            return {"categorized_path": output_path, **stats}
             
+        except NodeNotFoundError:
+            raise
         except Exception as e:
             logger.error(f"ML processing failed for {code}: {e}")
             raise MLModelError(f"ML processing failed: {e}")
@@ -157,9 +506,39 @@ class MLService:
             logger.error(f"Failed to load classes: {e}")
             raise FileNotFoundError(f"Failed to load classes: {e}")
     
+    def get_quality_metrics(self) -> Dict[str, Any]:
+        """Live model-quality counters plus the classes and offline metrics of metrics.json."""
+        metrics = get_quality_metrics().summary()
+        metrics["classes"] = None
+        metrics["offline"] = None
+        if os.path.exists(METRICS_PATH):
+            try:
+                with open(METRICS_PATH, "r", encoding="utf-8") as f:
+                    offline = json.load(f)
+                metrics["classes"] = offline.pop("classes", None)
+                metrics["offline"] = offline
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read {METRICS_PATH}: {e}")
+        return metrics
+    
     def update_user_label(self, code: str, node_code: str, user_label: Optional[str], 
                          apply_to_subtree: bool = False) -> None:
         """Update user label for a node in categorized JSON."""
+        result = self.update_user_labels(code, [(node_code, user_label, apply_to_subtree)])
+        if result["not_found"]:
+            raise FileNotFoundError("Node code not found")
+    
+    def update_user_labels(self, code: str, items: List[Tuple[str, Optional[str], bool]]) -> Dict[str, Any]:
+        """Apply many ``(node_code, user_label, apply_to_subtree)`` updates in one load/save.
+        
+        Node codes repeat in BC3 trees, so every node with the code is
+        updated. An empty label clears the user label. Returns the changed
+        PARTIDAs and the node codes that were not found.
+        """
+        with _record_locks.hold(code):
+            return self._update_user_labels(code, items)
+    
+    def _update_user_labels(self, code: str, items: List[Tuple[str, Optional[str], bool]]) -> Dict[str, Any]:
         categorized_path = os.path.join(CATEGORIZED_DIR, f"{code}.json")
         
         if not os.path.exists(categorized_path):
@@ -170,73 +549,124 @@ class MLService:
             with open(categorized_path, "r", encoding="utf-8") as f:
                 data = json.load(f)
             
-            # Find and update target node
-            updated = self._apply_label_to_tree(data, node_code, user_label, apply_to_subtree)
+            # Index every node by code once instead of searching per update
+            nodes_by_code: Dict[str, List[Dict[str, Any]]] = {}
+            for node in self._iter_dicts(data):
+                if "code" in node:
+                    nodes_by_code.setdefault(str(node["code"]), []).append(node)
             
-            if not updated:
-                raise FileNotFoundError("Node code not found")
+            changed: Dict[int, Dict[str, Any]] = {}
+            not_found: List[str] = []
+            for node_code, user_label, apply_to_subtree in items:
+                targets = nodes_by_code.get(str(node_code))
+                if not targets:
+                    not_found.append(node_code)
+                    continue
+                for target in targets:
+                    partidas = iter_partida_nodes(target) if apply_to_subtree else (
+                        [target] if str(target.get("concept_type", "")) == "PARTIDA" else []
+                    )
+                    for node in partidas:
+                        if self._set_user_label(node, user_label):
+                            changed[id(node)] = node
             
-            # Save updated data
-            with open(categorized_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            if changed:
+                # Save updated data
+                self.save_categorized(code, data)
             
-            logger.info(f"Updated label for node {node_code} in {code}")
+            logger.info(f"Updated {len(changed)} labels in {code} from {len(items)} requested updates")
+            return {
+                "changed": [
+                    {
+                        "node_code": node.get("code"),
+                        "summary": node.get("summary"),
+                        "user_label": node["_prediction"].get("user_label"),
+                        "predicted_label": node["_prediction"].get("predicted_label"),
+                    }
+                    for node in changed.values()
+                ],
+                "not_found": not_found,
+            }
             
         except Exception as e:
-            logger.error(f"Failed to update label: {e}")
-            raise MLModelError(f"Failed to update label: {e}")
+            logger.error(f"Failed to update labels: {e}")
+            raise MLModelError(f"Failed to update labels: {e}")
     
-    def _apply_label_to_tree(self, obj: Any, target_code: str, user_label: Optional[str], 
-                           apply_to_subtree: bool) -> bool:
-        """Recursively find and update node labels."""
-        updated = False
+    def propagate_label(self, text: str, user_label: str, overwrite: bool = False) -> Dict[str, Any]:
+        """Label every PARTIDA across all records whose normalized summary equals ``text``.
         
-        def apply_label(node: dict):
-            if str(node.get("concept_type", "")) == "PARTIDA":
-                pred = node.get("_prediction")
-                if not isinstance(pred, dict):
-                    pred = {}
-                    node["_prediction"] = pred
-                
-                # Clear or set user label
-                if user_label is None or str(user_label).strip() == "":
-                    if "user_label" in pred:
-                        del pred["user_label"]
-                else:
-                    pred["user_label"] = user_label
-        
-        def find_and_apply(node: Any) -> bool:
-            nonlocal updated
-            
-            if isinstance(node, dict):
-                if str(node.get("code", "")) == target_code:
-                    if apply_to_subtree:
-                        self._walk_and_apply_label(node, apply_label)
-                    else:
-                        apply_label(node)
-                    updated = True
-                    return True
-                
-                for v in node.values():
-                    if find_and_apply(v):
-                        return True
-                        
-            elif isinstance(node, list):
-                for item in node:
-                    if find_and_apply(item):
-                        return True
-                        
-            return False
+        The text index only selects the records to visit. Each one is loaded
+        and saved once under its record lock, and the label is applied to
+        the PARTIDAs of the loaded record whose summary matches, not to
+        every node sharing their code. Nodes that already carry a different
+        user label in the loaded record are skipped unless ``overwrite`` is
+        set.
+        """
+        from .text_index import get_text_index, normalize_summary
+
+        norm = normalize_summary(text)
+        codes = sorted({match["code"] for match in get_text_index().exact_matches(text)})
+        
+        matched = skipped = 0
+        records: Dict[str, int] = {}
+        for code in codes:
+            try:
+                with _record_locks.hold(code):
+                    result = self._label_matching_partidas(code, norm, user_label, overwrite)
+            except (FileNotFoundError, MLModelError) as e:
+                logger.warning(f"Skipping {code} in label propagation: {e}")
+                continue
+            matched += result["matched"]
+            skipped += result["skipped"]
+            records[code] = result["changed"]
         
-        find_and_apply(obj)
-        return updated
+        changed = sum(records.values())
+        logger.info(f"Propagated label '{user_label}' to {changed} nodes in {len(records)} records")
+        return {"matched": matched, "changed": changed, "skipped": skipped, "records": records}
     
-    def _walk_and_apply_label(self, obj: Any, apply_func):
-        """Walk tree and apply function to all nodes."""
-        if isinstance(obj, dict):
-            apply_func(obj)
-            for v in obj.values():
-                self._walk_and_apply_label(v, apply_func)
-        elif isinstance(obj, list):
-            for item in obj:
-                self._walk_and_apply_label(item, apply_func)
\ No newline at end of file
+    def _label_matching_partidas(self, code: str, norm: str, user_label: str, overwrite: bool) -> Dict[str, int]:
+        from .text_index import normalize_summary
+
+        categorized_path = os.path.join(CATEGORIZED_DIR, f"{code}.json")
+        if not os.path.exists(categorized_path):
+            raise FileNotFoundError("Categorized file not found")
+        
+        try:
+            with open(categorized_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            
+            matched = skipped = changed = 0
+            for node in iter_partida_nodes(data):
+                if normalize_summary(node.get("summary", "")) != norm:
+                    continue
+                matched += 1
+                pred = node.get("_prediction")
+                current = pred.get("user_label") if isinstance(pred, dict) else None
+                if current and current != user_label and not overwrite:
+                    skipped += 1
+                    continue
+                if self._set_user_label(node, user_label):
+                    changed += 1
+            
+            if changed:
+                self.save_categorized(code, data)
+            return {"matched": matched, "skipped": skipped, "changed": changed}
+            
+        except Exception as e:
+            logger.error(f"Failed to propagate label in {code}: {e}")
+            raise MLModelError(f"Failed to propagate label: {e}")
+    
+    @staticmethod
+    def _set_user_label(node: Dict[str, Any], user_label: Optional[str]) -> bool:
+        """Set or clear a PARTIDA's user label; returns whether it changed."""
+        pred = node.get("_prediction")
+        if not isinstance(pred, dict):
+            pred = {}
+            node["_prediction"] = pred
+        
+        if user_label is None or str(user_label).strip() == "":
+            return pred.pop("user_label", None) is not None
+        if pred.get("user_label") == user_label:
+            return False
+        pred["user_label"] = user_label
+        return True
\ No newline at end of file
@@ -0,0 +1,341 @@
+import os
+import shutil
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import (
+    ML_MODEL_PATH, ML_MODEL_WATCH_INTERVAL, ML_COMPILED_SCORER, ML_SCORER_TOLERANCE,
+    ML_SCORER_AUTO_EXPORT, ML_MMAP_MODE
+)
+from ..exceptions import MLModelError, MLModelNotFoundError
+from ..logging_config import get_logger
+from .prediction_cache import PredictionCache, file_digest, get_prediction_cache
+
+logger = get_logger(__name__)
+
+WARMUP_TEXT = "Hormigón HA-25/B/20/IIa en zapatas [SEP] m3 hormigón"
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """An immutable snapshot of a loaded model and its metadata.
+
+    ``pipe`` is the prediction engine: the sklearn pipeline or a compiled
+    LinearScorer, both exposing ``predict_proba`` and ``classes_``.
+    """
+    pipe: Any
+    engine: str
+    path: str
+    digest: str
+    mtime: float
+    file_size: int
+    loaded_at: str
+    load_seconds: float
+    warmup_seconds: float
+    memory_bytes: int
+    rss_delta_bytes: Optional[int]
+    lowercase: bool
+
+    @property
+    def version(self) -> str:
+        """Short, human readable model version."""
+        return self.digest[:12]
+
+    @property
+    def cache_namespace(self) -> str:
+        """Prediction cache namespace; engines may differ in the last float digits."""
+        return f"{self.digest}:{self.engine}"
+
+    @property
+    def classes(self) -> list:
+        return list(getattr(self.pipe, "classes_", []))
+
+def _current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process, when /proc is available."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def estimate_nbytes(obj: Any, _seen: Optional[set] = None, _depth: int = 0) -> int:
+    """Approximate the memory held by a fitted estimator (arrays, vocabularies)."""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen or _depth > 12:
+        return 0
+    _seen.add(id(obj))
+
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int) and hasattr(obj, "dtype"):
+        # numpy arrays; views of another array share its buffer
+        return 0 if hasattr(getattr(obj, "base", None), "dtype") else nbytes
+    if hasattr(obj, "indptr") and hasattr(obj, "data"):
+        # scipy sparse matrices
+        return sum(estimate_nbytes(getattr(obj, name), _seen, _depth + 1)
+                   for name in ("data", "indices", "indptr"))
+    if isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+        return sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(
+            estimate_nbytes(k, _seen, _depth + 1) + estimate_nbytes(v, _seen, _depth + 1)
+            for k, v in obj.items()
+        )
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(estimate_nbytes(v, _seen, _depth + 1) for v in obj)
+    if hasattr(obj, "__dict__"):
+        return sys.getsizeof(obj) + estimate_nbytes(vars(obj), _seen, _depth + 1)
+    return sys.getsizeof(obj)
+
+def _model_lowercases(pipe: Any) -> bool:
+    """Whether the model's text vectorizer is a lowercasing word analyzer."""
+    steps = getattr(pipe, "steps", None)
+    vectorizer = steps[0][1] if steps else pipe
+    return (getattr(vectorizer, "analyzer", None) == "word"
+            and bool(getattr(vectorizer, "lowercase", False)))
+
+class ModelRegistry:
+    """Process-wide holder of the active ML model.
+
+    Readers take a :class:`LoadedModel` snapshot with :meth:`get`; a reload
+    builds and warms up a new snapshot and swaps the reference, so requests
+    already holding the previous snapshot finish with it undisturbed.
+    """
+
+    def __init__(self, model_path: str = ML_MODEL_PATH, cache: Optional[PredictionCache] = None):
+        self.model_path = model_path
+        self._cache = cache
+        self._current: Optional[LoadedModel] = None
+        self._load_lock = threading.Lock()
+        self._watch_thread: Optional[threading.Thread] = None
+        self._watch_stop = threading.Event()
+        self._last_signature: Optional[Tuple[float, int]] = None
+        self._last_error: Optional[str] = None
+        self._reloads = 0
+
+    @property
+    def cache(self) -> PredictionCache:
+        if self._cache is None:
+            self._cache = get_prediction_cache()
+        return self._cache
+
+    def _file_signature(self) -> Optional[Tuple[float, int]]:
+        try:
+            stat = os.stat(self.model_path)
+        except OSError:
+            return None
+        return stat.st_mtime, stat.st_size
+
+    def get(self) -> LoadedModel:
+        """Return the active model, loading it on first use."""
+        model = self._current
+        if model is None:
+            model = self.load()
+        return model
+
+    def is_loaded(self) -> bool:
+        return self._current is not None
+
+    def load(self, force: bool = False) -> LoadedModel:
+        """Load, warm up and activate the model file.
+
+        Unless ``force`` is set, a file whose digest matches the active
+        model is not loaded again.
+        """
+        with self._load_lock:
+            signature = self._file_signature()
+            current = self._current
+            if signature is None:
+                self._last_error = f"Model file not found: {self.model_path}"
+                raise MLModelNotFoundError(f"Failed to load ML model from {self.model_path}: file not found")
+
+            try:
+                digest = file_digest(self.model_path)
+                if not force and current is not None and current.digest == digest:
+                    self._last_signature = signature
+                    return current
+
+                logger.info(f"Loading ML model from {self.model_path}")
+                rss_before = _current_rss_bytes()
+                start = time.perf_counter()
+                pipe, engine = self._load_engine(digest)
+                load_seconds = time.perf_counter() - start
+
+                # Warm up so the first real request does not pay lazy initialisation
+                start = time.perf_counter()
+                pipe.predict_proba([WARMUP_TEXT])
+                warmup_seconds = time.perf_counter() - start
+                rss_after = _current_rss_bytes()
+
+                model = LoadedModel(
+                    pipe=pipe,
+                    engine=engine,
+                    path=self.model_path,
+                    digest=digest,
+                    mtime=signature[0],
+                    file_size=signature[1],
+                    loaded_at=datetime.utcnow().isoformat() + "Z",
+                    load_seconds=round(load_seconds, 4),
+                    warmup_seconds=round(warmup_seconds, 4),
+                    memory_bytes=estimate_nbytes(pipe),
+                    rss_delta_bytes=(rss_after - rss_before) if rss_before and rss_after else None,
+                    lowercase=_model_lowercases(pipe),
+                )
+            except MLModelError as e:
+                self._last_error = str(e)
+                raise
+            except Exception as e:
+                self._last_error = str(e)
+                raise MLModelNotFoundError(f"Failed to load ML model from {self.model_path}: {e}")
+
+            self.cache.set_model(model.cache_namespace)
+            self._current = model
+            # Only a successful load settles the file: a failed one is retried on the next check
+            self._last_signature = signature
+            self._last_error = None
+            if current is not None:
+                self._reloads += 1
+            logger.info(
+                f"ML model {model.version} active with {model.engine} engine (load {model.load_seconds}s, "
+                f"warm-up {model.warmup_seconds}s, ~{model.memory_bytes // 1024} KiB)"
+            )
+            return model
+
+    def _load_engine(self, digest: str) -> Tuple[Any, str]:
+        """Return (engine, engine name) for the model file with this digest.
+
+        A compiled scorer exported for this exact digest is used without
+        loading the joblib pipeline; with ML_MMAP_MODE its arrays are
+        memory-mapped, so every worker process shares the same pages.
+        Otherwise the pipeline is loaded and, when possible, compiled after a
+        parity check (and exported for the next worker when
+        ML_SCORER_AUTO_EXPORT is on); the sklearn pipeline is only kept when
+        compilation is unsupported or inexact.
+        """
+        if ML_COMPILED_SCORER:
+            from .linear_scorer import LinearScorer, scorer_path_for
+
+            scorer_dir = scorer_path_for(self.model_path)
+            if LinearScorer.read_source_digest(scorer_dir) == digest:
+                try:
+                    return LinearScorer.load(scorer_dir, mmap_mode=ML_MMAP_MODE), "compiled"
+                except MLModelError as e:
+                    logger.warning(f"Ignoring compiled scorer {scorer_dir}: {e}")
+
+        try:
+            import joblib
+        except ImportError:
+            raise MLModelError("joblib library not available")
+        # mmap_mode only applies to arrays of uncompressed joblib dumps
+        pipe = joblib.load(self.model_path, mmap_mode=ML_MMAP_MODE)
+
+        if ML_COMPILED_SCORER:
+            try:
+                scorer = LinearScorer.from_pipeline(pipe, source_digest=digest)
+                diff = scorer.max_abs_diff(pipe, LinearScorer.probe_texts(pipe))
+                if diff > ML_SCORER_TOLERANCE:
+                    logger.warning(f"Compiled scorer differs from model by {diff:.2e}; using sklearn")
+                    return pipe, "sklearn"
+                if ML_SCORER_AUTO_EXPORT and self._export_scorer(scorer, scorer_dir):
+                    try:
+                        return LinearScorer.load(scorer_dir, mmap_mode=ML_MMAP_MODE), "compiled"
+                    except MLModelError as e:
+                        logger.warning(f"Could not reload exported scorer {scorer_dir}: {e}")
+                return scorer, "compiled"
+            except MLModelError as e:
+                logger.info(f"Compiled scorer unavailable, using sklearn pipeline: {e}")
+            except Exception as e:
+                # An unexpected pipeline must not fail the load: sklearn can still serve it
+                logger.warning(f"Could not compile scorer, using sklearn pipeline: {type(e).__name__}: {e}")
+        return pipe, "sklearn"
+
+    @staticmethod
+    def _export_scorer(scorer: Any, scorer_dir: str) -> bool:
+        """Write a scorer export atomically; concurrent workers may race safely."""
+        tmp_dir = f"{scorer_dir}.tmp{os.getpid()}"
+        try:
+            scorer.save(tmp_dir)
+            if os.path.isdir(scorer_dir):
+                shutil.rmtree(scorer_dir, ignore_errors=True)
+            os.rename(tmp_dir, scorer_dir)
+            return True
+        except OSError as e:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if os.path.isdir(scorer_dir):
+                # Another worker finished the same export first
+                return True
+            logger.warning(f"Could not export compiled scorer to {scorer_dir}: {e}")
+            return False
+
+    def file_changed(self) -> bool:
+        """Whether the model file changed on disk since it was last loaded."""
+        signature = self._file_signature()
+        return signature is not None and signature != self._last_signature
+
+    def reload_if_changed(self) -> bool:
+        """Reload the model when its file changed on disk; return True on swap."""
+        if not self.file_changed():
+            return False
+        previous = self._current
+        try:
+            model = self.load()
+        except MLModelError as e:
+            logger.error(f"Model reload failed, keeping previous model: {e}")
+            return False
+        return model is not previous
+
+    def start_watching(self, interval: float = ML_MODEL_WATCH_INTERVAL) -> None:
+        """Poll the model file in a background thread and hot-swap on change."""
+        if interval <= 0 or (self._watch_thread is not None and self._watch_thread.is_alive()):
+            return
+        self._watch_stop.clear()
+
+        def watch():
+            while not self._watch_stop.wait(interval):
+                try:
+                    self.reload_if_changed()
+                except Exception as e:
+                    logger.error(f"Model watcher error: {e}")
+
+        self._watch_thread = threading.Thread(target=watch, name="model-watcher", daemon=True)
+        self._watch_thread.start()
+        logger.info(f"Watching {self.model_path} for changes every {interval}s")
+
+    def stop_watching(self) -> None:
+        """Stop the background file watcher."""
+        self._watch_stop.set()
+        if self._watch_thread is not None:
+            self._watch_thread.join(timeout=5)
+            self._watch_thread = None
+
+    def status(self) -> Dict[str, Any]:
+        """Describe the active model for status endpoints."""
+        model = self._current
+        status: Dict[str, Any] = {
+            "model_path": self.model_path,
+            "loaded": model is not None,
+            "reloads": self._reloads,
+            "watching": self._watch_thread is not None and self._watch_thread.is_alive(),
+            "mmap_mode": ML_MMAP_MODE,
+        }
+        if self._last_error:
+            status["error"] = self._last_error
+        if model is not None:
+            status.update({
+                "model_version": model.version,
+                "engine": model.engine,
+                "model_digest": model.digest,
+                "loaded_at": model.loaded_at,
+                "load_seconds": model.load_seconds,
+                "warmup_seconds": model.warmup_seconds,
+                "memory_bytes": model.memory_bytes,
+                "rss_delta_bytes": model.rss_delta_bytes,
+                "file_size": model.file_size,
+            })
+        return status
+
+# Shared by every router / MLService instance in the process
+model_registry = ModelRegistry()
@@ -0,0 +1,272 @@
+import copy
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import (
+    METRICS_PATH, MODEL_VERSIONS_DIR, ML_RETRAIN_HOLDOUT_PCT,
+    ML_RETRAIN_TIME_BUDGET, ML_RETRAIN_MIN_ROWS, ML_RETRAIN_MIN_HOLDOUT_ROWS
+)
+from ..exceptions import MLModelError
+from ..logging_config import get_logger
+from .model_registry import ModelRegistry, model_registry
+from .prediction_cache import file_digest
+from .training_export import TrainingExporter, iter_training_rows
+
+logger = get_logger(__name__)
+
+def is_holdout(row_hash: str, holdout_pct: float) -> bool:
+    """Stable train/validation split on the text hash, so a text never switches sides."""
+    return int(row_hash[:8], 16) % 10000 < holdout_pct * 100
+
+def _split_pipeline(pipe: Any) -> Tuple[Any, Any]:
+    steps = getattr(pipe, "steps", None)
+    if not steps or len(steps) != 2:
+        raise MLModelError("Retraining needs a two-step (vectorizer, classifier) pipeline")
+    return steps[0][1], steps[1][1]
+
+def _warm_fit_binary(estimator: Any, X: Any, y: Any) -> Any:
+    """Continue training a fitted binary estimator from its current weights."""
+    estimator = copy.deepcopy(estimator)
+    if hasattr(estimator, "partial_fit"):
+        estimator.partial_fit(X, y)
+    elif "warm_start" in estimator.get_params():
+        estimator.set_params(warm_start=True)
+        estimator.fit(X, y)
+    else:
+        raise MLModelError(f"{type(estimator).__name__} cannot be warm-started")
+    return estimator
+
+def warm_fit_classifier(clf: Any, X: Any, y: List[str], deadline: float) -> Any:
+    """Return a copy of a fitted classifier trained further on (X, y).
+
+    One-vs-rest models update each class from its current weights; classes
+    without positive and negative examples in ``y`` keep their estimator.
+    Multinomial logistic regression and SGD models continue as a whole.
+    """
+    import numpy as np
+
+    y = np.asarray(y)
+    estimators = getattr(clf, "estimators_", None)
+    if estimators is not None and hasattr(clf, "label_binarizer_"):
+        new_clf = copy.copy(clf)
+        new_estimators = list(estimators)
+        for index, label in enumerate(clf.classes_):
+            if time.monotonic() > deadline:
+                raise MLModelError("Retraining exceeded its time budget")
+            y_binary = (y == label).astype(int)
+            if y_binary.min() == y_binary.max() or not hasattr(estimators[index], "coef_"):
+                continue
+            new_estimators[index] = _warm_fit_binary(estimators[index], X, y_binary)
+        new_clf.estimators_ = new_estimators
+        return new_clf
+
+    if hasattr(clf, "partial_fit"):
+        new_clf = copy.deepcopy(clf)
+        new_clf.partial_fit(X, y, classes=clf.classes_)
+        return new_clf
+    if "warm_start" in clf.get_params():
+        if set(y) != set(clf.classes_):
+            raise MLModelError("Warm start needs examples of every class; use a cold retrain")
+        new_clf = copy.deepcopy(clf)
+        new_clf.set_params(warm_start=True)
+        new_clf.fit(X, y)
+        return new_clf
+    raise MLModelError(f"{type(clf).__name__} cannot be warm-started; use a cold retrain")
+
+def fit_candidate(current: Any, train_x: List[str], train_y: List[str], cold: bool, deadline: float) -> Any:
+    """Return the retrained pipeline: a full refit when ``cold``, else a warm start of its classifier."""
+    from sklearn.base import clone
+
+    if cold:
+        return clone(current).fit(train_x, train_y)
+    vectorizer, clf = _split_pipeline(current)
+    new_clf = warm_fit_classifier(clf, vectorizer.transform(train_x), train_y, deadline)
+    candidate = copy.copy(current)
+    candidate.steps = [current.steps[0], (current.steps[1][0], new_clf)]
+    return candidate
+
+def _fit_with_budget(current: Any, train_x: List[str], train_y: List[str], cold: bool,
+                     deadline: float, time_budget: float) -> Any:
+    """Run :func:`fit_candidate` in a worker process that is killed at the deadline.
+
+    A single solver call (a cold fit, or one class of a warm start) cannot be
+    interrupted in-process, so the budget is only enforceable from outside.
+    """
+    context = multiprocessing.get_context("spawn")
+    pool = context.Pool(processes=1)
+    try:
+        job = pool.apply_async(fit_candidate, (current, train_x, train_y, cold, deadline))
+        try:
+            return job.get(timeout=max(0.0, deadline - time.monotonic()))
+        except multiprocessing.TimeoutError:
+            raise MLModelError(f"Retraining exceeded its time budget ({time_budget}s)")
+    finally:
+        pool.terminate()
+        pool.join()
+
+def _evaluate(pipe: Any, texts: List[str], labels: List[str]) -> Dict[str, Any]:
+    from sklearn.metrics import accuracy_score, f1_score
+
+    if not texts:
+        return {"accuracy": None, "macro_f1": None, "rows": 0}
+    predicted = pipe.predict(texts)
+    return {
+        "accuracy": round(float(accuracy_score(labels, predicted)), 6),
+        "macro_f1": round(float(f1_score(labels, predicted, average="macro", zero_division=0)), 6),
+        "rows": len(texts),
+    }
+
+class ModelTrainer:
+    """Retrains the active model from exported labelled data.
+
+    The candidate continues from the current weights on the current TF-IDF
+    vocabulary (``cold`` refits the whole pipeline instead). It is saved
+    with its metrics under MODEL_VERSIONS_DIR and promoted only when its
+    accuracy on held-out user labels is not below the current model's and
+    there are at least ML_RETRAIN_MIN_HOLDOUT_ROWS of them. Training runs in
+    a worker process that is killed when the time budget runs out. Promotion replaces
+    the model file and reloads the shared registry; other workers pick the
+    file up through the registry's hot reload.
+    """
+
+    def __init__(self, registry: Optional[ModelRegistry] = None, exporter: Optional[TrainingExporter] = None,
+                 versions_dir: str = MODEL_VERSIONS_DIR):
+        self.registry = registry if registry is not None else model_registry
+        self.exporter = exporter or TrainingExporter()
+        self.versions_dir = versions_dir
+
+    def _load_rows(self, holdout_pct: float, classes: Optional[set]) -> Tuple[List, List, List, List, int]:
+        """Split exported rows into training and holdout sets.
+        
+        Only user-labelled rows are held out: rows labelled from the current
+        model's own predictions would favour the current model in the
+        promotion check, so they are always used for training.
+        """
+        train_x, train_y, val_x, val_y = [], [], [], []
+        unknown = 0
+        for row in iter_training_rows(self.exporter.training_path):
+            if classes is not None and row["label"] not in classes:
+                unknown += 1
+                continue
+            if row.get("source") == "user" and is_holdout(row["hash"], holdout_pct):
+                val_x.append(row["text"])
+                val_y.append(row["label"])
+            else:
+                train_x.append(row["text"])
+                train_y.append(row["label"])
+        return train_x, train_y, val_x, val_y, unknown
+
+    def retrain(self, export: bool = True, cold: bool = False, promote: bool = True,
+                holdout_pct: float = ML_RETRAIN_HOLDOUT_PCT,
+                time_budget: float = ML_RETRAIN_TIME_BUDGET) -> Dict[str, Any]:
+        """Train a candidate model, save it and promote it if it does not regress."""
+        start = time.monotonic()
+        deadline = start + time_budget
+        if export:
+            self.exporter.export()
+        if not os.path.exists(self.exporter.training_path):
+            raise MLModelError("No training data exported yet")
+
+        try:
+            import joblib
+            import sklearn  # noqa: F401
+        except ImportError:
+            raise MLModelError("joblib/scikit-learn not available")
+
+        model_path = self.registry.model_path
+        current_digest = file_digest(model_path)
+        current = joblib.load(model_path)
+        _, clf = _split_pipeline(current)
+
+        # A warm start cannot add classes; rows with labels unknown to the model are skipped
+        classes = None if cold else {str(c) for c in clf.classes_}
+        train_x, train_y, val_x, val_y, unknown = self._load_rows(holdout_pct, classes)
+        if len(train_x) < ML_RETRAIN_MIN_ROWS:
+            raise MLModelError(f"Not enough training rows: {len(train_x)} (min {ML_RETRAIN_MIN_ROWS})")
+
+        logger.info(
+            f"Retraining on {len(train_x)} rows ({len(val_x)} user-labelled held out, "
+            f"mode {'cold' if cold else 'warm'})"
+        )
+        candidate = _fit_with_budget(current, train_x, train_y, cold, deadline, time_budget)
+        train_seconds = time.monotonic() - start
+
+        current_metrics = _evaluate(current, val_x, val_y)
+        candidate_metrics = _evaluate(candidate, val_x, val_y)
+        enough_holdout = len(val_x) >= ML_RETRAIN_MIN_HOLDOUT_ROWS
+        improved = enough_holdout and candidate_metrics["accuracy"] >= current_metrics["accuracy"]
+
+        version = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+        os.makedirs(self.versions_dir, exist_ok=True)
+        artifact_path = os.path.join(self.versions_dir, f"model-{version}.joblib")
+        joblib.dump(candidate, artifact_path)
+
+        result = {
+            "version": version,
+            "artifact_path": artifact_path,
+            "mode": "cold" if cold else "warm",
+            "base_model_digest": current_digest,
+            "model_digest": file_digest(artifact_path),
+            "train_rows": len(train_x),
+            "holdout_rows": len(val_x),
+            "skipped_unknown_labels": unknown,
+            "train_seconds": round(train_seconds, 3),
+            "current": current_metrics,
+            "candidate": candidate_metrics,
+            "classes": [str(c) for c in candidate.classes_],
+            "promoted": False,
+        }
+        if not enough_holdout:
+            result["reason"] = (
+                f"Too few user-labelled holdout rows: {len(val_x)} (min {ML_RETRAIN_MIN_HOLDOUT_ROWS})"
+            )
+        elif not improved:
+            result["reason"] = "Holdout accuracy regressed"
+        elif not promote:
+            result["reason"] = "Promotion disabled"
+        else:
+            self._promote(artifact_path, current_digest, result)
+            result["promoted"] = True
+
+        with open(os.path.join(self.versions_dir, f"model-{version}.metrics.json"), "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        logger.info(
+            f"Retrained model {version}: holdout accuracy {current_metrics['accuracy']} -> "
+            f"{candidate_metrics['accuracy']}, promoted={result['promoted']}"
+        )
+        return result
+
+    def _promote(self, artifact_path: str, current_digest: str, result: Dict[str, Any]) -> None:
+        """Swap the artifact in as the active model, keeping the old file for rollback."""
+        model_path = self.registry.model_path
+        backup_path = os.path.join(self.versions_dir, f"model-previous-{current_digest[:12]}.joblib")
+        if not os.path.exists(backup_path):
+            shutil.copy2(model_path, backup_path)
+
+        tmp_path = f"{model_path}.tmp{os.getpid()}"
+        shutil.copy2(artifact_path, tmp_path)
+        os.replace(tmp_path, model_path)
+        model = self.registry.load()
+        result["model_version"] = model.version
+
+        try:
+            metrics = {}
+            if os.path.exists(METRICS_PATH):
+                with open(METRICS_PATH, "r", encoding="utf-8") as f:
+                    metrics = json.load(f)
+            metrics.update({
+                "classes": result["classes"],
+                "model_version": model.version,
+                "holdout_accuracy": result["candidate"]["accuracy"],
+                "trained_at": result["version"],
+            })
+            os.makedirs(os.path.dirname(METRICS_PATH), exist_ok=True)
+            with open(METRICS_PATH, "w", encoding="utf-8") as f:
+                json.dump(metrics, f, ensure_ascii=False, indent=2)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not update {METRICS_PATH}: {e}")
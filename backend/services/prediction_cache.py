@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from ..config import PREDICTION_CACHE_PATH, PREDICTION_CACHE_SIZE
+from ..logging_config import get_logger
+
+logger = get_logger(__name__)
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def normalize_text(text: str, lowercase: bool = True) -> str:
+    """Normalize model input for cache keys.
+
+    Collapsing whitespace and lowercasing mirrors the default TF-IDF word
+    analyzer, so texts that normalize equally get identical predictions.
+    """
+    text = " ".join(text.split())
+    return text.lower() if lowercase else text
+
+class PredictionCache:
+    """Two-tier prediction cache: in-memory LRU backed by an optional SQLite file."""
+
+    def __init__(self, db_path: Optional[str] = PREDICTION_CACHE_PATH,
+                 memory_size: int = PREDICTION_CACHE_SIZE):
+        self.db_path = db_path or None
+        self.memory_size = max(0, memory_size)
+        self._memory: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._model_digest: Optional[str] = None
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Open the SQLite tier on first use."""
+        if self._conn is None and self.db_path:
+            try:
+                os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+                conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS predictions ("
+                    "key TEXT PRIMARY KEY, model_digest TEXT NOT NULL, "
+                    "result TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+                conn.commit()
+                self._conn = conn
+            except sqlite3.Error as e:
+                logger.warning(f"Prediction cache disk tier disabled ({self.db_path}): {e}")
+                self.db_path = None
+        return self._conn
+
+    @staticmethod
+    def make_key(model_digest: str, input_text: str, topk: int, lowercase: bool = True) -> str:
+        """Build the cache key for a model, normalized input text and top-k."""
+        raw = f"{model_digest}\x1f{normalize_text(input_text, lowercase)}\x1f{int(topk)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def set_model(self, model_digest: str) -> None:
+        """Switch to a model version, dropping entries of any other version."""
+        with self._lock:
+            if model_digest == self._model_digest:
+                return
+            self._memory.clear()
+            conn = self._connect()
+            if conn is not None:
+                try:
+                    deleted = conn.execute(
+                        "DELETE FROM predictions WHERE model_digest != ?", (model_digest,)
+                    ).rowcount
+                    conn.commit()
+                    if deleted:
+                        logger.info(f"Prediction cache invalidated {deleted} entries from previous models")
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to invalidate prediction cache: {e}")
+            self._model_digest = model_digest
+
+    def preload(self, limit: Optional[int] = None) -> int:
+        """Read the newest disk entries of the active model into the memory tier.
+
+        Returns the number of entries loaded. Used before forking workers so
+        they start with a warm memory tier.
+        """
+        limit = self.memory_size if limit is None else min(limit, self.memory_size)
+        if limit <= 0 or self._model_digest is None:
+            return 0
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return 0
+            try:
+                rows = conn.execute(
+                    "SELECT key, result FROM predictions WHERE model_digest = ? ORDER BY created_at DESC LIMIT ?",
+                    (self._model_digest, limit),
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"Prediction cache preload failed: {e}")
+                return 0
+            # Oldest first so the newest entries end up most recently used
+            for key, payload in reversed(rows):
+                self._remember(key, json.loads(payload))
+        return len(rows)
+
+    def after_fork(self) -> None:
+        """Drop the SQLite connection inherited from the parent process.
+
+        SQLite connections must not be shared across fork; the child opens
+        its own on first use.
+        """
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Iterable[str], model_digest: str) -> Dict[str, Dict]:
+        """Return cached results of ``model_digest`` for the given keys; missing keys are omitted."""
+        found: Dict[str, Dict] = {}
+        missing: List[str] = []
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                result = self._memory.get(key)
+                if result is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = result
+                    self._stats["memory_hits"] += 1
+                else:
+                    missing.append(key)
+
+            conn = self._connect() if missing else None
+            if conn is not None:
+                try:
+                    for start in range(0, len(missing), 500):
+                        chunk = missing[start:start + 500]
+                        rows = conn.execute(
+                            f"SELECT key, result FROM predictions "
+                            f"WHERE model_digest = ? AND key IN ({','.join('?' * len(chunk))})",
+                            [model_digest, *chunk],
+                        ).fetchall()
+                        for key, payload in rows:
+                            result = json.loads(payload)
+                            found[key] = result
+                            self._remember(key, result)
+                            self._stats["disk_hits"] += 1
+                except sqlite3.Error as e:
+                    logger.warning(f"Prediction cache lookup failed: {e}")
+
+            self._stats["misses"] += sum(1 for key in missing if key not in found)
+        return found
+
+    def put_many(self, items: Dict[str, Dict], model_digest: str) -> None:
+        """Store results computed by the model ``model_digest`` in both tiers.
+
+        Results of a model that is no longer active (a request that started
+        before a hot swap) are dropped: stored under the new digest they
+        would survive its invalidation.
+        """
+        if not items:
+            return
+        with self._lock:
+            if model_digest != self._model_digest:
+                return
+            for key, result in items.items():
+                self._remember(key, result)
+            conn = self._connect()
+            if conn is not None:
+                try:
+                    now = time.time()
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO predictions (key, model_digest, result, created_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        [
+                            (key, model_digest, json.dumps(result, ensure_ascii=False), now)
+                            for key, result in items.items()
+                        ],
+                    )
+                    conn.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Prediction cache write failed: {e}")
+
+    def _remember(self, key: str, result: Dict) -> None:
+        """Insert into the memory tier, evicting least recently used entries."""
+        if self.memory_size == 0:
+            return
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove every cached prediction."""
+        with self._lock:
+            self._memory.clear()
+            conn = self._connect()
+            if conn is not None:
+                conn.execute("DELETE FROM predictions")
+                conn.commit()
+
+    def hit_rate(self) -> float:
+        """Share of lookups served from either tier since start; never touches SQLite."""
+        with self._lock:
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            lookups = hits + self._stats["misses"]
+            return round(hits / lookups, 4) if lookups else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and tier sizes (the disk size is a ``COUNT(*)``)."""
+        with self._lock:
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            lookups = hits + self._stats["misses"]
+            disk_entries = None
+            if self._conn is not None:
+                try:
+                    disk_entries = self._conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+                except sqlite3.Error:
+                    pass
+            return {
+                **self._stats,
+                "lookups": lookups,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_capacity": self.memory_size,
+                "disk_entries": disk_entries,
+                "disk_path": self.db_path,
+            }
+
+_default_cache: Optional[PredictionCache] = None
+_default_cache_lock = threading.Lock()
+
+def get_prediction_cache() -> PredictionCache:
+    """Return the process-wide prediction cache."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PredictionCache()
+        return _default_cache
+
+def _reset_after_fork() -> None:
+    if _default_cache is not None:
+        _default_cache.after_fork()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
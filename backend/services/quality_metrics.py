@@ -0,0 +1,171 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import CATEGORIZED_DIR, QUALITY_METRICS_PATH
+from ..logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Stored as the actual label of nodes without a user label
+UNLABELLED = ""
+
+def record_contribution(data: Any) -> Counter:
+    """Count (predicted_label, user_label) pairs of a record's PARTIDAs."""
+    from .ml_service import iter_partida_nodes
+
+    counts: Counter = Counter()
+    for node in iter_partida_nodes(data):
+        pred = node.get("_prediction")
+        if not isinstance(pred, dict) or pred.get("predicted_label") is None:
+            continue
+        counts[(str(pred["predicted_label"]), str(pred.get("user_label") or UNLABELLED))] += 1
+    return counts
+
+class QualityMetrics:
+    """Live confusion matrix of predicted vs. user labels across all records.
+
+    Each record's (predicted, actual) pair counts are persisted; when a
+    record is written again only the difference to its previous
+    contribution is applied to the totals, inside one SQLite transaction, so
+    concurrent writers keep the totals exact and reads only touch the
+    small totals table.
+    """
+
+    def __init__(self, db_path: str = QUALITY_METRICS_PATH):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS contributions ("
+                " code TEXT NOT NULL, predicted TEXT NOT NULL, actual TEXT NOT NULL, count INTEGER NOT NULL,"
+                " PRIMARY KEY (code, predicted, actual));"
+                "CREATE TABLE IF NOT EXISTS totals ("
+                " predicted TEXT NOT NULL, actual TEXT NOT NULL, count INTEGER NOT NULL,"
+                " PRIMARY KEY (predicted, actual));"
+            )
+            self._conn = conn
+        return self._conn
+
+    def update_record(self, code: str, data: Any) -> int:
+        """Replace a record's contribution and apply the delta to the totals."""
+        new = record_contribution(data)
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                old = Counter({
+                    (predicted, actual): count for predicted, actual, count in conn.execute(
+                        "SELECT predicted, actual, count FROM contributions WHERE code = ?", (code,)
+                    )
+                })
+                delta = Counter(new)
+                delta.subtract(old)
+                changes = [(p, a, n) for (p, a), n in delta.items() if n]
+                if changes:
+                    conn.executemany(
+                        "INSERT INTO totals (predicted, actual, count) VALUES (?, ?, ?) "
+                        "ON CONFLICT (predicted, actual) DO UPDATE SET count = count + excluded.count",
+                        changes,
+                    )
+                    conn.execute("DELETE FROM totals WHERE count <= 0")
+                    conn.execute("DELETE FROM contributions WHERE code = ?", (code,))
+                    conn.executemany(
+                        "INSERT INTO contributions VALUES (?, ?, ?, ?)",
+                        [(code, p, a, n) for (p, a), n in new.items()],
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return len(changes)
+
+    def rebuild(self, source_dir: str = CATEGORIZED_DIR) -> Dict[str, int]:
+        """Recompute all contributions from the categorized files."""
+        files = sorted(name for name in os.listdir(source_dir) if name.endswith(".json")) \
+            if os.path.isdir(source_dir) else []
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM contributions")
+            conn.execute("DELETE FROM totals")
+        for name in files:
+            try:
+                with open(os.path.join(source_dir, name), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping {name} in quality metrics: {e}")
+                continue
+            self.update_record(os.path.splitext(name)[0], data)
+        logger.info(f"Quality metrics rebuilt from {len(files)} files")
+        return {"files": len(files)}
+
+    def totals(self) -> List[Tuple[str, str, int]]:
+        with self._lock:
+            return self._connect().execute("SELECT predicted, actual, count FROM totals").fetchall()
+
+    def summary(self) -> Dict[str, Any]:
+        """Accuracy, per-class precision/recall/F1 and the confusion matrix of labelled nodes.
+
+        ``confusion[actual][predicted]`` counts labelled nodes; unlabelled
+        nodes only contribute to ``predictions`` and ``predicted_counts``.
+        """
+        confusion: Dict[str, Dict[str, int]] = {}
+        predicted_counts: Counter = Counter()
+        predicted_labelled: Counter = Counter()
+        actual_counts: Counter = Counter()
+        correct: Counter = Counter()
+        for predicted, actual, count in self.totals():
+            predicted_counts[predicted] += count
+            if actual == UNLABELLED:
+                continue
+            confusion.setdefault(actual, {})[predicted] = count
+            predicted_labelled[predicted] += count
+            actual_counts[actual] += count
+            if predicted == actual:
+                correct[actual] += count
+
+        per_class = {}
+        for label in sorted(set(predicted_labelled) | set(actual_counts)):
+            precision = correct[label] / predicted_labelled[label] if predicted_labelled[label] else None
+            recall = correct[label] / actual_counts[label] if actual_counts[label] else None
+            f1 = (2 * precision * recall / (precision + recall)
+                  if precision is not None and recall is not None and precision + recall else None)
+            per_class[label] = {
+                "precision": round(precision, 4) if precision is not None else None,
+                "recall": round(recall, 4) if recall is not None else None,
+                "f1": round(f1, 4) if f1 is not None else None,
+                "support": actual_counts[label],
+                "predicted": predicted_labelled[label],
+            }
+
+        labelled = sum(actual_counts.values())
+        return {
+            "predictions": sum(predicted_counts.values()),
+            "labelled": labelled,
+            "correct": sum(correct.values()),
+            "accuracy": round(sum(correct.values()) / labelled, 4) if labelled else None,
+            "per_class": per_class,
+            "confusion": confusion,
+            "predicted_counts": dict(sorted(predicted_counts.items())),
+        }
+
+_default_metrics: Optional[QualityMetrics] = None
+_default_metrics_lock = threading.Lock()
+
+def get_quality_metrics() -> QualityMetrics:
+    """Return the process-wide quality metrics store."""
+    global _default_metrics
+    with _default_metrics_lock:
+        if _default_metrics is None:
+            _default_metrics = QualityMetrics()
+        return _default_metrics
@@ -1,21 +1,31 @@
 import json
 import re
-from typing import List, Dict, Optional
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Optional, Tuple
 from datetime import datetime
 import os
 
 from ..config import REGISTRY_PATH, ALLOWED_LOCALIZATIONS
 from ..exceptions import RegistryError, ValidationError, InvalidLocalizationError, InvalidEmailError, InvalidYearError
 from ..logging_config import get_logger
+from .metrics import STAGE_SECONDS
+from .single_flight import KeyedLock
 from ..schemas import RecordModel, RecordFilter
 
 logger = get_logger(__name__)
 
+# Serializes registry read-modify-write cycles across threads and processes
+_registry_lock = KeyedLock(lock_dir=os.path.join(os.path.dirname(REGISTRY_PATH), ".locks"))
+
 class RegistryService:
     """Service for managing registry operations."""
     
     def load_registry(self) -> List[Dict]:
         """Load registry from file."""
+        with STAGE_SECONDS.time(stage="registry_load"):
+            return self._load_registry()
+    
+    def _load_registry(self) -> List[Dict]:
         try:
             if not os.path.exists(REGISTRY_PATH):
                 logger.info("Registry file does not exist, returning empty list")
@@ -39,10 +49,13 @@ class RegistryService:
             raise RegistryError(f"Failed to load registry: {e}")
     
     def save_registry(self, entries: List[Dict]) -> None:
-        """Save registry to file."""
+        """Save registry to file atomically."""
         try:
-            with open(REGISTRY_PATH, "w", encoding="utf-8") as f:
-                json.dump(entries, f, indent=2, ensure_ascii=False)
+            tmp_path = f"{REGISTRY_PATH}.tmp{os.getpid()}"
+            with STAGE_SECONDS.time(stage="registry_save"):
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(entries, f, indent=2, ensure_ascii=False)
+                os.replace(tmp_path, REGISTRY_PATH)
             
             logger.info(f"Registry saved successfully with {len(entries)} records")
             
@@ -50,6 +63,19 @@ class RegistryService:
             logger.error(f"Failed to save registry: {e}")
             raise RegistryError(f"Failed to save registry: {e}")
     
+    @contextmanager
+    def transaction(self) -> Iterator[List[Dict]]:
+        """Load the registry under a cross-process lock and save it when the block succeeds.
+        
+        Writers must modify the registry only inside a transaction, so
+        concurrent uploads, label saves and bulk runs never drop each
+        other's entries.
+        """
+        with _registry_lock.hold("records"):
+            entries = self.load_registry()
+            yield entries
+            self.save_registry(entries)
+    
     def generate_next_code(self, entries: List[Dict]) -> str:
         """Generate next sequential code (C00001, C00002, ...)."""
         max_num = 0
@@ -149,25 +175,35 @@ class RegistryService:
     
     def update_ml_status(self, code: str, success: bool, error: Optional[str] = None) -> None:
         """Update ML processing status for a record."""
+        self.update_ml_statuses({code: (success, error)})
+    
+    def update_ml_statuses(self, results: Dict[str, Tuple[bool, Optional[str]]]) -> None:
+        """Update ML processing status of many records with a single registry write.
+        
+        ``results`` maps record codes to ``(success, error)``.
+        """
+        if not results:
+            return
         try:
-            entries = self.load_registry()
-            
-            for entry in entries:
-                if entry.get("code") == code:
+            with self.transaction() as entries:
+                processed_at = datetime.utcnow().isoformat() + "Z"
+                
+                for entry in entries:
+                    code = entry.get("code")
+                    if code not in results:
+                        continue
+                    success, error = results[code]
                     entry["ml_processed"] = success
-                    entry["ml_processed_at"] = datetime.utcnow().isoformat() + "Z"
+                    entry["ml_processed_at"] = processed_at
                     
                     if success:
                         entry["ml_error"] = None
                         entry["categorized_filename"] = f"{code}.json"
                     else:
                         entry["ml_error"] = error
-                    
-                    break
             
-            self.save_registry(entries)
-            logger.info(f"Updated ML status for {code}: success={success}")
+            logger.info(f"Updated ML status for {len(results)} records")
             
         except Exception as e:
-            logger.error(f"Failed to update ML status for {code}: {e}")
-            raise RegistryError(f"Failed to update ML status: {e}")
\ No newline at end of file
+            logger.error(f"Failed to update ML status for {len(results)} records: {e}")
+            raise RegistryError(f"Failed to update ML status: {e}")
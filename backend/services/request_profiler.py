@@ -0,0 +1,291 @@
+import cProfile
+import contextvars
+import functools
+import io
+import json
+import os
+import pstats
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from starlette.concurrency import run_in_threadpool as _run_in_threadpool
+
+from ..config import (
+    PROFILES_DIR, PROFILE_MAX_KEPT, PROFILE_MIN_INTERVAL, PROFILE_TOP_N, PROFILE_SAMPLE_INTERVAL
+)
+from ..exceptions import FileNotFoundError
+from ..logging_config import get_logger
+
+logger = get_logger(__name__)
+
+PROFILE_MODES = ("cprofile", "sample")
+_PROFILE_ID = re.compile(r"^\d{8}T\d{6}-[0-9a-f]{6}$")
+
+# From 3.12 cProfile uses sys.monitoring, which profiles all threads at once
+_CPROFILE_COVERS_THREADS = sys.version_info >= (3, 12)
+
+# Innermost frames of threads that are only waiting for work
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+def _frame_name(code: Any) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """Wall-clock sampler of the stacks of every thread.
+
+    cProfile only sees the thread it is enabled on (the event loop); this
+    also covers work handed to thread pools, such as model inference.
+    """
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def enable(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="request-sampler", daemon=True)
+        self._thread.start()
+
+    def disable(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        """Stacks in the folded format read by flame graph tools."""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, top_n: int) -> str:
+        inclusive: Counter = Counter()
+        own: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for name in set(stack):
+                inclusive[name] += count
+        total = sum(self.stacks.values()) or 1
+        lines = [f"{self.samples} samples every {self.interval * 1000:g} ms, {total} busy thread stacks", ""]
+        for title, counts in (("Inclusive (in stack)", inclusive), ("Self (innermost frame)", own)):
+            lines.append(f"{title}:")
+            for name, count in counts.most_common(top_n):
+                lines.append(f"{count:8d} {100.0 * count / total:6.1f}%  {name}")
+            lines.append("")
+        return "\n".join(lines)
+
+class ProfileSession:
+    """One running profile; ``enable``/``disable`` wrap the profiled request.
+
+    Before Python 3.12, cProfile only sees the thread it is enabled on (the
+    event loop), so calls the request hands to the thread pool through
+    :func:`run_in_threadpool` are profiled with one extra profiler each
+    (``thread_profiles``), merged into the stored stats. From 3.12 cProfile
+    is built on ``sys.monitoring`` and already covers every thread, and a
+    second profiler cannot be enabled while it runs.
+    """
+
+    def __init__(self, profile_id: str, mode: str, sample_interval: float):
+        self.profile_id = profile_id
+        self.mode = mode
+        self.profiler: Union[cProfile.Profile, SamplingProfiler] = (
+            cProfile.Profile() if mode == "cprofile" else SamplingProfiler(sample_interval)
+        )
+        self.thread_profiles: List[cProfile.Profile] = []
+        self.threadpool_calls = 0
+        self._thread_lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.duration = 0.0
+
+    def profile_call(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run ``func`` in the current (pool) thread under its own cProfile profiler if needed."""
+        with self._thread_lock:
+            self.threadpool_calls += 1
+        if _CPROFILE_COVERS_THREADS:
+            return func(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Another profiler owns this thread; the call is still made, unprofiled
+            logger.warning(f"Thread pool call not profiled: {e}")
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            with self._thread_lock:
+                self.thread_profiles.append(profiler)
+
+    def enable(self) -> None:
+        self.started = time.perf_counter()
+        self.profiler.enable()
+
+    def disable(self) -> None:
+        self.profiler.disable()
+        self.duration = time.perf_counter() - self.started
+
+class RequestProfiler:
+    """Admin-triggered profiling of single requests into a bounded directory.
+
+    At most one request is profiled at a time and a new profile starts only
+    ``min_interval`` seconds after the previous one. Each profile stores a
+    ``.txt`` top-N summary, the raw data (a pstats ``.prof`` dump for
+    cProfile, ``.folded`` stacks for the sampler) and a ``.json`` with the
+    request details; only the newest ``max_kept`` profiles are kept.
+    """
+
+    def __init__(self, profiles_dir: str = PROFILES_DIR, max_kept: int = PROFILE_MAX_KEPT,
+                 min_interval: float = PROFILE_MIN_INTERVAL, top_n: int = PROFILE_TOP_N,
+                 sample_interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.profiles_dir = profiles_dir
+        self.max_kept = max_kept
+        self.min_interval = min_interval
+        self.top_n = top_n
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+        self._active = False
+        self._last_start = float("-inf")
+
+    def start(self, mode: str) -> Optional[ProfileSession]:
+        """Return a new session, or None when a profile is running or was taken too recently."""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Invalid profile mode '{mode}'. Allowed: {list(PROFILE_MODES)}")
+        with self._lock:
+            now = time.monotonic()
+            if self._active or now - self._last_start < self.min_interval:
+                return None
+            self._active = True
+            self._last_start = now
+        profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{secrets.token_hex(3)}"
+        return ProfileSession(profile_id, mode, self.sample_interval)
+
+    def finish(self, session: ProfileSession, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Write the session's files, prune old profiles and allow the next profile."""
+        try:
+            os.makedirs(self.profiles_dir, exist_ok=True)
+            base = os.path.join(self.profiles_dir, session.profile_id)
+            profiler = session.profiler
+            if isinstance(profiler, SamplingProfiler):
+                summary = profiler.summary(self.top_n)
+                with open(f"{base}.folded", "w", encoding="utf-8") as f:
+                    f.write(profiler.folded())
+            else:
+                stream = io.StringIO()
+                stats = pstats.Stats(profiler, stream=stream)
+                for thread_profile in session.thread_profiles:
+                    stats.add(thread_profile)
+                stats.dump_stats(f"{base}.prof")
+                stats.strip_dirs()
+                stats.sort_stats("cumulative").print_stats(self.top_n)
+                stats.sort_stats("tottime").print_stats(self.top_n)
+                summary = stream.getvalue()
+
+            meta = {
+                "id": session.profile_id,
+                "mode": session.mode,
+                "threadpool_calls": session.threadpool_calls,
+                "duration_seconds": round(session.duration, 6),
+                "created": datetime.utcnow().isoformat() + "Z",
+                **request,
+            }
+            header = (f"{meta.get('method', '')} {meta.get('path', '')} -> {meta.get('status')} "
+                      f"in {session.duration:.3f}s ({session.mode})\n\n")
+            with open(f"{base}.txt", "w", encoding="utf-8") as f:
+                f.write(header + summary)
+            with open(f"{base}.json", "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False, indent=2)
+            self._prune()
+            logger.info(f"Saved {session.mode} profile {session.profile_id} for {meta.get('path')}")
+            return meta
+        finally:
+            with self._lock:
+                self._active = False
+
+    def _profile_ids(self) -> List[str]:
+        if not os.path.isdir(self.profiles_dir):
+            return []
+        return sorted(
+            name[:-5] for name in os.listdir(self.profiles_dir)
+            if name.endswith(".json") and _PROFILE_ID.match(name[:-5])
+        )
+
+    def _prune(self) -> None:
+        ids = self._profile_ids()
+        for profile_id in ids[:max(0, len(ids) - self.max_kept)]:
+            for ext in (".json", ".txt", ".prof", ".folded"):
+                try:
+                    os.remove(os.path.join(self.profiles_dir, profile_id + ext))
+                except OSError:
+                    pass
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Metadata of the stored profiles, newest first."""
+        profiles = []
+        for profile_id in reversed(self._profile_ids()):
+            try:
+                with open(os.path.join(self.profiles_dir, f"{profile_id}.json"), "r", encoding="utf-8") as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def get_path(self, profile_id: str, kind: str = "summary") -> Tuple[str, str]:
+        """Return (path, media type) of a stored profile's summary or raw data."""
+        if not _PROFILE_ID.match(profile_id):
+            raise FileNotFoundError(f"Profile not found: {profile_id}")
+        base = os.path.join(self.profiles_dir, profile_id)
+        if kind == "summary":
+            candidates = [(f"{base}.txt", "text/plain; charset=utf-8")]
+        else:
+            candidates = [(f"{base}.prof", "application/octet-stream"), (f"{base}.folded", "text/plain; charset=utf-8")]
+        for path, media_type in candidates:
+            if os.path.exists(path):
+                return path, media_type
+        raise FileNotFoundError(f"Profile not found: {profile_id}")
+
+# Process-wide profiler
+request_profiler = RequestProfiler()
+
+# cProfile session of the request being handled, set by ProfilingMiddleware
+current_session: contextvars.ContextVar[Optional[ProfileSession]] = contextvars.ContextVar(
+    "profile_session", default=None
+)
+
+async def run_in_threadpool(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """starlette's ``run_in_threadpool`` that is also profiled when the request is.
+
+    Routes offloading heavy work use this so cProfile mode covers it. Work
+    outside such calls (sync endpoints, the inference executor's batches)
+    is only seen by the ``sample`` mode.
+    """
+    session = current_session.get()
+    if session is not None and session.mode == "cprofile":
+        func = functools.partial(session.profile_call, func)
+    return await _run_in_threadpool(func, *args, **kwargs)
@@ -0,0 +1,278 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from ..config import TRACE_PATH, TRACE_MAX_BYTES, TRACE_BACKUPS, TRACE_BODY_MAX_BYTES, TRACE_BODIES_MAX_BYTES
+from ..exceptions import BC3Exception, ValidationError
+from ..logging_config import get_logger
+
+logger = get_logger(__name__)
+
+class TraceRecorder:
+    """Appends one JSON line per request to a rotating trace file.
+
+    A ``{pid}`` placeholder in the path is replaced by the process id.
+
+    Request bodies are identified by their SHA-256; when not larger than
+    ``body_max_bytes`` they are also stored once under ``bodies/<digest>``
+    next to the trace so it can be replayed (repeated label clicks share a
+    file). The body store is pruned oldest-first beyond ``bodies_max_bytes``.
+    """
+
+    def __init__(self, path: str = TRACE_PATH, max_bytes: int = TRACE_MAX_BYTES, backups: int = TRACE_BACKUPS,
+                 body_max_bytes: int = TRACE_BODY_MAX_BYTES, bodies_max_bytes: int = TRACE_BODIES_MAX_BYTES):
+        # Each worker process writes its own file: rotation is not safe across processes
+        path = path.replace("{pid}", str(os.getpid()))
+        self.path = path
+        self.bodies_dir = os.path.join(os.path.dirname(path) or ".", "bodies")
+        self.body_max_bytes = body_max_bytes
+        self.bodies_max_bytes = bodies_max_bytes
+        self._bodies_size: Optional[int] = None
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._logger = logging.getLogger(f"bc3.trace.{id(self)}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._logger.addHandler(handler)
+
+    def record(self, entry: Dict[str, Any], body: Optional[bytes] = None) -> None:
+        if body is not None and 0 < len(body) <= self.body_max_bytes:
+            try:
+                self._store_body(entry["body_sha256"], body)
+            except OSError as e:
+                logger.warning(f"Could not store traced request body: {e}")
+        self._logger.info(json.dumps(entry, ensure_ascii=False, separators=(",", ":")))
+
+    def _store_body(self, digest: str, body: bytes) -> None:
+        path = os.path.join(self.bodies_dir, digest)
+        if os.path.exists(path):
+            return
+        with self._lock:
+            os.makedirs(self.bodies_dir, exist_ok=True)
+            if self._bodies_size is None:
+                self._bodies_size = sum(entry.stat().st_size for entry in os.scandir(self.bodies_dir))
+            tmp_path = f"{path}.tmp{os.getpid()}"
+            with open(tmp_path, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+            self._bodies_size += len(body)
+            if self._bodies_size > self.bodies_max_bytes:
+                self._prune_bodies()
+
+    def _prune_bodies(self) -> None:
+        entries = sorted(os.scandir(self.bodies_dir), key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if self._bodies_size <= self.bodies_max_bytes * 0.8:
+                break
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+                self._bodies_size -= size
+            except OSError:
+                pass
+
+def load_trace(paths: Sequence[str]) -> List[Dict[str, Any]]:
+    """Read trace files (rotated ones included) into one list ordered by start time."""
+    entries = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    logger.warning(f"Skipping malformed trace line in {path}")
+    entries.sort(key=lambda entry: entry.get("ts", 0))
+    return entries
+
+# Methods that only read; anything else may modify data/ when replayed
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+@contextmanager
+def sandbox_data_dir(source: str = "data") -> Iterator[str]:
+    """Run the block in a temporary working directory holding a copy of ``source``.
+
+    The app's data paths are relative to the working directory, so an
+    in-process replay inside it writes to the copy, which is removed
+    afterwards. Traces and profiles are not copied.
+    """
+    previous = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="bc3-replay-")
+    try:
+        if os.path.isdir(source):
+            shutil.copytree(source, os.path.join(workdir, "data"),
+                            ignore=shutil.ignore_patterns("traces", "profiles"))
+        os.chdir(workdir)
+        yield workdir
+    finally:
+        os.chdir(previous)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def _iter_routes(routes: Sequence[Any]):
+    for route in routes:
+        nested = getattr(route, "routes", None)
+        if nested is None and hasattr(route, "original_router"):
+            nested = route.original_router.routes
+        if nested is not None and not hasattr(route, "path_regex"):
+            yield from _iter_routes(nested)
+        else:
+            yield route
+
+def route_template(app: Any, method: str, path: str) -> str:
+    """The route path (e.g. ``/calc_tree/{filename}``) a request matches, else the raw path."""
+    path_only = None
+    for route in _iter_routes(getattr(app, "routes", [])):
+        regex = getattr(route, "path_regex", None)
+        if regex is None or not regex.match(path):
+            continue
+        methods = getattr(route, "methods", None)
+        if not methods or method in methods:
+            return route.path
+        if path_only is None:
+            path_only = route.path
+    return path_only or path
+
+def _summary(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p90_ms": round(percentile(latencies, 90), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies), 2) if latencies else 0.0,
+    }
+
+async def replay_trace(entries: List[Dict[str, Any]], bodies_dir: str, url: Optional[str] = None,
+                       speed: float = 1.0, concurrency: int = 64, timeout: float = 300.0,
+                       allow_writes: bool = False) -> Dict[str, Any]:
+    """Send the traced requests again and report latency percentiles per route.
+
+    Without ``url`` the requests go to ``backend.main:app`` in-process (its
+    lifespan is run), so no server or network is needed. That app works on
+    ``data/`` of the working directory, so a trace with writing requests is
+    refused unless ``allow_writes`` is set, e.g. inside
+    :func:`sandbox_data_dir`. ``speed`` scales the original pacing (2 =
+    twice as fast); 0 sends as fast as ``concurrency`` allows. Requests
+    whose body was not stored are skipped.
+    """
+    try:
+        import httpx
+    except ImportError:
+        raise BC3Exception("Replaying traces needs httpx: install the `replay` extra (pip install httpx)")
+    if not url and not allow_writes:
+        writes = sum(1 for entry in entries if entry.get("method") not in READ_METHODS)
+        if writes:
+            raise ValidationError(
+                f"The trace has {writes} writing request(s), which would modify data/ in-process: "
+                f"replay against a server (--url) or on a copy of data/ (--sandbox)"
+            )
+    from ..main import app
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    routes: Dict[str, Dict[str, Any]] = {}
+    skipped = 0
+
+    def bucket(entry: Dict[str, Any]) -> Dict[str, Any]:
+        key = f"{entry['method']} {route_template(app, entry['method'], entry['path'])}"
+        return routes.setdefault(key, {"latencies": [], "captured": [], "statuses": {}, "errors": 0})
+
+    async def send(client: Any, entry: Dict[str, Any], body: Optional[bytes]) -> None:
+        stats = bucket(entry)
+        headers = {"content-type": entry["content_type"]} if entry.get("content_type") else {}
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.request(
+                    entry["method"], entry["path"] + (f"?{entry['query']}" if entry.get("query") else ""),
+                    content=body, headers=headers,
+                )
+                status = str(response.status_code)
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = (time.perf_counter() - start) * 1000
+        stats["latencies"].append(elapsed)
+        if entry.get("duration_ms") is not None:
+            stats["captured"].append(float(entry["duration_ms"]))
+        stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+        if not status.isdigit() or int(status) >= 500:
+            stats["errors"] += 1
+
+    async def run(client: Any) -> float:
+        nonlocal skipped
+        tasks = []
+        t0 = entries[0].get("ts", 0) if entries else 0
+        start = time.monotonic()
+        for entry in entries:
+            body = None
+            if entry.get("body_bytes"):
+                body_path = os.path.join(bodies_dir, entry.get("body_sha256", ""))
+                if not os.path.exists(body_path):
+                    skipped += 1
+                    continue
+                with open(body_path, "rb") as f:
+                    body = f.read()
+            if speed > 0:
+                delay = (entry.get("ts", t0) - t0) / speed - (time.monotonic() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(client, entry, body)))
+        await asyncio.gather(*tasks)
+        return time.monotonic() - start
+
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+            wall = await run(client)
+    else:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=timeout) as client:
+                wall = await run(client)
+
+    report_routes = {}
+    for key, stats in sorted(routes.items()):
+        report_routes[key] = {
+            "count": len(stats["latencies"]),
+            "errors": stats["errors"],
+            "statuses": stats["statuses"],
+            **_summary(stats["latencies"]),
+            "captured": _summary(stats["captured"]) if stats["captured"] else None,
+        }
+    sent = sum(route["count"] for route in report_routes.values())
+    return {
+        "requests": sent,
+        "skipped_missing_body": skipped,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(sent / wall, 2) if wall else None,
+        "speed": speed,
+        "target": url or "in-process backend.main:app",
+        "routes": report_routes,
+    }
+
+_default_recorder: Optional[TraceRecorder] = None
+_default_recorder_lock = threading.Lock()
+
+def get_trace_recorder() -> TraceRecorder:
+    """Return the process-wide trace recorder."""
+    global _default_recorder
+    with _default_recorder_lock:
+        if _default_recorder is None:
+            _default_recorder = TraceRecorder()
+        return _default_recorder
@@ -0,0 +1,122 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from ..logging_config import get_logger
+from .metrics import COALESCED
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows: locks are then per process only
+    fcntl = None
+
+logger = get_logger(__name__)
+
+def file_version(path: str) -> Optional[Tuple[int, int]]:
+    """(mtime in ns, size) of a file, or None when it does not exist; part of single-flight keys."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Coalesce concurrent identical calls into one computation.
+
+    The first caller of :meth:`do` for a key runs the function; callers with
+    the same key arriving while it runs wait for it and get the same result
+    object (or exception), so they must not mutate it. Nothing is cached:
+    once the call finishes, the next caller computes again. Keys should
+    include the version of the files the computation reads, so a request
+    made after a file changed never joins a computation on the old contents.
+    Callers block a thread while waiting; from async code call it through
+    ``run_in_threadpool``.
+    """
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            COALESCED.inc(operation=self.operation)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            if call.waiters:
+                logger.info(f"{self.operation}: {call.waiters} identical request(s) shared one computation")
+            call.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+class KeyedLock:
+    """One mutex per key (e.g. per record), created on demand and dropped when unused.
+
+    With ``lock_dir`` the holder also takes an exclusive ``flock`` on
+    ``<lock_dir>/<key>.lock``, so other processes (bulk categorization
+    workers, other server workers) using the same directory are excluded too.
+    """
+
+    def __init__(self, lock_dir: Optional[str] = None):
+        self.lock_dir = lock_dir
+        self._locks: Dict[Hashable, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _file_lock(self, key: Hashable) -> Iterator[None]:
+        if self.lock_dir is None or fcntl is None:
+            yield
+            return
+        os.makedirs(self.lock_dir, exist_ok=True)
+        with open(os.path.join(self.lock_dir, f"{os.path.basename(str(key))}.lock"), "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    @contextmanager
+    def hold(self, key: Hashable) -> Iterator[None]:
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0], self._file_lock(key):
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
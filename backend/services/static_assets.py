@@ -0,0 +1,174 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from ..config import FRONTEND_DIR, STATIC_GZIP_MIN_BYTES, STATIC_ASSETS_RELOAD
+from ..logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Hex digits of the content hash used in ETags and hashed file names
+HASH_LENGTH = 12
+
+_COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# src/href attributes of HTML pages pointing at a frontend file, e.g.
+# src="/static/tree-utils.js" or src="acr_copilot.png"
+_REFERENCE = re.compile(r'\b(?P<attr>src|href)="(?P<prefix>/static/)?(?P<name>[^"?#:]+)"')
+_HASHED_NAME = re.compile(rf"^(?P<stem>.+)\.[0-9a-f]{{{HASH_LENGTH}}}(?P<ext>\.[^./]+)$")
+
+@dataclass(frozen=True)
+class StaticAsset:
+    """One frontend file held in memory."""
+    name: str
+    body: bytes
+    gzip_body: Optional[bytes]
+    digest: str
+    content_type: str
+
+    @property
+    def hashed_name(self) -> str:
+        stem, ext = os.path.splitext(self.name)
+        return f"{stem}.{self.digest}{ext}"
+
+    @property
+    def url(self) -> str:
+        return f"/static/{self.hashed_name}"
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.digest}"'
+
+    @property
+    def gzip_etag(self) -> str:
+        return f'"{self.digest}-gz"'
+
+class StaticAssetTable:
+    """Frontend files loaded once, with gzip variants, ETags and hashed URLs.
+
+    Every file under ``root`` is read at build time. Text files get a
+    precompressed gzip variant when that is smaller, and every file gets a
+    content hash used for its ETag and its hashed name
+    (``tree-utils.<hash>.js``). HTML pages are rewritten so their ``src`` and
+    ``href`` references to frontend files use the hashed URLs, which can be
+    cached forever: a deploy that changes a file changes its URL.
+    """
+
+    def __init__(self, root: str = FRONTEND_DIR, gzip_min_bytes: int = STATIC_GZIP_MIN_BYTES,
+                 reload: bool = STATIC_ASSETS_RELOAD):
+        self.root = root
+        self.gzip_min_bytes = gzip_min_bytes
+        self.reload = reload
+        self._assets: Dict[str, StaticAsset] = {}
+        self._hashed: Dict[str, StaticAsset] = {}
+        self._signature: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def build(self) -> None:
+        files: Dict[str, bytes] = {}
+        signature: Dict[str, Tuple[float, int]] = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    files[name] = f.read()
+                stat = os.stat(path)
+                signature[name] = (stat.st_mtime, stat.st_size)
+
+        assets: Dict[str, StaticAsset] = {}
+        # Pages last: they reference the hashed names of the other files
+        for name in sorted(files, key=lambda n: n.endswith(".html")):
+            body = files[name]
+            if name.endswith(".html"):
+                body = self._rewrite_html(body, assets)
+            assets[name] = self._make_asset(name, body)
+
+        with self._lock:
+            self._assets = assets
+            self._hashed = {asset.hashed_name: asset for asset in assets.values()}
+            self._signature = signature
+        compressed = sum(1 for asset in assets.values() if asset.gzip_body is not None)
+        logger.info(
+            f"Loaded {len(assets)} frontend assets ({sum(len(a.body) for a in assets.values()) // 1024} KiB, "
+            f"{compressed} gzipped)"
+        )
+
+    def _make_asset(self, name: str, body: bytes) -> StaticAsset:
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type == "application/javascript":
+            content_type += "; charset=utf-8"
+        gzip_body = None
+        if content_type.startswith(_COMPRESSIBLE) and len(body) >= self.gzip_min_bytes:
+            # mtime=0 keeps the compressed bytes identical across builds
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                gzip_body = compressed
+        return StaticAsset(
+            name=name,
+            body=body,
+            gzip_body=gzip_body,
+            digest=hashlib.sha256(body).hexdigest()[:HASH_LENGTH],
+            content_type=content_type,
+        )
+
+    @staticmethod
+    def _rewrite_html(body: bytes, assets: Dict[str, StaticAsset]) -> bytes:
+        def replace(match: "re.Match[str]") -> str:
+            asset = assets.get(match.group("name"))
+            # Pages keep their clean URLs; only the files they load are hashed
+            if asset is None or asset.name.endswith(".html"):
+                return match.group(0)
+            return f'{match.group("attr")}="{asset.url}"'
+
+        try:
+            text = body.decode("utf-8")
+        except UnicodeDecodeError:
+            return body
+        return _REFERENCE.sub(replace, text).encode("utf-8")
+
+    def _changed(self) -> bool:
+        for name, signature in self._signature.items():
+            try:
+                stat = os.stat(os.path.join(self.root, name))
+            except OSError:
+                return True
+            if (stat.st_mtime, stat.st_size) != signature:
+                return True
+        return False
+
+    def lookup(self, name: str) -> Tuple[Optional[StaticAsset], bool]:
+        """Return (asset, immutable) for a plain or hashed file name.
+
+        ``immutable`` is True only for a hashed name matching the current
+        content. A hashed name from a previous deploy falls back to the
+        current file, which must then not be cached forever.
+        """
+        if self.reload and self._changed():
+            self.build()
+        asset = self._hashed.get(name)
+        if asset is not None:
+            return asset, True
+        asset = self._assets.get(name)
+        if asset is None:
+            match = _HASHED_NAME.match(name)
+            if match:
+                asset = self._assets.get(match.group("stem") + match.group("ext"))
+        return asset, False
+
+_default_table: Optional[StaticAssetTable] = None
+_default_table_lock = threading.Lock()
+
+def get_static_assets() -> StaticAssetTable:
+    """Return the process-wide frontend asset table, building it on first use."""
+    global _default_table
+    with _default_table_lock:
+        if _default_table is None:
+            table = StaticAssetTable()
+            table.build()
+            _default_table = table
+        return _default_table
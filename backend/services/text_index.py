@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+from ..config import CATEGORIZED_DIR, TEXT_INDEX_PATH, LSH_NUM_PERM, LSH_BANDS
+from ..logging_config import get_logger
+from .prediction_cache import normalize_text
+
+logger = get_logger(__name__)
+
+_MERSENNE_PRIME = (1 << 31) - 1
+SHINGLE_SIZE = 5
+
+def normalize_summary(text: str) -> str:
+    """Normalized PARTIDA text used for exact matching."""
+    return normalize_text(str(text or ""), lowercase=True)
+
+def shingles(norm_text: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """Character shingles of a normalized text (the text itself if shorter)."""
+    if len(norm_text) <= size:
+        return {norm_text} if norm_text else set()
+    return {norm_text[i:i + size] for i in range(len(norm_text) - size + 1)}
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class MinHasher:
+    """MinHash signatures with universal hashing, banded for LSH.
+
+    With ``bands`` bands of ``num_perm / bands`` rows, two texts with
+    Jaccard similarity s share a bucket with probability
+    1 - (1 - s^rows)^bands.
+    """
+
+    def __init__(self, num_perm: int = LSH_NUM_PERM, bands: int = LSH_BANDS, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+
+    def signature(self, items: Set[str]) -> np.ndarray:
+        if not items:
+            return np.full(self.num_perm, _MERSENNE_PRIME, dtype=np.uint64)
+        values = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in items), dtype=np.uint64, count=len(items))
+        hashed = (np.outer(values, self._a) + self._b) % _MERSENNE_PRIME
+        return hashed.min(axis=0)
+
+    def band_keys(self, signature: np.ndarray) -> List[str]:
+        """One bucket key per band."""
+        return [
+            hashlib.blake2b(signature[i * self.rows:(i + 1) * self.rows].tobytes(), digest_size=8).hexdigest()
+            for i in range(self.bands)
+        ]
+
+class TextIndex:
+    """Inverted index from normalized PARTIDA text to its occurrences.
+
+    ``texts`` maps the hash of each node's normalized summary to
+    ``(record code, position, node code)``; ``lsh`` holds MinHash band
+    buckets for near-duplicate candidates. A record's rows are replaced
+    whenever its categorized JSON is written, so lookups never scan files.
+    """
+
+    def __init__(self, db_path: str = TEXT_INDEX_PATH, hasher: Optional[MinHasher] = None):
+        self.db_path = db_path
+        self.hasher = hasher or MinHasher()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS texts ("
+                " code TEXT NOT NULL, position INTEGER NOT NULL, node_code TEXT, text_hash TEXT NOT NULL,"
+                " norm_text TEXT NOT NULL, summary TEXT, predicted_label TEXT, user_label TEXT,"
+                " PRIMARY KEY (code, position));"
+                "CREATE INDEX IF NOT EXISTS texts_hash ON texts (text_hash);"
+                "CREATE TABLE IF NOT EXISTS lsh ("
+                " band INTEGER NOT NULL, bucket TEXT NOT NULL, code TEXT NOT NULL, position INTEGER NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS lsh_bucket ON lsh (band, bucket);"
+                "CREATE INDEX IF NOT EXISTS lsh_record ON lsh (code);"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def text_hash(norm_text: str) -> str:
+        return hashlib.sha1(norm_text.encode("utf-8")).hexdigest()
+
+    def update_record(self, code: str, data: Any) -> int:
+        """Replace the indexed texts of one record; returns the row count."""
+        from .ml_service import iter_partida_nodes
+
+        texts, buckets = [], []
+        band_cache: Dict[str, List[str]] = {}
+        for position, node in enumerate(iter_partida_nodes(data)):
+            norm = normalize_summary(node.get("summary", ""))
+            if not norm:
+                continue
+            pred = node.get("_prediction") if isinstance(node.get("_prediction"), dict) else {}
+            text_hash = self.text_hash(norm)
+            texts.append((
+                code, position, node.get("code"), text_hash, norm, node.get("summary"),
+                pred.get("predicted_label"), pred.get("user_label") or None,
+            ))
+            if text_hash not in band_cache:
+                band_cache[text_hash] = self.hasher.band_keys(self.hasher.signature(shingles(norm)))
+            buckets.extend((band, key, code, position) for band, key in enumerate(band_cache[text_hash]))
+
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM texts WHERE code = ?", (code,))
+                conn.execute("DELETE FROM lsh WHERE code = ?", (code,))
+                conn.executemany("INSERT INTO texts VALUES (?, ?, ?, ?, ?, ?, ?, ?)", texts)
+                conn.executemany("INSERT INTO lsh VALUES (?, ?, ?, ?)", buckets)
+        return len(texts)
+
+    def rebuild(self, source_dir: str = CATEGORIZED_DIR) -> Dict[str, int]:
+        """Re-index every categorized file from scratch."""
+        files = sorted(name for name in os.listdir(source_dir) if name.endswith(".json")) \
+            if os.path.isdir(source_dir) else []
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM texts")
+                conn.execute("DELETE FROM lsh")
+        nodes = 0
+        for name in files:
+            try:
+                with open(os.path.join(source_dir, name), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping {name} in text index: {e}")
+                continue
+            nodes += self.update_record(os.path.splitext(name)[0], data)
+        logger.info(f"Text index rebuilt with {nodes} nodes from {len(files)} files")
+        return {"files": len(files), "nodes": nodes}
+
+    @staticmethod
+    def _match(row: tuple, similarity: float) -> Dict[str, Any]:
+        return {
+            "code": row[0], "position": row[1], "node_code": row[2], "summary": row[3],
+            "predicted_label": row[4], "user_label": row[5], "similarity": round(similarity, 4),
+        }
+
+    def exact_matches(self, text: str) -> List[Dict[str, Any]]:
+        """Every node whose normalized summary equals the normalized text."""
+        norm = normalize_summary(text)
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT code, position, node_code, summary, predicted_label, user_label FROM texts "
+                "WHERE text_hash = ? ORDER BY code, position",
+                (self.text_hash(norm),),
+            ).fetchall()
+        return [self._match(row, 1.0) for row in rows]
+
+    def similar(self, text: str, threshold: float = 0.8, limit: int = 100) -> List[Dict[str, Any]]:
+        """Near-duplicate nodes: LSH candidates verified by shingle Jaccard >= threshold."""
+        norm = normalize_summary(text)
+        query_shingles = shingles(norm)
+        keys = self.hasher.band_keys(self.hasher.signature(query_shingles))
+        condition = " OR ".join("(l.band = ? AND l.bucket = ?)" for _ in keys)
+        params = [value for band, key in enumerate(keys) for value in (band, key)]
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT DISTINCT t.code, t.position, t.node_code, t.summary, t.predicted_label, t.user_label, "
+                f"t.norm_text FROM lsh l JOIN texts t ON t.code = l.code AND t.position = l.position WHERE {condition}",
+                params,
+            ).fetchall()
+
+        scores: Dict[str, float] = {}
+        matches = []
+        for row in rows:
+            candidate = row[6]
+            if candidate not in scores:
+                scores[candidate] = 1.0 if candidate == norm else jaccard(query_shingles, shingles(candidate))
+            if scores[candidate] >= threshold:
+                matches.append(self._match(row[:6], scores[candidate]))
+        matches.sort(key=lambda m: (-m["similarity"], m["code"], m["position"]))
+        return matches[:limit]
+
+_default_index: Optional[TextIndex] = None
+_default_index_lock = threading.Lock()
+
+def get_text_index() -> TextIndex:
+    """Return the process-wide text index."""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = TextIndex()
+        return _default_index
@@ -0,0 +1,230 @@
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ..config import CATEGORIZED_DIR, TRAINING_DIR, ML_TRAIN_MIN_PROBA
+from ..logging_config import get_logger
+from .ml_service import MLService, iter_partida_nodes
+from .prediction_cache import normalize_text
+
+logger = get_logger(__name__)
+
+TRAINING_FILE = "train.ndjson.gz"
+MANIFEST_FILE = "manifest.json"
+SHARDS_DIR = "shards"
+
+def text_hash(input_text: str) -> str:
+    """Deduplication key of a model input text."""
+    return hashlib.sha1(normalize_text(input_text).encode("utf-8")).hexdigest()
+
+def extract_training_rows(data: Any, min_proba: float = ML_TRAIN_MIN_PROBA) -> Iterator[Dict[str, Any]]:
+    """Yield labelled rows from a categorized JSON tree.
+
+    A node's ``user_label`` wins; otherwise its ``predicted_label`` is used
+    when ``predicted_proba`` reaches ``min_proba``.
+    """
+    for node in iter_partida_nodes(data):
+        summary = str(node.get("summary", ""))
+        pred = node.get("_prediction")
+        if not summary or not isinstance(pred, dict):
+            continue
+        if pred.get("user_label"):
+            label, source = pred["user_label"], "user"
+        elif pred.get("predicted_label") is not None and (pred.get("predicted_proba") or 0.0) >= min_proba:
+            label, source = pred["predicted_label"], "model"
+        else:
+            continue
+        descriptive = node.get("descriptive_text")
+        input_text = MLService.build_input_text(summary, str(descriptive) if descriptive else None)
+        yield {
+            "hash": text_hash(input_text),
+            "text": input_text,
+            "label": label,
+            "source": source,
+            "proba": pred.get("predicted_proba"),
+            "node_code": node.get("code"),
+        }
+
+def _write_ndjson_gz(path: str, rows: Iterator[Dict[str, Any]]) -> int:
+    """Write rows atomically as gzip NDJSON and return how many were written."""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    count = 0
+    with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=5) as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+def iter_training_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """Read rows back from a gzip NDJSON training file."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def _export_shard(source_path: str, shard_path: str, min_proba: float) -> int:
+    """Process-pool entry point: extract one categorized file into its shard."""
+    with open(source_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    code = os.path.splitext(os.path.basename(source_path))[0]
+
+    def rows():
+        for row in extract_training_rows(data, min_proba):
+            row["code"] = code
+            yield row
+
+    return _write_ndjson_gz(shard_path, rows())
+
+def _preferred(current: Dict[str, Any], candidate: Dict[str, Any]) -> bool:
+    """Whether ``candidate`` should replace ``current`` for the same text."""
+    if (candidate["source"] == "user") != (current["source"] == "user"):
+        return candidate["source"] == "user"
+    return (candidate.get("proba") or 0.0) > (current.get("proba") or 0.0)
+
+class TrainingExporter:
+    """Exports labelled PARTIDAs of all categorized files for retraining.
+
+    Every categorized file is extracted to its own gzip NDJSON shard, which
+    is only rebuilt when the file's mtime or size changed since the previous
+    export (tracked in ``manifest.json``). The shards are then merged into
+    ``train.ndjson.gz``, deduplicated by normalized text hash; user labels
+    take precedence over model predictions.
+    """
+
+    def __init__(self, source_dir: str = CATEGORIZED_DIR, output_dir: str = TRAINING_DIR,
+                 min_proba: float = ML_TRAIN_MIN_PROBA):
+        self.source_dir = source_dir
+        self.output_dir = output_dir
+        self.min_proba = min_proba
+
+    @property
+    def training_path(self) -> str:
+        return os.path.join(self.output_dir, TRAINING_FILE)
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.output_dir, MANIFEST_FILE)
+
+    def load_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _source_files(self) -> Dict[str, Tuple[float, int]]:
+        files = {}
+        if os.path.isdir(self.source_dir):
+            for entry in os.scandir(self.source_dir):
+                if entry.is_file() and entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_mtime, stat.st_size)
+        return files
+
+    def export(self, workers: int = 1, full: bool = False) -> Dict[str, Any]:
+        """Bring shards up to date and rebuild the training file.
+
+        ``full`` re-extracts every file, e.g. after changing ``min_proba``.
+        Returns the new manifest.
+        """
+        start = time.perf_counter()
+        shards_dir = os.path.join(self.output_dir, SHARDS_DIR)
+        os.makedirs(shards_dir, exist_ok=True)
+
+        previous = self.load_manifest()
+        if previous.get("min_proba") != self.min_proba:
+            full = True
+        known = {} if full else previous.get("files", {})
+        files = self._source_files()
+
+        changed = [
+            name for name, (mtime, size) in files.items()
+            if name not in known or known[name]["mtime"] != mtime or known[name]["size"] != size
+            or not os.path.exists(os.path.join(shards_dir, f"{name}.ndjson.gz"))
+        ]
+        removed = [name for name in previous.get("files", {}) if name not in files]
+        for name in removed:
+            try:
+                os.remove(os.path.join(shards_dir, f"{name}.ndjson.gz"))
+            except OSError:
+                pass
+
+        manifest_files = {name: known[name] for name in files if name in known and name not in changed}
+        jobs = [
+            (name, os.path.join(self.source_dir, name), os.path.join(shards_dir, f"{name}.ndjson.gz"))
+            for name in sorted(changed)
+        ]
+        failed: List[str] = []
+
+        def record(name: str, rows: int) -> None:
+            mtime, size = files[name]
+            manifest_files[name] = {"mtime": mtime, "size": size, "rows": rows}
+
+        if workers > 1 and len(jobs) > 1:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = [(name, pool.submit(_export_shard, src, dst, self.min_proba)) for name, src, dst in jobs]
+                for name, future in futures:
+                    try:
+                        record(name, future.result())
+                    except Exception as e:
+                        logger.warning(f"Skipping {name} in training export: {e}")
+                        failed.append(name)
+        else:
+            for name, src, dst in jobs:
+                try:
+                    record(name, _export_shard(src, dst, self.min_proba))
+                except Exception as e:
+                    logger.warning(f"Skipping {name} in training export: {e}")
+                    failed.append(name)
+
+        rows, duplicates, labels = self._merge(shards_dir, sorted(manifest_files))
+        manifest = {
+            "exported_at": datetime.utcnow().isoformat() + "Z",
+            "min_proba": self.min_proba,
+            "training_file": self.training_path,
+            "rows": rows,
+            "duplicates": duplicates,
+            "labels": labels,
+            "files_total": len(files),
+            "files_exported": len(changed) - len(failed),
+            "files_removed": len(removed),
+            "files_failed": failed,
+            "seconds": round(time.perf_counter() - start, 3),
+            "files": manifest_files,
+        }
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+        logger.info(
+            f"Training export: {rows} rows ({duplicates} duplicates dropped) from {len(files)} files, "
+            f"{manifest['files_exported']} re-extracted in {manifest['seconds']}s"
+        )
+        return manifest
+
+    def _merge(self, shards_dir: str, names: List[str]) -> Tuple[int, int, Dict[str, int]]:
+        """Merge shards into the training file, keeping one row per text hash."""
+        best: Dict[str, Dict[str, Any]] = {}
+        total = 0
+        for name in names:
+            for row in iter_training_rows(os.path.join(shards_dir, f"{name}.ndjson.gz")):
+                total += 1
+                current = best.get(row["hash"])
+                if current is None or _preferred(current, row):
+                    best[row["hash"]] = row
+
+        labels: Dict[str, int] = {}
+        for row in best.values():
+            labels[row["label"]] = labels.get(row["label"], 0) + 1
+        rows = _write_ndjson_gz(self.training_path, iter(best.values()))
+        return rows, total - rows, dict(sorted(labels.items()))
@@ -0,0 +1,177 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..config import CATEGORIZED_DIR, UNCERTAINTY_INDEX_PATH
+from ..logging_config import get_logger
+
+logger = get_logger(__name__)
+
+SORT_COLUMNS = {
+    "margin": "margin ASC, entropy DESC",
+    "entropy": "entropy DESC, margin ASC",
+}
+
+def _iter_partidas(data: Any) -> Iterable[Dict[str, Any]]:
+    # Imported lazily: ml_service imports this module
+    from .ml_service import iter_partida_nodes
+    return iter_partida_nodes(data)
+
+def uncertainty_scores(probas: List[float]) -> Tuple[float, float]:
+    """Return (margin, entropy) of a top-k probability list.
+
+    The margin is top-1 minus top-2 probability. The entropy (in nats) is
+    computed over the top-k probabilities plus the remaining mass as one
+    extra outcome, which is all a stored top-k prediction allows.
+    """
+    probas = sorted((max(0.0, float(p)) for p in probas), reverse=True)
+    if not probas:
+        return 1.0, 0.0
+    margin = probas[0] - (probas[1] if len(probas) > 1 else 0.0)
+    rest = max(0.0, 1.0 - sum(probas))
+    entropy = -sum(p * math.log(p) for p in probas + [rest] if p > 0)
+    return round(margin, 6), round(entropy, 6)
+
+class UncertaintyIndex:
+    """SQLite index of every PARTIDA prediction, ordered by model confidence.
+
+    Rows are replaced per record whenever a categorized file is written
+    (categorization or labelling), so finding the least confident unlabelled
+    nodes across all projects is an indexed query instead of a corpus scan.
+    """
+
+    def __init__(self, db_path: str = UNCERTAINTY_INDEX_PATH):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS nodes ("
+                " code TEXT NOT NULL, position INTEGER NOT NULL, node_code TEXT, summary TEXT,"
+                " predicted_label TEXT, predicted_proba REAL, topk_labels TEXT, topk_probas TEXT,"
+                " margin REAL NOT NULL, entropy REAL NOT NULL, labelled INTEGER NOT NULL,"
+                " user_label TEXT, model_version TEXT, PRIMARY KEY (code, position));"
+                "CREATE INDEX IF NOT EXISTS nodes_margin ON nodes (labelled, margin, entropy DESC);"
+                "CREATE INDEX IF NOT EXISTS nodes_entropy ON nodes (labelled, entropy DESC, margin);"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _rows(code: str, data: Any) -> List[tuple]:
+        rows = []
+        for position, node in enumerate(_iter_partidas(data)):
+            pred = node.get("_prediction")
+            if not isinstance(pred, dict) or pred.get("predicted_label") is None:
+                continue
+            probas = pred.get("topk_probas") or [pred.get("predicted_proba") or 0.0]
+            margin, entropy = uncertainty_scores(probas)
+            user_label = pred.get("user_label") or None
+            rows.append((
+                code, position, node.get("code"), node.get("summary"),
+                pred.get("predicted_label"), pred.get("predicted_proba"),
+                json.dumps(pred.get("topk_labels") or [], ensure_ascii=False), json.dumps(probas),
+                margin, entropy, 1 if user_label else 0, user_label, pred.get("model_version"),
+            ))
+        return rows
+
+    def update_record(self, code: str, data: Any) -> int:
+        """Replace the indexed predictions of one record; returns the row count."""
+        rows = self._rows(code, data)
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM nodes WHERE code = ?", (code,))
+                conn.executemany(
+                    "INSERT INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+                )
+        return len(rows)
+
+    def remove_record(self, code: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM nodes WHERE code = ?", (code,))
+
+    def rebuild(self, source_dir: str = CATEGORIZED_DIR) -> Dict[str, int]:
+        """Re-index every categorized file from scratch."""
+        files = sorted(name for name in os.listdir(source_dir) if name.endswith(".json")) \
+            if os.path.isdir(source_dir) else []
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM nodes")
+        nodes = 0
+        for name in files:
+            try:
+                with open(os.path.join(source_dir, name), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping {name} in uncertainty index: {e}")
+                continue
+            nodes += self.update_record(os.path.splitext(name)[0], data)
+        logger.info(f"Uncertainty index rebuilt with {nodes} nodes from {len(files)} files")
+        return {"files": len(files), "nodes": nodes}
+
+    def query(self, limit: int = 50, offset: int = 0, sort: str = "margin",
+              include_labelled: bool = False, label: Optional[str] = None,
+              code: Optional[str] = None, with_total: bool = True) -> Dict[str, Any]:
+        """Return a page of the least confident predictions and the total count.
+
+        Counting scans every matching row, so pagers pass ``with_total=False``
+        after the first page; ``total`` is then None.
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Invalid sort '{sort}'. Allowed: {sorted(SORT_COLUMNS)}")
+        clauses, params = [], []
+        if not include_labelled:
+            clauses.append("labelled = 0")
+        if label:
+            clauses.append("predicted_label = ?")
+            params.append(label)
+        if code:
+            clauses.append("code = ?")
+            params.append(code)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._lock:
+            conn = self._connect()
+            total = conn.execute(f"SELECT COUNT(*) FROM nodes {where}", params).fetchone()[0] if with_total else None
+            rows = conn.execute(
+                "SELECT code, position, node_code, summary, predicted_label, predicted_proba, "
+                "topk_labels, topk_probas, margin, entropy, user_label, model_version "
+                f"FROM nodes {where} ORDER BY {SORT_COLUMNS[sort]}, code, position LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+
+        items = [
+            {
+                "code": row[0], "position": row[1], "node_code": row[2], "summary": row[3],
+                "predicted_label": row[4], "predicted_proba": row[5],
+                "topk_labels": json.loads(row[6]), "topk_probas": json.loads(row[7]),
+                "margin": row[8], "entropy": row[9], "user_label": row[10], "model_version": row[11],
+            }
+            for row in rows
+        ]
+        return {"items": items, "total": total, "limit": limit, "offset": offset, "sort": sort}
+
+_default_index: Optional[UncertaintyIndex] = None
+_default_index_lock = threading.Lock()
+
+def get_uncertainty_index() -> UncertaintyIndex:
+    """Return the process-wide uncertainty index."""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = UncertaintyIndex()
+        return _default_index
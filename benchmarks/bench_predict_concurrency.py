@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Measure /predict latency under concurrent clients.
+
+Runs against the in-process ASGI app (model loaded through the app lifespan)
+or a live server, and prints p50/p99 latency and throughput for each
+concurrency level. Texts are unique per request so the prediction cache does
+not hide model time.
+
+Examples:
+  ML_CACHE_PATH= python benchmarks/bench_predict_concurrency.py
+  python benchmarks/bench_predict_concurrency.py --url http://localhost:8005 --clients 1 10 100
+  # Compare with micro-batching disabled
+  ML_MICROBATCH_MAX_ITEMS=1 python benchmarks/bench_predict_concurrency.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+WORDS = (
+    "hormigón armado zapata encofrado ladrillo tabique mortero enfoscado puerta madera "
+    "ventana aluminio tubería cobre cable eléctrica pintura plástica esmalte acero "
+    "excavación relleno zanja solera forjado viga pilar cubierta teja impermeabilización"
+).split()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+@asynccontextmanager
+async def make_client(url: Optional[str]):
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+            yield client
+        return
+
+    from backend.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            yield client
+
+
+async def run_level(client: httpx.AsyncClient, clients: int, requests_per_client: int, rng: random.Random) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    counter = 0
+
+    async def one_client():
+        nonlocal errors, counter
+        for _ in range(requests_per_client):
+            counter += 1
+            text = " ".join(rng.choices(WORDS, k=6)) + f" ref {counter}"
+            start = time.perf_counter()
+            response = await client.post("/predict", json={"text": text, "topk": 3})
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(statistics.fmean(latencies), 2) if latencies else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+async def main_async(args) -> List[Dict]:
+    rng = random.Random(args.seed)
+    results = []
+    async with make_client(args.url) as client:
+        # Warm-up request so connection/model set-up is not measured
+        await client.post("/predict", json={"text": "warm up"})
+        for clients in args.clients:
+            per_client = max(1, args.requests // clients)
+            results.append(await run_level(client, clients, per_client, rng))
+        if args.url is None:
+            status = (await client.get("/ml/status")).json()
+            print(f"executor: {json.dumps(status.get('executor'))}", file=sys.stderr)
+    return results
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark /predict under concurrent clients")
+    ap.add_argument("--url", default=None, help="Live server base URL (default: in-process app)")
+    ap.add_argument("--clients", type=int, nargs="+", default=[1, 10, 100])
+    ap.add_argument("--requests", type=int, default=1000, help="Total requests per concurrency level")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = ap.parse_args()
+
+    results = asyncio.run(main_async(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'clients':>8} {'requests':>9} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9} {'errors':>7}")
+        for r in results:
+            print(f"{r['clients']:>8} {r['requests']:>9} {r['p50_ms']:>9} {r['p99_ms']:>9} "
+                  f"{r['throughput_rps']:>9} {r['errors']:>7}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Check that ``import backend.main`` stays within a startup time budget.
+
+Imports the app in fresh interpreters (``--repeat`` times, after one warm-up
+run that fills the bytecode cache) and compares the median with
+``--budget`` seconds. It also fails when a module that should only be
+imported on first use (numpy, joblib, sklearn, the converter and the
+calculator) is loaded at import time. The slowest imports of the last run
+are listed from ``python -X importtime`` to show what to make lazy.
+
+Exits with 1 when the budget is exceeded or a lazy module was imported, so
+it can run in CI.
+
+Examples:
+  python benchmarks/check_import_time.py
+  python benchmarks/check_import_time.py --budget 0.8 --repeat 10 --top 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Heavy modules that must not be imported by ``import backend.main``
+LAZY_MODULES = ("numpy", "scipy", "joblib", "sklearn", "tools.bc3_converter", "tools.bc3_pcalc")
+
+PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import backend.main
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def run_probe(workdir: str, importtime: bool = False) -> Tuple[Dict, str]:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", PROBE]
+    proc = subprocess.run(cmd, cwd=workdir, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import backend.main failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+def slowest_imports(importtime_log: str, top: int) -> List[Tuple[int, str]]:
+    """(cumulative microseconds, module) of the slowest top-level imports."""
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        if cumulative.strip().isdigit():
+            rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fail when `import backend.main` exceeds a time budget.")
+    parser.add_argument("--budget", type=float, default=1.5, help="Maximum median import time in seconds")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+    args = parser.parse_args()
+
+    # The app creates data/ directories relative to the working directory
+    with tempfile.TemporaryDirectory(prefix="bc3-import-") as workdir:
+        run_probe(workdir)
+        runs = [run_probe(workdir)[0] for _ in range(max(1, args.repeat))]
+        _, importtime_log = run_probe(workdir, importtime=True)
+
+    times = [run["seconds"] for run in runs]
+    median = statistics.median(times)
+    loaded = sorted({module for run in runs for module in run["loaded"]})
+
+    print(f"import backend.main: median {median:.3f}s, min {min(times):.3f}s, max {max(times):.3f}s "
+          f"over {len(times)} runs (budget {args.budget:.3f}s)")
+    print("Slowest imports (cumulative):")
+    for micros, name in slowest_imports(importtime_log, args.top):
+        print(f"  {micros / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if median > args.budget:
+        print(f"FAIL: median import time {median:.3f}s exceeds the {args.budget:.3f}s budget")
+        failed = True
+    if loaded:
+        print(f"FAIL: imported at startup but should be lazy: {', '.join(loaded)}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark suite: converter, calculator, services, ML and HTTP API.
+
+Inputs are synthetic budgets from tools/bc3_generator.py (fixed seed), in
+three sizes. Each benchmark reports the median/min/max wall time of
+``--repeat`` runs, the peak traced Python memory of one extra run under
+tracemalloc and the size of its output, as JSON. ML benchmarks use a small
+TF-IDF + logistic regression stand-in model trained on the generator's
+vocabulary, with the prediction cache disabled, so they measure the
+pipeline rather than a production model.
+
+Everything runs in a scratch working directory (the backend resolves
+data/ relative to the current directory), so the repo's data is untouched.
+
+Examples:
+  python benchmarks/run.py --output bench.json
+  python benchmarks/run.py --sizes small medium huge --only parse compose
+  python benchmarks/run.py --baseline bench.json --threshold 0.15   # exit 1 on regressions
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from tools.bc3_generator import BC3Generator, MATERIALS, ACTIONS, ELEMENTS, SPECS  # noqa: E402
+
+# Generator settings per input size
+SIZES = {
+    "small": {"concepts": 2_000, "depth": 1, "fanout": 8},
+    "medium": {"concepts": 20_000, "depth": 2, "fanout": 8},
+    "huge": {"concepts": 200_000, "depth": 3, "fanout": 8},
+}
+DEFAULT_REPEAT = {"small": 5, "medium": 3, "huge": 1}
+SEED = 1
+
+# name -> (prepare(ctx, size) -> zero-argument callable, output size function, needs the ML model)
+BENCHMARKS: Dict[str, Tuple[Callable, Callable, bool]] = {}
+
+
+def benchmark(name: str, size_of: Optional[Callable[[Any], Dict[str, int]]] = None, ml: bool = False):
+    """Register ``prepare(ctx, size)``; it runs untimed and returns the callable to time."""
+    def register(prepare):
+        BENCHMARKS[name] = (prepare, size_of or json_size, ml)
+        return prepare
+    return register
+
+
+def json_size(result: Any) -> Dict[str, int]:
+    return {"output_bytes": len(json.dumps(result, ensure_ascii=False).encode("utf-8"))}
+
+
+def item_count(result: Any) -> Dict[str, int]:
+    return {"items": len(result)}
+
+
+def response_size(response: Any) -> Dict[str, int]:
+    if response.status_code >= 400:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+    return {"output_bytes": len(response.content)}
+
+
+class Context:
+    """Scratch directory with generated inputs, the stand-in model and an API client."""
+
+    def __init__(self, workdir: str):
+        self.workdir = workdir
+        self.inputs: Dict[str, Dict[str, Any]] = {}
+        self.client = None
+        self._client_cm = None
+
+    def bc3_path(self, size: str) -> str:
+        path = os.path.join(self.workdir, f"bench_{size}.bc3")
+        if not os.path.exists(path):
+            with open(path, "w", encoding="iso-8859-1", newline="") as f:
+                BC3Generator(seed=SEED, **SIZES[size]).generate(f)
+        return path
+
+    def record(self, size: str) -> Dict[str, Any]:
+        """Upload the size's budget once through the API; returns the registry code and texts."""
+        if size not in self.inputs:
+            with open(self.bc3_path(size), "rb") as f:
+                response = self.api().post(
+                    "/uploadfile/",
+                    files={"file": (f"bench_{size}.bc3", f, "application/octet-stream")},
+                    data={"project_name": f"bench {size}", "localization": "MADRID",
+                          "email": "bench@example.com", "year": "2024"},
+                )
+            response_size(response)
+            code = response.json()["code"]
+            with open(os.path.join("data/processed", f"{code}.json"), "r", encoding="utf-8") as f:
+                tree = json.load(f)
+            from backend.services.ml_service import iter_partida_nodes
+            texts = [node.get("summary", "") for node in iter_partida_nodes(tree)]
+            self.inputs[size] = {"code": code, "texts": texts}
+        return self.inputs[size]
+
+    def load_tree(self, size: str) -> Any:
+        with open(os.path.join("data/processed", f"{self.record(size)['code']}.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def api(self):
+        if self.client is None:
+            from fastapi.testclient import TestClient
+            from backend.main import app
+
+            self._client_cm = TestClient(app)
+            self.client = self._client_cm.__enter__()
+            logging.getLogger().setLevel(logging.WARNING)
+        return self.client
+
+    def close(self) -> None:
+        if self._client_cm is not None:
+            self._client_cm.__exit__(None, None, None)
+
+
+def train_stand_in_model(path: str) -> bool:
+    """Train a small TF-IDF + one-vs-rest logistic regression on generator-like texts."""
+    try:
+        import joblib
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.multiclass import OneVsRestClassifier
+        from sklearn.pipeline import Pipeline
+    except ImportError:
+        return False
+
+    rng = random.Random(SEED)
+    texts, labels = [], []
+    for _ in range(1200):
+        index = rng.randrange(len(MATERIALS))
+        texts.append(f"{rng.choice(ACTIONS)} {rng.choice(ELEMENTS)} de {MATERIALS[index]} {rng.choice(SPECS)}")
+        labels.append(f"CLASS_{index % 6}")
+    pipe = Pipeline([
+        ("tfidf", TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True)),
+        ("clf", OneVsRestClassifier(LogisticRegression(max_iter=1000))),
+    ])
+    pipe.fit(texts, labels)
+    joblib.dump(pipe, path)
+    return True
+
+
+# Converter
+
+@benchmark("parse", size_of=item_count)
+def bench_parse(ctx: Context, size: str):
+    from tools.bc3_converter import BC3Parser
+    path = ctx.bc3_path(size)
+    return lambda: BC3Parser().parse(path)
+
+
+@benchmark("compose")
+def bench_compose(ctx: Context, size: str):
+    from tools.bc3_converter import BC3Parser, BC3Composer
+    # compose_tree attaches children to the parsed records, so every run gets fresh ones
+    records = BC3Parser().parse(ctx.bc3_path(size))
+    return lambda: BC3Composer().compose_tree(records)
+
+
+# Calculator and services
+
+@benchmark("pcalc_price", size_of=lambda result: {"items": result})
+def bench_pcalc(ctx: Context, size: str):
+    from tools.bc3_pcalc import BC3PrettyCalculator
+    budget = ctx.load_tree(size)["budget"]
+
+    def price():
+        calc = BC3PrettyCalculator()
+        calc.index_concepts(budget)
+        calc.calculate_unit_price(budget.get("code", ""))
+        return len(calc.unit_prices)
+    return price
+
+
+@benchmark("calculate_tree")
+def bench_calculate_tree(ctx: Context, size: str):
+    from backend.services.bc3_service import BC3Service
+    filename = f"{ctx.record(size)['code']}.json"
+    return lambda: BC3Service().calculate_tree(filename)
+
+
+@benchmark("categorize_json_tree", ml=True)
+def bench_categorize(ctx: Context, size: str):
+    from backend.services.ml_service import MLService
+    service = MLService()
+    data = ctx.load_tree(size)
+    return lambda: service.categorize_json_tree(data)
+
+
+# HTTP API through the ASGI test client
+
+@benchmark("api_upload", size_of=response_size)
+def bench_api_upload(ctx: Context, size: str):
+    with open(ctx.bc3_path(size), "rb") as f:
+        content = f.read()
+    client = ctx.api()
+    return lambda: client.post(
+        "/uploadfile/",
+        files={"file": (f"bench_{size}.bc3", content, "application/octet-stream")},
+        data={"project_name": f"bench {size}", "localization": "MADRID",
+              "email": "bench@example.com", "year": "2024"},
+    )
+
+
+@benchmark("api_calc_tree", size_of=response_size)
+def bench_api_calc_tree(ctx: Context, size: str):
+    code = ctx.record(size)["code"]
+    client = ctx.api()
+    return lambda: client.get(f"/calc_tree/{code}.json")
+
+
+@benchmark("api_records_ml", size_of=response_size, ml=True)
+def bench_api_records_ml(ctx: Context, size: str):
+    code = ctx.record(size)["code"]
+    client = ctx.api()
+    return lambda: client.post(f"/records/{code}/ml", params={"force": "true"})
+
+
+@benchmark("api_predict_batch", size_of=response_size, ml=True)
+def bench_api_predict_batch(ctx: Context, size: str):
+    texts = ctx.record(size)["texts"][:2000]
+    client = ctx.api()
+    body = {"items": [{"text": text} for text in texts]}
+    return lambda: client.post("/predict/batch", json=body)
+
+
+def run_benchmark(ctx: Context, name: str, size: str, repeat: int, memory: bool) -> Dict[str, Any]:
+    prepare, size_of, _ = BENCHMARKS[name]
+    times, output = [], {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for index in range(repeat):
+            fn = prepare(ctx, size)
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+            if index == 0:
+                output = size_of(result)
+            del result
+
+        peak = None
+        if memory:
+            fn = prepare(ctx, size)
+            tracemalloc.start()
+            try:
+                fn()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+    return {
+        "name": name,
+        "size": size,
+        "repeat": repeat,
+        "median_s": round(statistics.median(times), 6),
+        "min_s": round(min(times), 6),
+        "max_s": round(max(times), 6),
+        "peak_mem_bytes": peak,
+        **output,
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Median time and peak memory ratios against a saved run; flags changes beyond ``threshold``."""
+    previous = {(r["name"], r["size"]): r for r in baseline.get("results", [])}
+    rows = []
+    for result in results:
+        base = previous.get((result["name"], result["size"]))
+        if base is None:
+            rows.append({"name": result["name"], "size": result["size"], "status": "new"})
+            continue
+        time_ratio = result["median_s"] / base["median_s"] if base["median_s"] else None
+        mem_ratio = (result["peak_mem_bytes"] / base["peak_mem_bytes"]
+                     if result.get("peak_mem_bytes") and base.get("peak_mem_bytes") else None)
+        status = "ok"
+        if time_ratio is not None and time_ratio > 1 + threshold or mem_ratio is not None and mem_ratio > 1 + threshold:
+            status = "regression"
+        elif time_ratio is not None and time_ratio < 1 - threshold:
+            status = "improvement"
+        rows.append({
+            "name": result["name"], "size": result["size"], "status": status,
+            "baseline_median_s": base["median_s"], "median_s": result["median_s"],
+            "time_ratio": round(time_ratio, 3) if time_ratio is not None else None,
+            "mem_ratio": round(mem_ratio, 3) if mem_ratio is not None else None,
+        })
+    return rows
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark converter, calculator, ML and API on synthetic budgets.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"])
+    parser.add_argument("--only", nargs="+", help="Run only benchmarks whose name contains one of these")
+    parser.add_argument("--repeat", type=int, help="Timed runs per benchmark (default 5/3/1 by size)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc peak-memory run")
+    parser.add_argument("--workdir", help="Scratch directory (default: a temporary directory)")
+    parser.add_argument("--output", help="Write the results JSON here (also usable as a baseline)")
+    parser.add_argument("--baseline", help="Compare with a previous --output file")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative change reported as regression/improvement (default 0.2)")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    names = [name for name in BENCHMARKS if not args.only or any(part in name for part in args.only)]
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bc3-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+
+    # Configure the backend before importing it
+    model_path = os.path.join(workdir, "models", "stand_in.joblib")
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    has_model = os.path.exists(model_path) or train_stand_in_model(model_path)
+    os.environ.update({
+        "ML_JOBLIB_MODEL": model_path,
+        "ML_CACHE_PATH": "",
+        "ML_CACHE_SIZE": "0",
+        "ML_MODEL_WATCH_INTERVAL": "0",
+        "REQUEST_MEMORY_LOG": "0",
+    })
+    if not has_model:
+        print("scikit-learn/joblib not available: skipping ML benchmarks", file=sys.stderr)
+        names = [name for name in names if not BENCHMARKS[name][2]]
+
+    ctx = Context(workdir)
+    results = []
+    try:
+        for size in args.sizes:
+            repeat = args.repeat or DEFAULT_REPEAT[size]
+            for name in names:
+                result = run_benchmark(ctx, name, size, repeat, memory=not args.no_memory)
+                results.append(result)
+                peak = result["peak_mem_bytes"]
+                print(f"{name:22s} {size:7s} median {result['median_s'] * 1000:10.1f} ms"
+                      f"  peak {peak / 1048576 if peak is not None else float('nan'):8.1f} MiB"
+                      f"  {result.get('output_bytes', result.get('items', ''))}", file=sys.stderr)
+    finally:
+        ctx.close()
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": SEED,
+            "sizes": {size: SIZES[size] for size in args.sizes},
+        },
+        "results": results,
+    }
+    exit_code = 0
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            report["comparison"] = compare(results, json.load(f), args.threshold)
+        for row in report["comparison"]:
+            if row["status"] != "ok":
+                print(f"{row['status']:12s} {row['name']} {row['size']} time x{row.get('time_ratio')}"
+                      f" mem x{row.get('mem_ratio')}", file=sys.stderr)
+        exit_code = 1 if any(row["status"] == "regression" for row in report["comparison"]) else 0
+
+    text = json.dumps(report, indent=2)
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
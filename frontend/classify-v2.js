@@ -890,58 +890,36 @@ function saveBulkChanges(newLabel) {
     console.log('Guardando cambios masivos:', newLabel, 'a', selectedItems.size, 'elementos');
     
     const selectedCodes = Array.from(selectedItems);
-    let savedCount = 0;
-    let errors = [];
     
     showLoading('Guardando cambios masivos...');
     
-    // Sequential save with progress feedback
-    const saveNext = async (index) => {
-        if (index >= selectedCodes.length) {
-            hideLoading();
-            
-            if (errors.length === 0) {
-                showToast(`${savedCount} clasificaciones guardadas correctamente`, 'success');
-                // Clear selection and reload
-                clearSelection();
-                closeEditModal();
-                setTimeout(() => {
-                    loadClassificationData();
-                }, 500);
-            } else if (savedCount > 0) {
-                showAlert(`${savedCount} guardadas, ${errors.length} fallidas: ${errors.join(', ')}`, 'warning');
-            } else {
-                showAlert(`Error guardando cambios: ${errors.join(', ')}`, 'error');
-            }
-            return;
-        }
-        
-        const code = selectedCodes[index];
-        const progress = Math.round(((index + 1) / selectedCodes.length) * 100);
+    // One request for the whole selection; the server loads and saves the file once
+    saveLabelsToServer(selectedCodes.map(code => ({
+        node_code: code,
+        user_label: newLabel,
+        apply_to_subtree: false
+    }))).then(result => {
+        hideLoading();
         
-        // Update loading message with progress
-        const loadingElement = document.querySelector('#loadingOverlay .text-lg');
-        if (loadingElement) {
-            loadingElement.textContent = `Guardando... ${progress}% (${index + 1}/${selectedCodes.length})`;
+        if (!result.success) {
+            showAlert(`Error guardando cambios: ${result.error}`, 'error');
+            return;
         }
         
-        try {
-            const result = await saveToServer(code, newLabel);
-            if (result.success) {
-                savedCount++;
-            } else {
-                errors.push(code);
-            }
-        } catch (error) {
-            console.error('Error saving to server:', error);
-            errors.push(code);
+        const errors = result.notFound;
+        const savedCount = selectedCodes.length - errors.length;
+        if (errors.length === 0) {
+            showToast(`${savedCount} clasificaciones guardadas correctamente`, 'success');
+            // Clear selection and reload
+            clearSelection();
+            closeEditModal();
+            setTimeout(() => {
+                loadClassificationData();
+            }, 500);
+        } else {
+            showAlert(`${savedCount} guardadas, ${errors.length} fallidas: ${errors.join(', ')}`, 'warning');
         }
-        
-        // Small delay to prevent overwhelming the server
-        setTimeout(() => saveNext(index + 1), 100);
-    };
-    
-    saveNext(0);
+    });
 }
 
 async function saveSingleChange(newLabel) {
@@ -1020,26 +998,22 @@ function closeEditModal() {
     window.isBulkEditMode = false;
 }
 
-async function saveToServer(nodeCode, newLabel) {
+async function saveLabelsToServer(labels) {
     try {
-        const response = await fetch(`${window.location.protocol}//${window.location.hostname}:8005/records/${currentCode}/label`, {
+        const response = await fetch(`${window.location.protocol}//${window.location.hostname}:8005/records/${currentCode}/labels`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify({
-                node_code: nodeCode,
-                user_label: newLabel,
-                apply_to_subtree: false
-            })
+            body: JSON.stringify({ labels })
         });
         
+        const data = await response.json();
         if (!response.ok) {
-            const error = await response.json();
-            throw new Error(error.error || 'Failed to save classification');
+            throw new Error((data.detail && data.detail.error) || 'Failed to save classification');
         }
         
-        return { success: true };
+        return { success: true, changed: data.changed, notFound: data.not_found };
     } catch (error) {
         console.error('Error saving to server:', error);
         return { success: false, error: error.message };
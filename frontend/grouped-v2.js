@@ -985,49 +985,34 @@ async function saveBulkToServer(itemCodes, newLabel, applySubtree) {
     
     let successCount = 0;
     let errorCount = 0;
-    const errors = [];
     
     try {
-        // Process items sequentially to avoid overwhelming the server
-        for (let i = 0; i < itemCodes.length; i++) {
-            const nodeCode = itemCodes[i];
-            
-            try {
-                const response = await fetch(`${window.location.protocol}//${window.location.hostname}:8005/records/${currentCode}/label`, {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify({
-                        node_code: nodeCode,
-                        user_label: newLabel,
-                        apply_to_subtree: applySubtree
-                    })
-                });
-                
-                if (!response.ok) {
-                    const error = await response.json();
-                    throw new Error(error.error || 'Error grabando la clasificación');
-                }
-                
-                successCount++;
-                
-                // Update loading message with progress
-                const progress = Math.round(((i + 1) / itemCodes.length) * 100);
-                showLoading(`Guardando cambios de clasificación... ${progress}% (${i + 1}/${itemCodes.length})`);
-                
-            } catch (error) {
-                errorCount++;
-                errors.push(`${nodeCode}: ${error.message}`);
-                console.error(`Error grabando la clasificación for ${nodeCode}:`, error);
-            }
-            
-            // Small delay to prevent overwhelming the server
-            if (i < itemCodes.length - 1) {
-                await new Promise(resolve => setTimeout(resolve, 100));
-            }
+        // Send every label in one request; the server loads and saves the file once
+        const response = await fetch(`${window.location.protocol}//${window.location.hostname}:8005/records/${currentCode}/labels`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                labels: itemCodes.map(nodeCode => ({
+                    node_code: nodeCode,
+                    user_label: newLabel,
+                    apply_to_subtree: applySubtree
+                }))
+            })
+        });
+        
+        const result = await response.json();
+        if (!response.ok) {
+            throw new Error((result.detail && result.detail.error) || 'Error grabando la clasificación');
         }
         
+        errorCount = result.not_found.length;
+        successCount = itemCodes.length - errorCount;
+        result.not_found.forEach(nodeCode => {
+            console.error(`Error grabando la clasificación for ${nodeCode}: node not found`);
+        });
+        
         // Clear selection after successful bulk operation
         selectedItems.clear();
         updateCheckboxStates();
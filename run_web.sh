@@ -1 +1,2 @@
+# Development server (auto-reload, one worker); use `poetry run serve` in production
 poetry run backend
@@ -1,11 +1,13 @@
 import json
 import argparse
-from typing import Any, Dict
+from typing import Any, Dict, List
 from rich import print
 
 import requests
 
 PREDICT_URL = "http://localhost:8001/predict"  
+PREDICT_BATCH_URL = PREDICT_URL + "/batch"
+BATCH_SIZE = 500
 
 
 # #### Text Classification
@@ -19,10 +21,10 @@ PREDICT_URL = "http://localhost:8001/predict"
 # }
 
 
-def process_node(node: Dict[str, Any]) -> None:
+def process_node(node: Dict[str, Any], pending: List[Dict[str, Any]]) -> None:
     """
     User-editable function to process (and possibly modify) each node in the tree.
-    call to predict API to classify text.
+    Collects PARTIDA nodes so they can be classified with the batch predict API.
     """
     
     # get node concept_type
@@ -32,46 +34,59 @@ def process_node(node: Dict[str, Any]) -> None:
     if concept_type != "PARTIDA":
         return
      
-    
-    # call to predict API to classify text
-    text = node.get("summary", "")
-    descriptive = node.get("descriptive_text")
-    if text:
-        payload = {"text": text}
-        if descriptive:
-            payload["descriptive"] = descriptive
+    if node.get("summary", ""):
+        pending.append(node)
+
+
+def predict_pending(pending: List[Dict[str, Any]]) -> None:
+    """
+    Call the batch predict API once per BATCH_SIZE nodes and store the results.
+    """
+    for start in range(0, len(pending), BATCH_SIZE):
+        chunk = pending[start:start + BATCH_SIZE]
+        items = []
+        for node in chunk:
+            item = {"text": node.get("summary", "")}
+            if node.get("descriptive_text"):
+                item["descriptive"] = node["descriptive_text"]
+            items.append(item)
+
         try:
-            response = requests.post(PREDICT_URL, json=payload, timeout=5)
-            node["_prediction"] = ""
+            response = requests.post(PREDICT_BATCH_URL, json={"items": items}, timeout=60)
             if response.ok:
-                prediction = response.json()
-                node["_prediction"] = prediction
+                results = response.json()["results"]
             else:
-                node["_prediction_error"] = f"HTTP {response.status_code}"
-                print(f" - Error: {node['_prediction_error']}", end='')
+                results = None
+                error = f"HTTP {response.status_code}"
         except Exception as e:
-            node["_prediction_error"] = str(e)
-            print(f" - Ex: {node['_prediction_error']}", end='')
+            results = None
+            error = str(e)
 
-        # Print node details for debugging
-        print(f"[bold]{node.get('code', 'unknown')}[/bold] - [blue]{node.get('summary', '')}[/blue]", end=' ')
-        print(f"-> [yellow]{node['_prediction']['predicted_label']}[/yellow]")
-        print(f"[magenta]{node.get('descriptive_text', '')[:128]}[/magenta]")
-    
-    
+        for i, node in enumerate(chunk):
+            if results is None:
+                node["_prediction"] = ""
+                node["_prediction_error"] = error
+                print(f" - Error: {node['_prediction_error']}")
+                continue
+
+            node["_prediction"] = results[i]
+            # Print node details for debugging
+            print(f"[bold]{node.get('code', 'unknown')}[/bold] - [blue]{node.get('summary', '')}[/blue]", end=' ')
+            print(f"-> [yellow]{node['_prediction']['predicted_label']}[/yellow]")
+            print(f"[magenta]{node.get('descriptive_text', '')[:128]}[/magenta]")
     
 
-def traverse_tree(node: Any):
+def traverse_tree(node: Any, pending: List[Dict[str, Any]]):
     """
     Recursively traverse the tree, calling process_node on each dict node.
     """
     if isinstance(node, dict):
-        process_node(node)
+        process_node(node, pending)
         for value in node.values():
-            traverse_tree(value)
+            traverse_tree(value, pending)
     elif isinstance(node, list):
         for item in node:
-            traverse_tree(item)
+            traverse_tree(item, pending)
 
 def main():
     parser = argparse.ArgumentParser(description="Assign concept codes to JSON nodes based on text classification.")
@@ -83,8 +98,10 @@ def main():
     with open(args.input_file, 'r', encoding='utf-8') as f:
         data = json.load(f)
 
-    # Traverse and process
-    traverse_tree(data)
+    # Traverse, then classify all collected nodes in batches
+    pending: List[Dict[str, Any]] = []
+    traverse_tree(data, pending)
+    predict_pending(pending)
 
     # Output result
     if args.output:
@@ -0,0 +1,39 @@
+"""Startup budget of ``import backend.main``, enforced by benchmarks/check_import_time.py's probe."""
+
+import importlib.util
+import os
+import statistics
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# Seconds; the same default as the script, overridable for slow CI machines
+BUDGET = float(os.environ.get("IMPORT_TIME_BUDGET", "1.5"))
+
+
+def _load_check():
+    spec = importlib.util.spec_from_file_location(
+        "check_import_time", os.path.join(ROOT, "benchmarks", "check_import_time.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+check_import_time = _load_check()
+
+
+@pytest.fixture(scope="module")
+def runs(tmp_path_factory):
+    # The app creates data/ directories relative to the working directory
+    workdir = str(tmp_path_factory.mktemp("import-time"))
+    check_import_time.run_probe(workdir)  # fills the bytecode cache
+    return [check_import_time.run_probe(workdir)[0] for _ in range(3)]
+
+
+def test_heavy_modules_are_imported_lazily(runs):
+    assert sorted({module for run in runs for module in run["loaded"]}) == []
+
+
+def test_import_within_budget(runs):
+    assert statistics.median(run["seconds"] for run in runs) <= BUDGET
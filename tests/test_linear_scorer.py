@@ -0,0 +1,83 @@
+"""Parity of the compiled LinearScorer with the scikit-learn pipeline it replaces."""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sklearn")
+
+from sklearn.feature_extraction.text import TfidfVectorizer  # noqa: E402
+from sklearn.linear_model import LogisticRegression, SGDClassifier  # noqa: E402
+from sklearn.multiclass import OneVsRestClassifier  # noqa: E402
+from sklearn.pipeline import Pipeline  # noqa: E402
+
+from backend.config import ML_SCORER_TOLERANCE  # noqa: E402
+from backend.services.linear_scorer import LinearScorer  # noqa: E402
+
+WORDS = (
+    "hormigón armado zapata encofrado ladrillo tabique mortero enfoscado puerta madera "
+    "ventana aluminio tubería cobre cable eléctrica pintura plástica esmalte acero "
+    "excavación relleno zanja solera forjado viga pilar cubierta teja impermeabilización"
+).split()
+
+# Texts outside the training vocabulary: case, accents, punctuation, codes
+EXTRA_TEXTS = [
+    "HORMIGÓN Armado, en ZAPATAS de cimentación (HA-25)",
+    "Tubería de COBRE Ø15mm; incluso p.p. de accesorios",
+    "Pintura plástica lisa mate... dos manos [SEP] m2 pintura",
+    "ñandú 123 m² — término desconocido",
+]
+
+CLASSIFIERS = {
+    "logreg-multinomial": lambda: LogisticRegression(max_iter=1000),
+    "logreg-ovr": lambda: OneVsRestClassifier(LogisticRegression(max_iter=1000)),
+    "sgd-log-loss": lambda: SGDClassifier(loss="log_loss", random_state=0),
+    "sgd-log-loss-ovr": lambda: OneVsRestClassifier(SGDClassifier(loss="log_loss", random_state=0)),
+}
+
+VECTORIZERS = {
+    # The production model's settings
+    "word-bigrams-sublinear": lambda: TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True),
+    "word-unicode-accents-stop-words": lambda: TfidfVectorizer(strip_accents="unicode", stop_words=["de", "en"]),
+    "word-ascii-accents-cased": lambda: TfidfVectorizer(strip_accents="ascii", lowercase=False),
+    "char-wb": lambda: TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4)),
+}
+
+
+def training_data(n_classes, rows=300, seed=0):
+    """Texts whose words depend on their class, so every model learns something."""
+    rng = np.random.default_rng(seed)
+    texts, labels = [], []
+    for i in range(rows):
+        label = i % n_classes
+        words = [WORDS[(label * 5 + int(j)) % len(WORDS)] for j in rng.integers(0, 8, size=4)]
+        words += [WORDS[int(j)] for j in rng.integers(0, len(WORDS), size=3)]
+        if i % 3 == 0:
+            words[0] = words[0].upper()
+        texts.append(" de ".join(words))
+        labels.append(f"C{label}")
+    return texts, labels
+
+
+@pytest.mark.parametrize("n_classes", [2, 4])
+@pytest.mark.parametrize("vectorizer", list(VECTORIZERS))
+@pytest.mark.parametrize("classifier", list(CLASSIFIERS))
+def test_compiled_scorer_matches_pipeline(classifier, vectorizer, n_classes):
+    texts, labels = training_data(n_classes)
+    pipe = Pipeline([("tfidf", VECTORIZERS[vectorizer]()), ("clf", CLASSIFIERS[classifier]())]).fit(texts, labels)
+
+    scorer = LinearScorer.from_pipeline(pipe)
+    probes = LinearScorer.probe_texts(pipe) + texts[:20] + EXTRA_TEXTS
+
+    assert list(scorer.classes_) == list(pipe.classes_)
+    assert scorer.max_abs_diff(pipe, probes) <= ML_SCORER_TOLERANCE
+
+
+def test_saved_scorer_matches_pipeline(tmp_path):
+    texts, labels = training_data(4)
+    pipe = Pipeline([("tfidf", VECTORIZERS["word-bigrams-sublinear"]()), ("clf", CLASSIFIERS["logreg-ovr"]())])
+    pipe.fit(texts, labels)
+    LinearScorer.from_pipeline(pipe).save(str(tmp_path / "scorer"))
+
+    scorer = LinearScorer.load(str(tmp_path / "scorer"), mmap_mode="r")
+
+    assert scorer.max_abs_diff(pipe, LinearScorer.probe_texts(pipe) + EXTRA_TEXTS) <= ML_SCORER_TOLERANCE
@@ -0,0 +1,58 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend import security
+from backend.middleware import ProfilingMiddleware
+from backend.services.request_profiler import RequestProfiler, run_in_threadpool
+
+TOKEN = "test-admin-token"
+
+
+def pool_work(n: int) -> int:
+    return sum(i * i for i in range(n))
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    monkeypatch.setattr(security, "ADMIN_TOKEN", TOKEN)
+    return RequestProfiler(profiles_dir=str(tmp_path), min_interval=0)
+
+
+@pytest.fixture
+def client(profiler):
+    app = FastAPI()
+
+    @app.get("/work")
+    async def work():
+        return {"result": await run_in_threadpool(pool_work, 10000)}
+
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+    return TestClient(app)
+
+
+def test_cprofile_covers_thread_pool_calls(client, profiler):
+    response = client.get("/work", headers={"X-Profile": "1", "X-Admin-Token": TOKEN})
+
+    assert response.status_code == 200
+    assert response.json() == {"result": pool_work(10000)}
+    profile_id = response.headers["x-profile-id"]
+    meta = profiler.list_profiles()[0]
+    assert meta["id"] == profile_id
+    assert meta["threadpool_calls"] == 1
+    with open(profiler.get_path(profile_id)[0], encoding="utf-8") as f:
+        assert "pool_work" in f.read()
+
+
+def test_sample_mode_runs_thread_pool_calls(client, profiler):
+    response = client.get("/work", headers={"X-Profile": "sample", "X-Admin-Token": TOKEN})
+
+    assert response.status_code == 200
+    assert profiler.list_profiles()[0]["mode"] == "sample"
+
+
+def test_profile_flag_without_token_is_ignored(client):
+    response = client.get("/work", headers={"X-Profile": "1"})
+
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
@@ -0,0 +1,35 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from backend import security
+from backend.routers.admin import require_admin
+
+TOKEN = "test-admin-token"
+
+
+@pytest.fixture(autouse=True)
+def admin_token(monkeypatch):
+    monkeypatch.setattr(security, "ADMIN_TOKEN", TOKEN)
+
+
+@pytest.mark.parametrize("token", [None, "", "wrong", "é", "\udcff", TOKEN + "x"])
+def test_other_tokens_are_not_admin(token):
+    assert security.is_admin_token(token) is False
+
+
+def test_admin_token_matches():
+    assert security.is_admin_token(TOKEN) is True
+
+
+def test_non_ascii_header_is_rejected_not_an_error(monkeypatch):
+    monkeypatch.setattr("backend.routers.admin.admin_enabled", lambda: True)
+    app = FastAPI()
+
+    @app.get("/admin/ping", dependencies=[Depends(require_admin)])
+    def ping():
+        return {"ok": True}
+
+    client = TestClient(app)
+    assert client.get("/admin/ping", headers={"X-Admin-Token": "é".encode("latin-1")}).status_code == 401
+    assert client.get("/admin/ping", headers={"X-Admin-Token": TOKEN}).status_code == 200
@@ -0,0 +1,77 @@
+"""Pre-fork workers share the compiled model's pages instead of copying them."""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sklearn")
+pytestmark = pytest.mark.skipif(sys.platform != "linux", reason="reads /proc/<pid>/smaps")
+
+import joblib  # noqa: E402
+from sklearn.feature_extraction.text import TfidfVectorizer  # noqa: E402
+from sklearn.linear_model import LogisticRegression  # noqa: E402
+from sklearn.pipeline import Pipeline  # noqa: E402
+
+from backend.services import model_registry as model_registry_module  # noqa: E402
+from backend.services.linear_scorer import scorer_path_for  # noqa: E402
+from backend.services.model_registry import ModelRegistry  # noqa: E402
+from backend.services.prediction_cache import PredictionCache  # noqa: E402
+
+
+def file_mappings(path):
+    """(size kB, private dirty kB) summed over this process's mappings of ``path``."""
+    size = dirty = 0
+    current = None
+    with open("/proc/self/smaps", "r") as f:
+        for line in f:
+            fields = line.split()
+            if not fields[0].endswith(":"):
+                current = fields[5] if len(fields) > 5 else None
+            elif current == path and fields[0] == "Size:":
+                size += int(fields[1])
+            elif current == path and fields[0] == "Private_Dirty:":
+                dirty += int(fields[1])
+    return size, dirty
+
+
+@pytest.fixture
+def model_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_registry_module, "ML_COMPILED_SCORER", True)
+    monkeypatch.setattr(model_registry_module, "ML_SCORER_AUTO_EXPORT", True)
+    monkeypatch.setattr(model_registry_module, "ML_MMAP_MODE", "r")
+    texts = [f"hormigón armado zapata {i}" for i in range(50)] + [f"pintura plástica mate {i}" for i in range(50)]
+    labels = ["HOR"] * 50 + ["PIN"] * 50
+    pipe = Pipeline([("tfidf", TfidfVectorizer(ngram_range=(1, 2))), ("clf", LogisticRegression())]).fit(texts, labels)
+    path = str(tmp_path / "model.joblib")
+    joblib.dump(pipe, path)
+    return path
+
+
+def test_forked_worker_reads_model_arrays_from_shared_mapping(model_path):
+    model = ModelRegistry(model_path, cache=PredictionCache(db_path=None)).load()
+    coef_path = os.path.join(scorer_path_for(model_path), "coef.npy")
+
+    assert model.engine == "compiled"
+    assert isinstance(model.pipe._coef, np.memmap)
+    assert file_mappings(coef_path)[0] > 0
+
+    # Like a backend.server worker: predict with the arrays inherited from the master
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            model.pipe.predict_proba(["hormigón armado en zapatas"] * 8)
+            size, dirty = file_mappings(coef_path)
+            os.write(write_fd, f"{size} {dirty}".encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        size, dirty = map(int, f.read().split())
+    os.waitpid(pid, 0)
+
+    # Still a file mapping in the worker, and never written to (so never copied)
+    assert size > 0
+    assert dirty == 0
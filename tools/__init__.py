@@ -0,0 +1,5 @@
+"""BC3 conversion and maintenance utilities.
+
+Each module also runs as a standalone script (``python tools/<name>.py``);
+the backend imports them as ``tools.<name>``, only when first needed.
+"""
@@ -1,5 +1,6 @@
 import json
 import argparse
+import time
 
 class BC3Parser:
     """Parses a .bc3 file and extracts records."""
@@ -311,6 +312,10 @@ class BC3Parser:
 class BC3Composer:
     """Composes a tree structure from parsed BC3 records."""
 
+    def __init__(self):
+        # Decomposition/measurement counts of the last compose_tree call
+        self.stats = {}
+
     def compose_tree(self, records, skip_measurements=False):
         """
         Builds a hierarchical tree from a flat list of records.
@@ -426,6 +431,12 @@ class BC3Composer:
                                     concepts[concept_code]['children'].append(child_concept)
                             break
                     
+        self.stats = {
+            "decompositions": decomposition_count,
+            "linked_decompositions": linked_decompositions,
+            "measurements": measurement_count,
+            "linked_measurements": linked_measurements,
+        }
         print(f"Processed {decomposition_count} decomposition records, linked {linked_decompositions} successfully")
         if not skip_measurements:
             print(f"Processed {measurement_count} measurement records, linked {linked_measurements} successfully")
@@ -538,17 +549,24 @@ def main():
         action="store_true",
         help="Skip parsing and processing of measurement records (~M) for faster conversion and smaller output."
     )
+    cli_parser.add_argument(
+        "--stats-json",
+        help="Write stage timings (seconds) and record counts to this JSON file."
+    )
     
     args = cli_parser.parse_args()
 
     parser = BC3Parser()
     composer = BC3Composer()
+    timings = {}
 
     # 1. Parse the .bc3 file from the command-line argument
     print(f"Parsing {args.input_file}...")
     if args.skip_measurements:
         print("  Skipping measurement records for faster processing...")
+    start = time.perf_counter()
     parsed_records = parser.parse(args.input_file, skip_measurements=args.skip_measurements)
+    timings["parse"] = time.perf_counter() - start
 
     if not parsed_records:
         print(f"No records were parsed from {args.input_file}. Exiting.")
@@ -556,16 +574,22 @@ def main():
 
     # 2. Compose the tree structure
     print("Composing JSON tree...")
+    start = time.perf_counter()
     json_tree = composer.compose_tree(parsed_records, skip_measurements=args.skip_measurements)
+    timings["compose"] = time.perf_counter() - start
 
     # 3. Serialize the composed tree to a JSON string
+    start = time.perf_counter()
     json_output = json.dumps(json_tree, indent=2, ensure_ascii=False)
+    timings["json_dumps"] = time.perf_counter() - start
 
     # 4. Write to output file or print to console
     if args.output:
         try:
+            start = time.perf_counter()
             with open(args.output, 'w', encoding='utf-8') as f:
                 f.write(json_output)
+            timings["json_write"] = time.perf_counter() - start
             print(f"Successfully converted and saved to {args.output}")
         except Exception as e:
             print(f"Error writing to output file {args.output}: {e}")
@@ -573,6 +597,14 @@ def main():
         print("\n--- Composed JSON Tree ---")
         print(json_output)
 
+    if args.stats_json:
+        record_counts = {}
+        for record in parsed_records:
+            record_type = record.get('record_type', '?')
+            record_counts[record_type] = record_counts.get(record_type, 0) + 1
+        with open(args.stats_json, 'w', encoding='utf-8') as f:
+            json.dump({"timings": timings, "records": record_counts, "compose": composer.stats}, f)
+
 
 if __name__ == '__main__':    
     main()
\ No newline at end of file
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic FIEBDC-3 (.bc3) budgets for scale and performance testing.
+
+The budget is a tree of chapters (``01#``, ``01.02#``...) whose leaf
+chapters hold PARTIDAs; each PARTIDA decomposes into labour, machinery and
+material resources (DESCOMPUESTOs). Resources are drawn from a shared pool
+with probability ``--reuse`` and are otherwise unique to their PARTIDA, so
+the reuse ratio controls how much of the concept graph is shared. Output is
+a pure function of the arguments: the same seed always produces the same
+bytes, so benchmark results on generated files can be compared.
+
+Examples:
+  python tools/bc3_generator.py -o data/big.bc3 --concepts 100000 --seed 1
+  python tools/bc3_generator.py -o small.bc3 --concepts 2000 --depth 1 --fanout 6
+  python tools/bc3_generator.py -o packed.bc3 --decomposition-format packed --measurements 3
+"""
+
+import argparse
+import hashlib
+import random
+import sys
+
+ACTIONS = [
+    "Suministro y colocación de", "Formación de", "Ejecución de", "Demolición de", "Excavación de",
+    "Relleno de", "Instalación de", "Montaje de", "Pavimento de", "Revestimiento de", "Impermeabilización de",
+    "Aislamiento de", "Limpieza de", "Reparación de",
+]
+ELEMENTS = [
+    "muro", "forjado unidireccional", "zapata corrida", "tabique", "solera", "cubierta inclinada",
+    "falso techo", "alicatado", "carpintería exterior", "pilar", "viga de canto", "arqueta registrable",
+    "red de saneamiento", "bajante", "escalera", "barandilla", "peldañeado", "losa de cimentación",
+    "pozo de registro", "cuadro eléctrico", "punto de luz", "canalón", "zanja", "fachada ventilada",
+]
+MATERIALS = [
+    "hormigón HA-25/B/20/IIa", "hormigón HM-20/P/20/I", "ladrillo cerámico hueco doble",
+    "ladrillo perforado cara vista", "acero B 500 S", "acero S275JR", "mortero de cemento M-5",
+    "placa de yeso laminado", "PVC", "cobre", "madera de pino", "aluminio lacado",
+    "baldosa cerámica", "piedra natural", "lana mineral", "poliestireno extruido", "vidrio laminado",
+    "tubo de polietileno", "chapa galvanizada", "bloque de hormigón",
+]
+SPECS = [
+    "de 15 cm de espesor", "de 1/2 pie de espesor", "de 60x60 cm", "de 30x30 cm", "de 20 mm de diámetro",
+    "de 2,50 m de altura", "de 10 cm de espesor", "con juntas de dilatación", "armado con malla electrosoldada",
+    "de 110 mm de diámetro", "en dos capas", "a dos aguas",
+]
+FINISHES = [
+    "incluso p.p. de medios auxiliares", "totalmente terminado", "según CTE DB SE-C",
+    "incluso limpieza y retirada de escombros", "medido en superficie realmente ejecutada",
+    "incluso replanteo, nivelación y aplomado", "con parte proporcional de solapes y despuntes",
+    "i/ transporte a vertedero autorizado",
+]
+CHAPTER_NAMES = [
+    "Actuaciones previas", "Movimiento de tierras", "Cimentaciones", "Estructura", "Albañilería",
+    "Cubiertas", "Aislamientos e impermeabilizaciones", "Revestimientos", "Carpintería", "Vidriería",
+    "Instalación de fontanería", "Instalación eléctrica", "Saneamiento", "Pinturas", "Urbanización",
+    "Seguridad y salud", "Gestión de residuos", "Control de calidad",
+]
+UNITS = ["m2", "m3", "m", "ud", "kg", "m2", "m3", "m"]
+MEASURED_UNITS = {"m2": 2, "m3": 3, "m": 1}
+
+# (code prefix, ~C type, unit, summaries)
+RESOURCE_KINDS = [
+    ("MO", "1", "h", ["Oficial 1ª albañil", "Peón ordinario", "Oficial 1ª ferrallista", "Ayudante fontanero",
+                      "Oficial 1ª electricista", "Peón especializado", "Oficial 1ª carpintero"]),
+    ("MQ", "2", "h", ["Retroexcavadora hidráulica", "Camión basculante", "Hormigonera", "Grúa torre",
+                      "Bomba de hormigonado", "Pisón vibrante", "Dumper autocargable"]),
+    ("MT", "3", None, None),
+]
+
+
+def _fmt(value, decimals=2):
+    return f"{value:.{decimals}f}"
+
+
+class BC3Generator:
+    """Deterministic generator writing BC3 records to a text stream."""
+
+    def __init__(self, seed=0, concepts=10000, depth=2, fanout=8, resources=5, reuse=0.8, pool=None,
+                 measurements=1.0, decomposition_format="mixed", packed_ratio=0.5, zero_suffix=0.0):
+        if depth < 1 or fanout < 1 or resources < 1:
+            raise ValueError("depth, fanout and resources must be at least 1")
+        if not 0.0 <= reuse <= 1.0 or not 0.0 <= zero_suffix <= 1.0 or not 0.0 <= packed_ratio <= 1.0:
+            raise ValueError("reuse, zero_suffix and packed_ratio must be between 0 and 1")
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.depth = depth
+        self.fanout = fanout
+        self.resources = resources
+        self.reuse = reuse
+        self.measurements = measurements
+        self.decomposition_format = decomposition_format
+        self.packed_ratio = packed_ratio
+        self.zero_suffix = zero_suffix
+
+        chapters = sum(fanout ** level for level in range(1, depth + 1))
+        self.pool_size = pool if pool is not None else max(20, concepts // 50)
+        unique_per_partida = resources * (1.0 - reuse)
+        self.partidas = max(1, int((concepts - 1 - chapters - self.pool_size) / (1.0 + unique_per_partida)))
+        self.stats = {"concepts": 0, "chapters": 0, "partidas": 0, "resources": 0,
+                      "decompositions": 0, "packed_decompositions": 0, "measurements": 0, "zero_suffixed": 0}
+        self._resource_seq = 0
+        self._pool = []
+
+    # Texts
+
+    def _partida_summary(self):
+        rng = self.rng
+        return f"{rng.choice(ACTIONS)} {rng.choice(ELEMENTS)} de {rng.choice(MATERIALS)} {rng.choice(SPECS)}"
+
+    def _partida_text(self, summary):
+        rng = self.rng
+        extra = ", ".join(rng.sample(FINISHES, rng.randint(1, 3)))
+        return f"{summary}, {rng.choice(MATERIALS)} {rng.choice(SPECS)}, {extra}."
+
+    # Records
+
+    def _concept(self, out, code, unit, summary, price, concept_type, decomposed=False):
+        # Decomposed concepts may carry the "\0" suffix; ~D records still name them without it
+        if decomposed and self.zero_suffix and self.rng.random() < self.zero_suffix:
+            code += "\\0"
+            self.stats["zero_suffixed"] += 1
+        out.write(f"~C|{code}|{unit}|{summary}|{price}|010124|{concept_type}|\r\n")
+        self.stats["concepts"] += 1
+
+    def _decomposition(self, out, parent, children):
+        """Write a ~D record; ``children`` are (code, factor, output) triplets."""
+        fmt = self.decomposition_format
+        packed = fmt == "packed" or (fmt == "mixed" and self.rng.random() < self.packed_ratio)
+        # The converter recognises the packed form from two children on
+        if packed and len(children) >= 2:
+            body = "".join(f"{code}\\{factor}\\{output}\\" for code, factor, output in children) + "|"
+            self.stats["packed_decompositions"] += 1
+        else:
+            body = "".join(f"{code}\\{factor}\\{output}|" for code, factor, output in children)
+        out.write(f"~D|{parent}|{body}\r\n")
+        self.stats["decompositions"] += 1
+
+    def _new_resource(self, out):
+        prefix, concept_type, unit, names = self.rng.choice(RESOURCE_KINDS)
+        self._resource_seq += 1
+        code = f"{prefix}{self._resource_seq:06d}"
+        if names is None:
+            material = self.rng.choice(MATERIALS)
+            summary = f"{material[0].upper()}{material[1:]} {self.rng.choice(SPECS)}"
+            unit = self.rng.choice(["m2", "m3", "kg", "ud", "m", "t", "l"])
+            price = self.rng.uniform(0.2, 400.0)
+        else:
+            summary = self.rng.choice(names)
+            price = self.rng.uniform(12.0, 60.0) if concept_type == "1" else self.rng.uniform(25.0, 120.0)
+        price = round(price, 2)
+        self._concept(out, code, unit, summary, _fmt(price), concept_type)
+        self.stats["resources"] += 1
+        return code, price
+
+    def _measurement(self, out, chapter, partida, unit):
+        rng = self.rng
+        dims = MEASURED_UNITS.get(unit, 0)
+        lines, total = [], 0.0
+        for _ in range(rng.randint(1, 4)):
+            units = rng.randint(1, 6)
+            sizes = [round(rng.uniform(0.5, 12.0), 2) for _ in range(dims)]
+            subtotal = units
+            for size in sizes:
+                subtotal *= size
+            total += subtotal
+            fields = [str(units)] + [_fmt(s) for s in sizes] + [""] * (3 - dims)
+            lines.append(f"\\{rng.choice(ELEMENTS)} {rng.choice(['planta baja', 'planta 1', 'sótano', 'exterior'])}\\"
+                         + "\\".join(fields) + "\\")
+        self.stats["measurements"] += 1
+        out.write(f"~M|{chapter}\\{partida}|{rng.randint(1, 99)}\\|{_fmt(total)}|{''.join(lines)}||\r\n")
+        return total
+
+    def _partida(self, out, chapter, code):
+        rng = self.rng
+        unit = rng.choice(UNITS)
+        children, price = [], 0.0
+        used = set()
+        for _ in range(rng.randint(max(1, self.resources - 2), self.resources + 2)):
+            if self._pool and rng.random() < self.reuse:
+                # Skewed towards the first pool entries, like common labour and materials
+                resource, resource_price = self._pool[min(int(rng.expovariate(8.0 / len(self._pool))),
+                                                          len(self._pool) - 1)]
+            else:
+                resource, resource_price = self._new_resource(out)
+            if resource in used:
+                continue
+            used.add(resource)
+            quantity = round(rng.uniform(0.01, 3.0), 3)
+            children.append((resource, "1", _fmt(quantity, 3)))
+            price += quantity * resource_price
+
+        summary = self._partida_summary()
+        self._concept(out, code, unit, summary, _fmt(price), "0", decomposed=True)
+        out.write(f"~T|{code}|{self._partida_text(summary)}|\r\n")
+        self._decomposition(out, code, children)
+        self.stats["partidas"] += 1
+
+        count = int(self.measurements)
+        if rng.random() < self.measurements - count:
+            count += 1
+        measured = sum(self._measurement(out, chapter, code, unit) for _ in range(count))
+        return measured if count else round(rng.uniform(1.0, 500.0), 2)
+
+    def _chapter(self, out, code, level, partidas):
+        """Write a chapter with ``partidas`` PARTIDAs spread over its subchapters."""
+        rng = self.rng
+        self._concept(out, code, "", f"{rng.choice(CHAPTER_NAMES)} {code.rstrip('#')}", "0", "0", decomposed=True)
+        self.stats["chapters"] += 1
+        children = []
+        if level < self.depth:
+            shares = _split(partidas, self.fanout)
+            for index, share in enumerate(shares, 1):
+                child = f"{code.rstrip('#')}.{index:02d}#"
+                self._chapter(out, child, level + 1, share)
+                children.append((child, "1", "1"))
+        else:
+            for index in range(1, partidas + 1):
+                child = f"{code.rstrip('#')}.{index:04d}"
+                quantity = self._partida(out, code, child)
+                children.append((child, "1", _fmt(quantity)))
+        if children:
+            self._decomposition(out, code, children)
+
+    def generate(self, out):
+        out.write(f"~V|SOFT|FIEBDC-3/2016|bc3_generator seed={self.seed}||ANSI||2|\r\n")
+        out.write("~K|2\\2\\3\\2\\2\\2\\2\\EUR|13\\6\\0\\0\\21|\r\n")
+
+        for _ in range(self.pool_size):
+            self._pool.append(self._new_resource(out))
+
+        chapters = [f"{index:02d}#" for index in range(1, self.fanout + 1)]
+        self._concept(out, "OBRA##", "", "Presupuesto sintético", "0", "0", decomposed=True)
+        for code, share in zip(chapters, _split(self.partidas, self.fanout)):
+            self._chapter(out, code, 1, share)
+        self._decomposition(out, "OBRA##", [(code, "1", "1") for code in chapters])
+        return self.stats
+
+
+class _HashingWriter:
+    """Encode to ISO-8859-1 (the ANSI charset declared in ~V) and hash what is written."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, text):
+        data = text.encode("iso-8859-1")
+        self.digest.update(data)
+        self.size += len(data)
+        self.stream.write(data)
+
+
+def _split(total, parts):
+    """Split ``total`` into ``parts`` near-equal integers."""
+    base, rest = divmod(total, parts)
+    return [base + (1 if index < rest else 0) for index in range(parts)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a deterministic synthetic FIEBDC-3 budget.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument("-o", "--output", help="Output .bc3 path (default: stdout)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default 0)")
+    parser.add_argument("--concepts", type=int, default=10000, help="Approximate number of ~C concepts")
+    parser.add_argument("--depth", type=int, default=2, help="Chapter levels above the PARTIDAs (default 2)")
+    parser.add_argument("--fanout", type=int, default=8, help="Subchapters per chapter (default 8)")
+    parser.add_argument("--resources", type=int, default=5, help="Average DESCOMPUESTOs per PARTIDA (default 5)")
+    parser.add_argument("--reuse", type=float, default=0.8,
+                        help="Probability that a DESCOMPUESTO comes from the shared pool (default 0.8)")
+    parser.add_argument("--pool", type=int, help="Shared resource pool size (default concepts/50)")
+    parser.add_argument("--measurements", type=float, default=1.0,
+                        help="Average ~M records per PARTIDA, 0 for none (default 1)")
+    parser.add_argument("--decomposition-format", choices=("official", "packed", "mixed"), default="mixed",
+                        help="~D layout: one child per field, all children in one field, or both")
+    parser.add_argument("--packed-ratio", type=float, default=0.5,
+                        help="Share of packed ~D records with --decomposition-format mixed (default 0.5)")
+    parser.add_argument("--zero-suffix", type=float, default=0.0,
+                        help="Share of chapters and PARTIDAs whose ~C code ends in \\0 (default 0).\n"
+                             "Their ~D records name them without it, which the converter resolves by\n"
+                             "scanning all concepts; references from their parents and ~M records\n"
+                             "stay unresolved.")
+    args = parser.parse_args()
+
+    generator = BC3Generator(
+        seed=args.seed, concepts=args.concepts, depth=args.depth, fanout=args.fanout,
+        resources=args.resources, reuse=args.reuse, pool=args.pool, measurements=args.measurements,
+        decomposition_format=args.decomposition_format, packed_ratio=args.packed_ratio,
+        zero_suffix=args.zero_suffix,
+    )
+    stream = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        out = _HashingWriter(stream)
+        stats = generator.generate(out)
+    finally:
+        if args.output:
+            stream.close()
+    stats["bytes"] = out.size
+    stats["sha256"] = out.digest.hexdigest()[:16]
+    print(" ".join(f"{key}={value}" for key, value in stats.items()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Export a joblib TF-IDF + linear model to flat NumPy arrays for LinearScorer.
+
+The output directory (default: next to the model, ``<model>.scorer``) holds
+meta.json plus one .npy file per array. The backend uses it instead of the
+joblib pipeline when its source digest matches the model file.
+
+Examples:
+  python tools/export_linear_scorer.py data/models/linear_ovr_tfidf.joblib
+  python tools/export_linear_scorer.py model.joblib -o /srv/model.scorer --texts samples.txt
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.services.linear_scorer import LinearScorer, scorer_path_for
+from backend.services.prediction_cache import file_digest
+
+
+def time_single(predict, text, repeat):
+    """Mean single-text latency in microseconds."""
+    predict([text])
+    start = time.perf_counter()
+    for _ in range(repeat):
+        predict([text])
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a joblib pipeline to a compiled LinearScorer.")
+    parser.add_argument("model", help="Path to the joblib TF-IDF + linear pipeline")
+    parser.add_argument("-o", "--output", help="Output directory (default: <model>.scorer)")
+    parser.add_argument("--texts", help="Optional file with one text per line for the parity check")
+    parser.add_argument("--tolerance", type=float, default=1e-6, help="Maximum allowed probability difference")
+    parser.add_argument("--repeat", type=int, default=500, help="Iterations for the latency comparison")
+    args = parser.parse_args()
+
+    output = args.output or scorer_path_for(args.model)
+    digest = file_digest(args.model)
+    pipe = joblib.load(args.model)
+    scorer = LinearScorer.from_pipeline(pipe, source_digest=digest)
+
+    texts = LinearScorer.probe_texts(pipe, count=256)
+    if args.texts:
+        with open(args.texts, "r", encoding="utf-8") as f:
+            texts += [line.rstrip("\n") for line in f if line.strip()]
+
+    diff = scorer.max_abs_diff(pipe, texts)
+    expected_top1 = np.argmax(pipe.predict_proba(texts), axis=1)
+    actual_top1 = np.argmax(scorer.predict_proba(texts), axis=1)
+    agreement = float(np.mean(expected_top1 == actual_top1))
+    print(f"Parity on {len(texts)} texts: max |Δp| = {diff:.3e}, top-1 agreement = {agreement:.4%}")
+    if diff > args.tolerance:
+        print(f"Error: difference exceeds tolerance {args.tolerance:g}; not exporting")
+        return 1
+
+    scorer.save(output)
+    sample = texts[1]
+    sklearn_us = time_single(pipe.predict_proba, sample, args.repeat)
+    compiled_us = time_single(scorer.predict_proba, sample, args.repeat)
+    print(f"Single-text latency: sklearn {sklearn_us:.0f} µs, compiled {compiled_us:.0f} µs")
+    print(f"Array memory: {scorer.nbytes / 1024:.0f} KiB ({scorer.n_features} features, {len(scorer.classes_)} classes)")
+    print(f"Saved compiled scorer to {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Measure per-worker memory when several processes load the ML model.
+
+Starts N fresh worker processes that each load the model through the backend
+ModelRegistry and run a few predictions, then reads /proc/<pid>/smaps_rollup
+while all workers are alive. RSS counts shared pages in full for every
+worker; PSS splits shared pages between the workers mapping them, and
+Private is memory nobody else can share. Run it once with memory-mapping and
+once without to compare.
+
+Examples:
+  python tools/measure_worker_rss.py --workers 8                 # ML_MMAP_MODE=r (default)
+  python tools/measure_worker_rss.py --workers 8 --no-mmap
+  python tools/measure_worker_rss.py --workers 8 --engine sklearn
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def read_smaps_rollup(pid="self"):
+    """Return Rss/Pss/Shared/Private in KiB from /proc/<pid>/smaps_rollup."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss_kb": values.get("Rss", 0),
+        "pss_kb": values.get("Pss", 0),
+        "shared_kb": values.get("Shared_Clean", 0) + values.get("Shared_Dirty", 0),
+        "private_kb": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+def worker(ready, done, results):
+    sys.path.insert(0, ROOT)
+    from backend.services.model_registry import model_registry
+
+    baseline = read_smaps_rollup()
+    model = model_registry.load()
+    model.pipe.predict_proba(["Hormigón HA-25 en zapatas"] * 32)
+    ready.put(os.getpid())
+    done.wait()
+    results.put({"pid": os.getpid(), "engine": model.engine, "baseline": baseline})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker RSS/PSS of the loaded ML model.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--no-mmap", action="store_true", help="Load arrays privately (ML_MMAP_MODE='')")
+    parser.add_argument("--engine", choices=("compiled", "sklearn"), default="compiled")
+    args = parser.parse_args()
+
+    if sys.platform != "linux":
+        print("This tool reads /proc and only runs on Linux")
+        return 1
+
+    os.environ["ML_MMAP_MODE"] = "" if args.no_mmap else "r"
+    os.environ["ML_COMPILED_SCORER"] = "1" if args.engine == "compiled" else "0"
+    os.environ.setdefault("ML_CACHE_PATH", "")
+
+    ctx = mp.get_context("spawn")
+    ready, results, done = ctx.Queue(), ctx.Queue(), ctx.Event()
+    procs = [ctx.Process(target=worker, args=(ready, done, results)) for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+    pids = [ready.get(timeout=300) for _ in procs]
+
+    # Measure while every worker is alive so shared pages are split between them
+    usage = {pid: read_smaps_rollup(pid) for pid in pids}
+    done.set()
+    info = {r["pid"]: r for r in (results.get(timeout=60) for _ in procs)}
+    for p in procs:
+        p.join()
+
+    mode = "mmap" if not args.no_mmap else "private"
+    print(f"{args.workers} workers, engine={info[pids[0]]['engine']}, arrays={mode}")
+    print(f"{'pid':>8} {'RSS MiB':>9} {'PSS MiB':>9} {'private MiB':>12} {'model Δ private MiB':>19}")
+    totals = {"rss_kb": 0, "pss_kb": 0}
+    for pid in pids:
+        u, base = usage[pid], info[pid]["baseline"]
+        totals["rss_kb"] += u["rss_kb"]
+        totals["pss_kb"] += u["pss_kb"]
+        print(f"{pid:>8} {u['rss_kb'] / 1024:>9.1f} {u['pss_kb'] / 1024:>9.1f} "
+              f"{u['private_kb'] / 1024:>12.1f} {(u['private_kb'] - base['private_kb']) / 1024:>19.1f}")
+    print(f"total RSS {totals['rss_kb'] / 1024:.1f} MiB, total PSS (real footprint) {totals['pss_kb'] / 1024:.1f} MiB")
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())